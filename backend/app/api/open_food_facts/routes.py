@@ -1,18 +1,174 @@
-from fastapi import APIRouter, Query, Response
+import json
+from typing import AsyncIterator, Callable
+
+from fastapi import APIRouter, BackgroundTasks, Query, Response
+from fastapi.responses import StreamingResponse
+from loguru import logger
 from starlette.requests import Request
 
+from app.business.open_food_facts.calculators.unit_pain_loader import PAIN_TABLE
 from app.business.open_food_facts.knowledge_panel_service import (
+    check_knowledge_panel_exists,
     get_knowledge_panel_response,
     get_pain_reports,
     get_pain_reports_batch,
+    iter_pain_reports,
+    refresh_pain_reports,
+)
+from app.config.cache import (
+    KNOWLEDGE_PANEL_GZIP_LEVEL,
+    KNOWLEDGE_PANEL_RULES_VERSION,
+    KNOWLEDGE_PANEL_STALE_TTL_SECONDS,
+    KNOWLEDGE_PANEL_TTL_SECONDS,
+    EncodedResponse,
+    knowledge_panel_cache,
 )
-from app.config.cache import knowledge_panel_cache
 from app.config.exceptions import ExternalServiceException, ResourceNotFoundException
-from app.config.logging import setup_logging
-from app.schemas.open_food_facts.internal import KnowledgePanelBatchResponse, KnowledgePanelResponse
+from app.config.logging import StageTimer, cache_hit_log_sampler
+from app.config.single_flight import SingleFlight
+from app.schemas.open_food_facts.internal import (
+    KnowledgePanelBatchItem,
+    KnowledgePanelBatchResponse,
+    KnowledgePanelResponse,
+    PainReport,
+)
 
 router = APIRouter()
-logger = setup_logging()
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+# Version of the data behind the knowledge panels, part of their ETags
+KNOWLEDGE_PANEL_VERSION = f"{KNOWLEDGE_PANEL_RULES_VERSION}:{PAIN_TABLE.version}"
+
+# Concurrent stale hits of the same panel (barcode and locale) share one background refresh
+knowledge_panel_refreshes: SingleFlight[None] = SingleFlight()
+
+
+def cache_knowledge_panel(barcode: str, locale: str, response: KnowledgePanelResponse) -> EncodedResponse:
+    """
+    Encode a knowledge panel once and cache its bytes, keeping them servable as stale once their TTL is over.
+    Returns:
+        The encoded panel, to be served as is
+    """
+    encoded = EncodedResponse.from_model(
+        response, gzip_level=KNOWLEDGE_PANEL_GZIP_LEVEL, version=KNOWLEDGE_PANEL_VERSION
+    )
+    knowledge_panel_cache.set(
+        f"knowledge_panel:{barcode}:{locale}",
+        encoded,
+        ttl_seconds=KNOWLEDGE_PANEL_TTL_SECONDS,
+        stale_ttl_seconds=KNOWLEDGE_PANEL_STALE_TTL_SECONDS,
+    )
+    return encoded
+
+
+def knowledge_panel_cache_control(is_stale: bool) -> str:
+    """
+    Let HTTP clients and proxies cache a panel as long as the server does: fresh for its TTL,
+    then servable while they revalidate it for its stale TTL
+    """
+    max_age = 0 if is_stale else KNOWLEDGE_PANEL_TTL_SECONDS
+    return f"public, max-age={max_age}, stale-while-revalidate={KNOWLEDGE_PANEL_STALE_TTL_SECONDS}"
+
+
+def gzip_etag(etag: str) -> str:
+    """ETag of the gzipped representation: strong ETags must differ between content encodings"""
+    return etag[:-1] + '-gzip"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag, with the weak comparison it requires"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return etag in candidates or gzip_etag(etag) in candidates
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """
+    Whether an Accept-Encoding header accepts gzip: listed as "gzip" or "x-gzip", or else matched
+    by "*", with a non-zero quality value
+    """
+    qualities: dict[str, float] = {}
+    for coding in (accept_encoding or "").split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def knowledge_panel_vary(encoded: EncodedResponse) -> str:
+    """
+    Request headers a panel depends on, for shared caches: its language (see LocaleTranslatorMiddleware),
+    and its content encoding when it is also available gzipped
+    """
+    return "Accept-Language, Accept-Encoding" if encoded.gzip_body is not None else "Accept-Language"
+
+
+def knowledge_panel_response(request: Request, encoded: EncodedResponse, is_stale: bool = False) -> Response:
+    """
+    Serve an encoded knowledge panel as is, gzipped when both the client and the encoded panel allow it,
+    with its HTTP caching headers. A request whose If-None-Match matches the panel gets a 304 without body.
+    """
+    body, etag = encoded.body, encoded.etag
+    use_gzip = encoded.gzip_body is not None and accepts_gzip(request.headers.get("accept-encoding"))
+    if use_gzip and encoded.gzip_body is not None:
+        body, etag = encoded.gzip_body, gzip_etag(encoded.etag)
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": knowledge_panel_cache_control(is_stale),
+        "Vary": knowledge_panel_vary(encoded),
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), encoded.etag):
+        return Response(status_code=304, headers=headers)
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(body))
+        return Response(media_type=JSON_MEDIA_TYPE, headers=headers)
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+async def refresh_knowledge_panel(barcode: str, locale: str, translator: tuple[Callable, Callable]) -> None:
+    """
+    Recompute a stale knowledge panel from fresh OFF data and cache it.
+    Run in the background after the stale panel has been served: on failure,
+    the stale panel is kept until it expires.
+    Every stale hit schedules a refresh: the ones of the same panel share the refresh in flight,
+    and the ones running once the panel is fresh again do nothing.
+    """
+    await knowledge_panel_refreshes.do((barcode, locale), lambda: _refresh_knowledge_panel(barcode, locale, translator))
+
+
+async def _refresh_knowledge_panel(barcode: str, locale: str, translator: tuple[Callable, Callable]) -> None:
+    cached = knowledge_panel_cache.get_with_staleness(f"knowledge_panel:{barcode}:{locale}")
+    if cached is not None and not cached[1]:
+        return
+
+    try:
+        pain_report = await refresh_pain_reports(barcode=barcode, locale=locale)
+    except Exception as e:
+        logger.warning(f"Failed to refresh stale knowledge panel for product {barcode} (locale: {locale}): {e}")
+        return
+
+    response = get_knowledge_panel_response(pain_report=pain_report, locale=locale, translator=translator)
+    cache_knowledge_panel(barcode, locale, response)
 
 
 @router.api_route(
@@ -21,57 +177,117 @@ logger = setup_logging()
     response_model=KnowledgePanelResponse,
     response_model_exclude_none=True,
 )
-async def knowledge_panel(request: Request, barcode: str):
+async def knowledge_panel(request: Request, barcode: str, background_tasks: BackgroundTasks):
     """
     API endpoint to return knowledge panel details for a single product.
     Handles both GET and HEAD methods.
+    A stale cached panel is returned right away and refreshed in the background.
+    Panels are cached already encoded: a cache hit is served without validation nor serialization.
+    Panels come with an ETag, and If-None-Match requests are answered with a 304 when it matches.
+    On a cache miss, HEAD only checks that a panel exists for the product, without rendering it.
 
     Args:
         request (Request): The request object.
         barcode (str): The product barcode number.
+        background_tasks: Used to refresh stale panels after the response is sent.
 
     Returns:
-        KnowledgePanelResponse: The knowledge panel response.
+        Response: The encoded KnowledgePanelResponse.
     """
     locale = request.state.locale
     cache_key = f"knowledge_panel:{barcode}:{locale}"
 
     # Try to get from cache first
-    cached_response = knowledge_panel_cache.get(cache_key)
-    if cached_response is not None:
-        logger.info(f"Returning cached knowledge panel for product {barcode} (locale: {locale})")
+    cached = knowledge_panel_cache.get_with_staleness(cache_key)
+    if cached is not None:
+        cached_panel, is_stale = cached
+        if cache_hit_log_sampler.should_log("knowledge_panel"):
+            logger.info(f"Returning cached knowledge panel for product {barcode} (locale: {locale}, stale: {is_stale})")
 
-        if request.method == "HEAD":
-            return Response(status_code=200)
+        if is_stale:
+            background_tasks.add_task(refresh_knowledge_panel, barcode, locale, request.state.translator)
 
-        return cached_response
+        return knowledge_panel_response(request, cached_panel, is_stale)
 
-    logger.info(f"Getting knowledge panel for product {barcode} (locale: {locale})")
+    if request.method == "HEAD":
+        logger.info(f"Checking a knowledge panel exists for product {barcode} (locale: {locale})")
+        await check_knowledge_panel_exists(barcode=barcode, locale=locale)
+        return Response(status_code=200, headers={"Vary": "Accept-Language"})
+
+    timer = StageTimer()
 
     try:
         pain_report = await get_pain_reports(barcode=barcode, locale=locale)
     except (ResourceNotFoundException, ExternalServiceException):
         # Will be handled by the middleware, no need for additional processing here
         raise
+    timer.lap("pain_report")
 
     response = get_knowledge_panel_response(pain_report=pain_report, locale=locale, translator=request.state.translator)
+    timer.lap("render")
 
-    # Cache the response for 1 day (86400 seconds)
-    knowledge_panel_cache.set(cache_key, response, ttl_seconds=86400)
+    encoded = cache_knowledge_panel(barcode, locale, response)
+    timer.lap("encode")
 
-    if request.method == "HEAD":
-        return Response(status_code=200)
+    logger.bind(barcode=barcode, locale=locale, cache="miss", timings_ms=timer.timings_ms).info(
+        f"Rendered knowledge panel for product {barcode} (locale: {locale}) in {timer.total_ms} ms"
+    )
+
+    return knowledge_panel_response(request, encoded)
 
-    return response
+
+def render_batch_item(
+    barcode: str, result: PainReport | BaseException, locale: str, translator: tuple[Callable, Callable]
+) -> EncodedResponse | str:
+    """Render and cache the knowledge panel of a batch product, or report its error message"""
+    if isinstance(result, BaseException):
+        logger.warning(f"Failed to get pain report for product {barcode}: {result}")
+        return str(result)
+
+    response = get_knowledge_panel_response(pain_report=result, translator=translator, locale=locale)
+    return cache_knowledge_panel(barcode, locale, response)
+
+
+def _encode_json(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_batch_item(barcode: str, item: EncodedResponse | str) -> bytes:
+    """Encode one KnowledgePanelBatchItem NDJSON line, splicing the encoded panel in as is"""
+    if isinstance(item, str):
+        return KnowledgePanelBatchItem(barcode=barcode, error=item).model_dump_json(exclude_none=True).encode() + b"\n"
+    return b'{"barcode":' + _encode_json(barcode) + b',"panel":' + item.body + b"}\n"
+
+
+def encode_batch_response(panels: dict[str, EncodedResponse], errors: dict[str, str]) -> bytes:
+    """Encode a KnowledgePanelBatchResponse, splicing the encoded panels in as is"""
+    encoded_panels = b",".join(_encode_json(barcode) + b":" + panel.body for barcode, panel in panels.items())
+    return b'{"panels":{' + encoded_panels + b'},"errors":' + _encode_json(errors) + b"}"
+
+
+async def stream_batch_items(
+    cached_panels: dict[str, EncodedResponse],
+    barcodes_to_fetch: list[str],
+    locale: str,
+    translator: tuple[Callable, Callable],
+) -> AsyncIterator[bytes]:
+    """Yield NDJSON lines: the cached panels first, then each other panel or error as soon as it is ready"""
+    for barcode, panel in cached_panels.items():
+        yield encode_batch_item(barcode, panel)
+
+    async for barcode, result in iter_pain_reports(barcodes=barcodes_to_fetch, locale=locale):
+        yield encode_batch_item(barcode, render_batch_item(barcode, result, locale, translator))
 
 
 @router.get(
     "/knowledge-panel/",
     response_model=KnowledgePanelBatchResponse,
     response_model_exclude_none=True,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
 )
 async def knowledge_panels_batch(
     request: Request,
+    background_tasks: BackgroundTasks,
     code: str = Query(..., description="Comma-separated list of product barcodes"),
 ):
     """
@@ -79,12 +295,18 @@ async def knowledge_panels_batch(
     Processes all barcodes in parallel. Failures on individual barcodes are reported
     in the 'errors' field without affecting the other results.
 
+    With an `Accept: application/x-ndjson` header, the response is streamed instead:
+    one KnowledgePanelBatchItem JSON object per line, cached panels first, then each
+    other panel or error as soon as it is ready.
+
     Args:
         request: The request object.
+        background_tasks: Used to refresh stale panels after the response is sent.
         code: Comma-separated barcodes, e.g. "3017620422003" or "3017620422003,3228857000166"
 
     Returns:
-        KnowledgePanelBatchResponse with 'panels' (successes) and 'errors' (failures)
+        The encoded KnowledgePanelBatchResponse with 'panels' (successes) and 'errors' (failures),
+        the cached panels being spliced in without being encoded again, or a StreamingResponse of NDJSON lines
     """
     locale = request.state.locale
     # dict.fromkeys(...) dedupes while preserving order; a repeated barcode must not
@@ -93,32 +315,37 @@ async def knowledge_panels_batch(
 
     logger.info(f"Getting knowledge panels for {len(barcode_list)} products (locale: {locale})")
 
-    panels: dict = {}
-    errors: dict = {}
+    panels: dict[str, EncodedResponse] = {}
+    errors: dict[str, str] = {}
     barcodes_to_fetch = []
 
     for barcode in barcode_list:
-        cache_key = f"knowledge_panel:{barcode}:{locale}"
-        cached = knowledge_panel_cache.get(cache_key)
+        cached = knowledge_panel_cache.get_with_staleness(f"knowledge_panel:{barcode}:{locale}")
         if cached is not None:
-            logger.info(f"Returning cached knowledge panel for product {barcode} (locale: {locale})")
-            panels[barcode] = cached
+            panels[barcode], is_stale = cached
+            if cache_hit_log_sampler.should_log("knowledge_panels_batch"):
+                logger.info(
+                    f"Returning cached knowledge panel for product {barcode} (locale: {locale}, stale: {is_stale})"
+                )
+            if is_stale:
+                background_tasks.add_task(refresh_knowledge_panel, barcode, locale, request.state.translator)
         else:
             barcodes_to_fetch.append(barcode)
 
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            stream_batch_items(panels, barcodes_to_fetch, locale, request.state.translator),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
     if barcodes_to_fetch:
         pain_reports_by_barcode = await get_pain_reports_batch(barcodes=barcodes_to_fetch, locale=locale)
 
         for barcode, result in pain_reports_by_barcode.items():
-            if isinstance(result, BaseException):
-                logger.warning(f"Failed to get pain report for product {barcode}: {result}")
-                errors[barcode] = str(result)
+            item = render_batch_item(barcode, result, locale, request.state.translator)
+            if isinstance(item, str):
+                errors[barcode] = item
             else:
-                response = get_knowledge_panel_response(
-                    pain_report=result, translator=request.state.translator, locale=locale
-                )
-                cache_key = f"knowledge_panel:{barcode}:{locale}"
-                knowledge_panel_cache.set(cache_key, response, ttl_seconds=86400)
-                panels[barcode] = response
+                panels[barcode] = item
 
-    return KnowledgePanelBatchResponse(panels=panels, errors=errors)
+    return Response(content=encode_batch_response(panels, errors), media_type=JSON_MEDIA_TYPE)
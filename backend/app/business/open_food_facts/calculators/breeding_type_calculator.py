@@ -1,7 +1,7 @@
 import re
-import unicodedata
-from typing import Dict, List
+from typing import Dict, Iterable, List
 
+from app.business.open_food_facts.calculators.tag_index import ResolvedTags, resolve_categories_tags
 from app.enums.open_food_facts.enums import AnimalType, BreedingType, LayingHenBreedingType
 from app.enums.open_food_facts.patterns.breeding_type_patterns import (
     BreedingTypesPatternRepository,
@@ -9,6 +9,7 @@ from app.enums.open_food_facts.patterns.breeding_type_patterns import (
     get_cage_regex,
     get_free_range_regex,
 )
+from app.enums.open_food_facts.patterns.normalization import normalize_words
 from app.schemas.open_food_facts.external import ProductData
 from app.schemas.open_food_facts.internal import ProductType
 
@@ -18,6 +19,41 @@ PatternMap = Dict[BreedingType, PatternType]
 AnimalPatternMap = Dict[tuple[str, str], PatternMap]
 
 
+class BreedingTypeMatcher:
+    """
+    Compiled matcher telling which breeding types have their regex pattern found in texts.
+
+    The patterns are compiled once, and each text is cleaned once for all of them.
+    Patterns of breeding types already found are not searched again in the next texts.
+    """
+
+    def __init__(self, patterns: dict[BreedingType, str]):
+        """
+        Args:
+            patterns: The regex pattern of each breeding type, in the order the matches are reported
+        """
+        self._regexes = {breeding_type: re.compile(pattern) for breeding_type, pattern in patterns.items()}
+
+    def match(self, cleaned_text: str) -> set[BreedingType]:
+        """Return the breeding types whose pattern is found in an already cleaned text."""
+        return {breeding_type for breeding_type, regex in self._regexes.items() if regex.search(cleaned_text)}
+
+    def match_all(self, texts: Iterable[str]) -> list[BreedingType]:
+        """
+        Return the breeding types whose pattern is found in at least one of the texts,
+        in a single pass over the texts.
+        """
+        matched: set[BreedingType] = set()
+        for text in texts:
+            cleaned_text = normalize_words(text)
+            for breeding_type, regex in self._regexes.items():
+                if breeding_type not in matched and regex.search(cleaned_text):
+                    matched.add(breeding_type)
+            if len(matched) == len(self._regexes):
+                break
+        return [breeding_type for breeding_type in self._regexes if breeding_type in matched]
+
+
 class BreedingPatternsRepository:
     """
     This class stores the patterns for exact category tag matches and regex patterns
@@ -26,9 +62,19 @@ class BreedingPatternsRepository:
 
     def __init__(self) -> None:
         """
-        Initializes the repository by loading the breeding patterns from a predefined source.
+        Initializes the repository by loading the breeding patterns from a predefined source,
+        and compiling the regex patterns of each animal type into a matcher.
         """
         self._patterns: dict[AnimalType, AnimalPatternMap] = self._load_patterns()
+        self._matchers: dict[AnimalType, BreedingTypeMatcher] = {
+            animal_type: BreedingTypeMatcher(
+                {
+                    breeding_type: next(iter(pattern_set))
+                    for breeding_type, pattern_set in patterns[("regex", "all")].items()
+                }
+            )
+            for animal_type, patterns in self._patterns.items()
+        }
 
     def get_patterns(self, animal_type: AnimalType) -> AnimalPatternMap:
         """
@@ -46,6 +92,16 @@ class BreedingPatternsRepository:
     def get_all_patterns(self) -> dict[AnimalType, AnimalPatternMap]:
         return self._patterns.copy()
 
+    def get_matcher(self, animal_type: AnimalType) -> BreedingTypeMatcher | None:
+        """
+        Retrieve the compiled regex matcher of a specific animal type.
+        Args:
+            animal_type (AnimalType)
+        Returns:
+            BreedingTypeMatcher | None: The matcher, or None if the animal type has no regex pattern
+        """
+        return self._matchers.get(animal_type)
+
     @staticmethod
     def _load_patterns() -> dict[AnimalType, AnimalPatternMap]:
         """
@@ -55,11 +111,9 @@ class BreedingPatternsRepository:
         """
         return {
             AnimalType.LAYING_HEN: {
-                ("exact", "categories_tags"): {
-                    LayingHenBreedingType.FREE_RANGE: {"en:free-range-chicken-eggs", "en:organic-eggs"},
-                    LayingHenBreedingType.BARN: {"en:barn-chicken-eggs"},
-                    LayingHenBreedingType.CAGE: {"en:cage-chicken-eggs"},
-                },
+                ("exact", "categories_tags"): BreedingTypesPatternRepository.BREEDING_TYPES_BY_CATEGORIES_TAGS[
+                    AnimalType.LAYING_HEN
+                ],
                 ("regex", "all"): {
                     LayingHenBreedingType.FREE_RANGE: {get_free_range_regex()},
                     LayingHenBreedingType.BARN: {get_barn_regex()},
@@ -77,15 +131,19 @@ class BreedingTypeCalculator:
     all animals types registered in BreedingPatternsRepository
     """
 
-    def __init__(self, product_data: ProductData, product_type: ProductType):
+    def __init__(self, product_data: ProductData, product_type: ProductType, resolved_tags: ResolvedTags | None = None):
         """
         Initializes the calculator with the given product data
         and product type computed by the pain report calculator
-        Args :  product_data (ProductData), product_type (ProductType)
+        Args :  product_data (ProductData), product_type (ProductType),
+                resolved_tags (ResolvedTags | None): categories tags already resolved, resolved here if None
         """
         self.product_data = product_data
-        self.patterns_repository = BreedingPatternsRepository()
+        self.patterns_repository = BREEDING_PATTERNS_REPOSITORY
         self.product_type = product_type
+        self.resolved_tags = (
+            resolved_tags if resolved_tags is not None else resolve_categories_tags(product_data.categories_tags)
+        )
 
     def get_breeding_types_by_animal(self) -> dict[AnimalType, List[BreedingType]]:
         """
@@ -113,7 +171,7 @@ class BreedingTypeCalculator:
         Args:  animal_type (AnimalType): The type of animal to determine the breeding type for.
         Returns:  List[BreedingType]: The determined breeding types for the animal.
         """
-        matched = self._match_from_exact_tags(tag="categories_tags", animal_type=animal_type)
+        matched = self._match_from_exact_tags(animal_type=animal_type)
         if len(matched) >= 1:
             return [self._refine_from_country(breeding_type) for breeding_type in matched]
 
@@ -128,21 +186,15 @@ class BreedingTypeCalculator:
                 return []
         return []
 
-    def _match_from_exact_tags(self, tag: str, animal_type: AnimalType) -> list[BreedingType]:
+    def _match_from_exact_tags(self, animal_type: AnimalType) -> list[BreedingType]:
         """
-        Matches breeding types based on one exact tag from product data (only categories_tags possible here).
+        Matches breeding types based on exact categories_tags, already resolved by the tags index.
         Args:
-            tag (str): The type of tag to use for matching (e.g., categories_tags).
             animal_type (AnimalType): The animal type to match against.
         Returns:
             list[BreedingType]: A list of matched breeding types.
         """
-        explored_tags = getattr(self.product_data, tag, None)
-        return [
-            breeding_type
-            for breeding_type, tags in self.patterns_repository.get_patterns(animal_type)[("exact", tag)].items()
-            if explored_tags and any(t in explored_tags for t in tags)
-        ]
+        return list(self.resolved_tags.breeding_types.get(animal_type, []))
 
     def _match_from_regex(self, explored_tags: list[str] | None, animal_type: AnimalType) -> list[BreedingType]:
         """
@@ -152,16 +204,10 @@ class BreedingTypeCalculator:
             animal_type (AnimalType): The animal type for which to perform regex matching.
         Returns:    list[LayingHenBreedingType | BroilerChickenBreedingType]: A list of matched breeding types.
         """
-        matched: list[BreedingType] = []
-        if not explored_tags:
-            return matched
-        for breeding_type, pattern_set in self.patterns_repository.get_patterns(animal_type)[("regex", "all")].items():
-            pattern = next(iter(pattern_set))
-            for tag in explored_tags:
-                if re.search(pattern, self._clean(tag)):
-                    matched.append(breeding_type)
-                    break
-        return matched
+        matcher = self.patterns_repository.get_matcher(animal_type)
+        if not explored_tags or matcher is None:
+            return []
+        return matcher.match_all(explored_tags)
 
     def _get_tags_to_explore(self, step: str) -> list[str]:
         """
@@ -197,19 +243,6 @@ class BreedingTypeCalculator:
                 return LayingHenBreedingType.CONVENTIONAL_CAGE
         return breeding_type
 
-    @staticmethod
-    def _clean(s: str | None) -> str:
-        """
-        Cleans a string by removing accents, replacing punctuation and digits,
-        converting to lowercase, and replacing 'œ' with 'oe' before regex matching.
-        Args:     s (str | None): The string to clean.
 
-        Returns:  str: The cleaned string.
-        """
-        if not s:
-            return ""
-        s = s.lower().replace("œ", "oe")
-        s = unicodedata.normalize("NFD", s)
-        s = "".join(c for c in s if unicodedata.category(c) != "Mn")
-        s = re.sub(r"[^\w\s]|\d+", " ", s)
-        return s
+# Shared by all calculators, so that the patterns are only compiled once per process
+BREEDING_PATTERNS_REPOSITORY = BreedingPatternsRepository()
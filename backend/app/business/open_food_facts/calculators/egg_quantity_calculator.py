@@ -1,11 +1,106 @@
-import re
+from functools import cached_property, lru_cache
 from typing import List
 
+from app.business.open_food_facts.calculators.tag_index import ResolvedTags, resolve_categories_tags
 from app.enums.open_food_facts.enums import EggCaliber, EggQuantity
 from app.enums.open_food_facts.patterns.egg_quantity_patterns import EggQuantityPatternRepository
+from app.enums.open_food_facts.patterns.normalization import (
+    NORMALIZATION_CACHE_SIZE,
+    normalize_egg_caliber,
+    normalize_egg_count,
+    normalize_unicode,
+    normalize_weight,
+)
 from app.schemas.open_food_facts.external import ProductData
 
 
+class EggQuantityText:
+    """
+    A free text field (quantity, product name or generic name) tokenized for the egg quantity rules:
+    caliber words, dozen markers, numbers and their units.
+
+    Each token is extracted from the normalized text the first time a rule needs it, then kept,
+    so that a text is never normalized nor searched twice for the same token.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+    @cached_property
+    def _count_text(self) -> str:
+        return normalize_egg_count(self.text)
+
+    @cached_property
+    def caliber(self) -> EggCaliber | None:
+        """The smallest caliber mentioned (small, medium, large, and then extra-large)"""
+        caliber_text = normalize_egg_caliber(self.text)
+        for caliber, expressions in EggQuantityPatternRepository.EGG_CALIBERS_BY_EXPRESSION.items():
+            if any(expression.search(caliber_text) for expression in expressions):
+                return caliber
+        return None
+
+    @cached_property
+    def dozens(self) -> int | None:
+        """Number of dozens, e.g. 1 for 'one dozen' or 5 for '5 dozen', None without dozen marker"""
+        match = EggQuantityPatternRepository.REGEX_DOZEN.search(self._count_text)
+        if match is None:
+            return None
+        return int(match.group(1)) if match.group(1) else 1
+
+    @cached_property
+    def addition(self) -> int | None:
+        """Sum of the first addition, e.g. 12 for '10+2 eggs'"""
+        match = EggQuantityPatternRepository.REGEX_ADDITION.search(self._count_text)
+        if match is None:
+            return None
+        return int(match.group(1)) + int(match.group(2))
+
+    @cached_property
+    def isolated_number(self) -> int | None:
+        """First number alone or followed by a count unit, e.g. 10 for 'x10', '10' or '10u'"""
+        match = EggQuantityPatternRepository.REGEX_NUMBER_ISOLATED_OR_STUCK_UNIT.search(self._count_text)
+        if match is None:
+            return None
+        return int(match.group(1) or match.group(2))
+
+    @cached_property
+    def number_only(self) -> float | None:
+        """The number, when the text is only a number, e.g. 6 for '6'"""
+        if EggQuantityPatternRepository.REGEX_NUMBERS_ONLY.fullmatch(self._count_text) is None:
+            return None
+        return float(self._count_text)
+
+    @cached_property
+    def numeric_unit(self) -> tuple[float, list[str]] | None:
+        """The leading number and the words of its unit, e.g. (1.5, ['dozen']) for '1.5 dozen'"""
+        match = EggQuantityPatternRepository.REGEX_NUMERIC_UNIT.match(self._count_text)
+        if match is None:
+            return None
+        return float(match.group(1)), match.group(2).lower().split()
+
+    @cached_property
+    def small_number(self) -> int | None:
+        """First number of at most 3 digits, e.g. 6 for 'boite de 6'"""
+        match = EggQuantityPatternRepository.REGEX_EXTRACT_DIGITS.search(self._count_text)
+        if match is None:
+            return None
+        return int(match.group(1))
+
+    @cached_property
+    def weight(self) -> tuple[float, str] | None:
+        """The first number followed by a weight or volume unit, e.g. (500, 'g') for '500 g'"""
+        match = EggQuantityPatternRepository.REGEX_WEIGHT_UNIT.search(normalize_weight(self.text))
+        if match is None:
+            return None
+        return float(match.group(1)), match.group(2).lower().strip()
+
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def tokenize_egg_quantity_text(text: str) -> EggQuantityText:
+    """Returns the tokenized text, shared by all the products having the same text"""
+    return EggQuantityText(text)
+
+
 class EggQuantityCalculator:
     """
     Utility for calculating the weight of eggs using various inputs:
@@ -15,40 +110,31 @@ class EggQuantityCalculator:
     def __init__(self):
         self.pattern_repository = EggQuantityPatternRepository
 
-    def _get_egg_caliber_from_tags(self, categories_tags: List[str]) -> EggCaliber | None:
+    def _get_egg_caliber_from_tags(self, resolved_tags: ResolvedTags) -> EggCaliber | None:
         """
         Returns the egg caliber based on category tags
-        Parses small, medium, large, and then extra-large egg calibers, returns the smallest
-        matching caliber
+        The tags index resolves small, medium, large, and then extra-large egg calibers, returning
+        the smallest matching caliber
 
         Args:
-            categories_tags (List[str]): List of category tags from the product data.
+            resolved_tags (ResolvedTags): The resolved category tags of the product data.
         Returns:
             EggCaliber: The caliber of one egg if a matching tag is found, otherwise None.
         """
-        for caliber, tags in self.pattern_repository.EGG_CALIBERS_BY_TAG.items():
-            if any(tag in categories_tags for tag in tags):
-                return caliber
-        return None
+        return resolved_tags.caliber
 
-    def _get_egg_caliber_from_field(self, field: str) -> EggCaliber | None:
+    def _get_egg_caliber_from_field(self, field: EggQuantityText) -> EggCaliber | None:
         """
         Returns the egg caliber based on a fields, product name or quantity
         Parses small, medium, large, and then extra-large egg calibers, returns the smallest
         matching caliber
 
         Args:
-            field (str): A data field containing product information
+            field (EggQuantityText): A tokenized data field containing product information
         Returns:
             EggCaliber: The caliber of one egg if a matching tag is found, otherwise None.
         """
-        for caliber, expressions in self.pattern_repository.EGG_CALIBERS_BY_EXPRESSION.items():
-            if any(
-                re.search(str, EggQuantityPatternRepository.prepare_string_to_parse_egg_caliber(field))
-                for str in expressions
-            ):
-                return caliber
-        return None
+        return field.caliber
 
     def _get_egg_quantity_from_ingredients(
         self, ingredients_tags: List[str], caliber: EggCaliber | None
@@ -66,76 +152,60 @@ class EggQuantityCalculator:
             return None
 
         for ingredient in ingredients_tags:
-            ingredient = EggQuantityPatternRepository._normalize_common(ingredient)
-            match = re.search(EggQuantityPatternRepository.REGEX_INGREDIENTS, ingredient)
+            match = self.pattern_repository.REGEX_INGREDIENTS.search(normalize_unicode(ingredient))
             if match:
                 return EggQuantity.from_count(count=int(match.group(1)), caliber=caliber)
 
         return None
 
-    def _get_egg_quantity_from_name(self, name: str, caliber: EggCaliber | None) -> EggQuantity | None:
+    def _get_egg_quantity_from_name(self, name: EggQuantityText, caliber: EggCaliber | None) -> EggQuantity | None:
         """
         Calculates egg quantity based on information found in the product name.
 
         Args:
-            product_name (str): The product name from the product data.
+            name (EggQuantityText): The tokenized product name from the product data.
         """
-        name = EggQuantityPatternRepository.prepare_string_to_parse_egg_count(name)
-
         # Case : 'One dozen' or '5 dozen'
-        match = re.search(EggQuantityPatternRepository.REGEX_DOZEN, name)
-        if match:
-            number = int(match.group(1)) if match.group(1) else 1
-            egg_number = number * 12
-            return EggQuantity.from_count(count=egg_number, caliber=caliber)
+        if name.dozens is not None:
+            return EggQuantity.from_count(count=name.dozens * 12, caliber=caliber)
 
         # Case : '10+2 eggs'
-        match = re.search(EggQuantityPatternRepository.REGEX_ADDITION, name)
-        if match:
-            egg_number = int(match.group(1)) + int(match.group(2))
-            return EggQuantity.from_count(count=int(egg_number), caliber=caliber)
+        if name.addition is not None:
+            return EggQuantity.from_count(count=name.addition, caliber=caliber)
 
         # Case : ' 10 [...] eggs' or 'X10' or '10' or '10u
-        matches = re.findall(EggQuantityPatternRepository.REGEX_NUMBER_ISOLATED_OR_STUCK_UNIT, name)
-        if matches:
-            match = matches[0]  # Take the first match
-            egg_number = int(match[0] or match[1])
-            if egg_number <= self.pattern_repository.MAX_EGG_COUNT:
-                return EggQuantity.from_count(count=egg_number, caliber=caliber)
+        if name.isolated_number is not None and name.isolated_number <= self.pattern_repository.MAX_EGG_COUNT:
+            return EggQuantity.from_count(count=name.isolated_number, caliber=caliber)
 
         return None
 
-    def _get_egg_quantity_from_quantity_as_count(self, quantity: str, caliber: EggCaliber | None) -> EggQuantity | None:
+    def _get_egg_quantity_from_quantity_as_count(
+        self, quantity: EggQuantityText, caliber: EggCaliber | None
+    ) -> EggQuantity | None:
         """
         Parses string 'quantity' into egg quantity with count, caliber and weight.
 
         Args:
-            quantity (str): The quantity string to parse, e.g. "6", "1 dozen", "12 large", "x10" etc
+            quantity (EggQuantityText): The tokenized quantity, e.g. "6", "1 dozen", "12 large", "x10" etc
         Returns:
             EggQuantity: The calculated egg quantity with count, total weight, and optional caliber,
             or None if no quantity could be found.
         """
 
-        if not quantity or quantity == "":
+        if not quantity.text:
             return None
 
-        quantity = EggQuantityPatternRepository.prepare_string_to_parse_egg_count(quantity)
-
         # Case : Only numeric (≤30 eggs)
-        if re.fullmatch(self.pattern_repository.REGEX_NUMBERS_ONLY, quantity):
-            num = float(quantity)
-            if num <= self.pattern_repository.MAX_EGG_COUNT:
-                return EggQuantity.from_count(count=int(num), caliber=caliber)
+        if quantity.number_only is not None:
+            if quantity.number_only <= self.pattern_repository.MAX_EGG_COUNT:
+                return EggQuantity.from_count(count=int(quantity.number_only), caliber=caliber)
 
         # Case : Numeric + unit (Latin, Cyrillic, accented, etc.)
-        match = re.match(self.pattern_repository.REGEX_NUMERIC_UNIT, quantity)
-        if match:
-            number = float(match.group(1))
-            unit = match.group(2).lower().split()
+        if quantity.numeric_unit is not None:
+            number, units = quantity.numeric_unit
             # e.g. '1 dozen'
-            if any([u.lower() in self.pattern_repository.DOZEN_EXPRESSIONS for u in unit]):
-                egg_number = int(number * 12)
-                return EggQuantity.from_count(count=egg_number, caliber=caliber)
+            if any(unit in self.pattern_repository.DOZEN_EXPRESSIONS for unit in units):
+                return EggQuantity.from_count(count=int(number * 12), caliber=caliber)
             else:
                 # e.g. '12 unities' or '12 large'
                 egg_number = int(number)
@@ -143,54 +213,39 @@ class EggQuantityCalculator:
                     return EggQuantity.from_count(count=egg_number, caliber=caliber)
 
         # Case : Addition expressions: "10 + 2", "12 + 3 oeufs"
-        match = re.search(self.pattern_repository.REGEX_ADDITION, quantity)
-        if match:
-            egg_number = int(match.group(1)) + int(match.group(2))
-            return EggQuantity.from_count(count=int(egg_number), caliber=caliber)
+        if quantity.addition is not None:
+            return EggQuantity.from_count(count=quantity.addition, caliber=caliber)
 
         # Case : x10 / X10 style ou 10u
-        matches = re.findall(EggQuantityPatternRepository.REGEX_NUMBER_ISOLATED_OR_STUCK_UNIT, quantity)
-        if matches:
-            match = matches[0]  # Take the first match
-            if match:
-                egg_number = int(match[0] or match[1])
-                if egg_number <= self.pattern_repository.MAX_EGG_COUNT:
-                    return EggQuantity.from_count(count=egg_number, caliber=caliber)
+        if quantity.isolated_number is not None and quantity.isolated_number <= self.pattern_repository.MAX_EGG_COUNT:
+            return EggQuantity.from_count(count=quantity.isolated_number, caliber=caliber)
 
         # Case : Single number (e.g. "Boîte de 6")
-        match = re.search(self.pattern_repository.REGEX_EXTRACT_DIGITS, quantity)
-        if match:
-            num = int(match.group(1))
-            if num < self.pattern_repository.MAX_EGG_COUNT:
-                return EggQuantity.from_count(count=int(num), caliber=caliber)
+        if quantity.small_number is not None and quantity.small_number < self.pattern_repository.MAX_EGG_COUNT:
+            return EggQuantity.from_count(count=quantity.small_number, caliber=caliber)
 
         # If no patterns matched, return None
         return None
 
     def _get_egg_quantity_from_quantity_as_weight(
-        self, quantity: str, caliber: EggCaliber | None
+        self, quantity: EggQuantityText, caliber: EggCaliber | None
     ) -> EggQuantity | None:
         """
         Parses string 'quantity' into egg weight if no count was found
 
         Args:
-            quantity (str): The quantity string to parse, e.g. "500 g", "1.5 lbs", "0.5 kg" etc
+            quantity (EggQuantityText): The tokenized quantity, e.g. "500 g", "1.5 lbs", "0.5 kg" etc
         Returns:
             EggQuantity: The calculated egg quantity with count, total weight, and optional caliber,
             or None if no quantity could be found.
         """
 
-        if not quantity or quantity == "":
+        if not quantity.text:
             return None
 
-        quantity = EggQuantityPatternRepository.prepare_string_to_parse_weight(quantity)
-
         # Find 100 g or 10 oz
-        match = re.findall(self.pattern_repository.REGEX_WEIGHT_UNIT, quantity)
-        if match:
-            match = match[0]  # Take the first match
-            number = float(match[0])
-            unit = match[1].lower().strip()
+        if quantity.weight is not None:
+            number, unit = quantity.weight
             converter = self.pattern_repository.UNIT_CONVERSIONS.get(unit)
             if converter:
                 try:
@@ -200,7 +255,7 @@ class EggQuantityCalculator:
                     pass
 
         # If no patterns matched, return None
-        print(f"Could not parse quantity as weight: {quantity}")
+        print(f"Could not parse quantity as weight: {normalize_weight(quantity.text)}")
         return None
 
     def _get_egg_quantity_from_product_quantity_and_unit(
@@ -234,7 +289,9 @@ class EggQuantityCalculator:
         print(f"Could not parse quantity and unit: {quantity} {unit}")
         return None
 
-    def calculate_egg_quantity(self, product_data: ProductData) -> EggQuantity | None:
+    def calculate_egg_quantity(
+        self, product_data: ProductData, resolved_tags: ResolvedTags | None = None
+    ) -> EggQuantity | None:
         """
         Calculates egg quantity based on the product data.
         First parses categories tags, product name, generic name and quantity to determine the egg caliber.
@@ -249,19 +306,23 @@ class EggQuantityCalculator:
 
         Args:
             product_data (ProductData): The product data containing quantity, unit, and categories tags.
+            resolved_tags (ResolvedTags | None): The categories tags already resolved, resolved here if None.
         Returns:
             EggQuantity: The calculated egg quantity with count, total weight, and optional caliber,
             or None if no quantity could be found.
         """
         product_quantity = product_data.product_quantity
         unit = product_data.product_quantity_unit
-        quantity = product_data.quantity or ""
-        categories_tags = product_data.categories_tags or []
-        product_name = product_data.product_name or ""
-        generic_name = product_data.generic_name or ""
+        # Each text is tokenized once, for both the caliber and the quantity rules
+        quantity = tokenize_egg_quantity_text(product_data.quantity or "")
+        product_name = tokenize_egg_quantity_text(product_data.product_name or "")
+        generic_name = tokenize_egg_quantity_text(product_data.generic_name or "")
         ingredients_tags = product_data.ingredients_tags or []
 
-        caliber = self._get_egg_caliber_from_tags(categories_tags)
+        if resolved_tags is None:
+            resolved_tags = resolve_categories_tags(product_data.categories_tags)
+
+        caliber = self._get_egg_caliber_from_tags(resolved_tags)
         if not caliber:
             caliber = self._get_egg_caliber_from_field(product_name)
         if not caliber:
@@ -271,7 +332,7 @@ class EggQuantityCalculator:
 
         egg_quantity = None
 
-        if quantity:
+        if quantity.text:
             egg_quantity = self._get_egg_quantity_from_quantity_as_count(quantity, caliber)
         if not egg_quantity:
             egg_quantity = self._get_egg_quantity_from_name(product_name, caliber)
@@ -281,7 +342,7 @@ class EggQuantityCalculator:
             egg_quantity = self._get_egg_quantity_from_ingredients(ingredients_tags, caliber)
         if (product_quantity and unit) and (not egg_quantity):
             egg_quantity = self._get_egg_quantity_from_product_quantity_and_unit(product_quantity, unit, caliber)
-        if quantity and (not egg_quantity):
+        if quantity.text and (not egg_quantity):
             egg_quantity = self._get_egg_quantity_from_quantity_as_weight(quantity, caliber)
 
         return egg_quantity
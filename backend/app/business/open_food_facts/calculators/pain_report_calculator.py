@@ -1,15 +1,15 @@
-from typing import List
+from typing import Iterator, Sequence, TypeAlias
 
 from app.business.open_food_facts.calculators.breeding_type_calculator import BreedingTypeCalculator
 from app.business.open_food_facts.calculators.product_type_calculator import get_product_type
 from app.business.open_food_facts.calculators.quantity_calculator import QuantityCalculator
-from app.business.open_food_facts.calculators.unit_pain_loader import PAIN_PER_EGG_IN_SECONDS
+from app.business.open_food_facts.calculators.tag_index import resolve_categories_tags
+from app.business.open_food_facts.calculators.unit_pain_loader import PAIN_TABLE
 from app.config.exceptions import MissingBreedingType, ResourceNotFoundException
+from app.config.metrics import observe_stage
 from app.enums.open_food_facts.enums import (
     AnimalType,
     EggCaliber,
-    PainIntensity,
-    PainType,
     ProductQuantity,
 )
 from app.schemas.open_food_facts.external import ProductData
@@ -23,6 +23,9 @@ from app.schemas.open_food_facts.internal import (
     Scenario,
 )
 
+# Breeding type, egg caliber and egg count of a scenario, to look up its pain levels in PAIN_TABLE
+PainTableLookup: TypeAlias = tuple[BreedingType, EggCaliber, int]
+
 
 class PainReportCalculator:
     """
@@ -37,9 +40,13 @@ class PainReportCalculator:
             product_data: ProductData instance containing categories_tags and labels_tags.
         """
         self.product_data = product_data
-        self.product_type = get_product_type(self.product_data)
-        self.breeding_types = self._get_breeding_types()
-        self.quantities = self._get_quantities()
+        # Categories tags are resolved once, for all the calculators
+        self.resolved_tags = resolve_categories_tags(self.product_data.categories_tags)
+        self.product_type = get_product_type(self.product_data, self.resolved_tags)
+        with observe_stage("calculator_breeding_types"):
+            self.breeding_types = self._get_breeding_types()
+        with observe_stage("calculator_quantities"):
+            self.quantities = self._get_quantities()
         self.breeding_types_and_quantities = self._get_breeding_types_and_quantities()
 
     def _get_product_type(self) -> ProductType:
@@ -50,14 +57,7 @@ class PainReportCalculator:
         Returns:
             ProductType instance indicating if the product is mixed and the set of animal types.
         """
-        animal_types = set()
-        for animal_type in AnimalType:
-            if (
-                animal_type.is_computed
-                and self.product_data.categories_tags
-                and animal_type.categories_tags in self.product_data.categories_tags
-            ):
-                animal_types.add(animal_type)
+        animal_types = {animal_type for animal_type in self.resolved_tags.animal_types if animal_type.is_computed}
         if not animal_types:
             raise ResourceNotFoundException("No animal types found in product data")
         elif len(animal_types) == 1:
@@ -81,26 +81,39 @@ class PainReportCalculator:
             A complete pain report, with error messages for animals as an option
         """
 
+        return compute_pain_reports([self])[0]
+
+    def _get_scenarios_breeding_types_and_quantities(self) -> list[BreedingTypeAndQuantity]:
+        """
+        Returns the breeding type and quantity of each scenario: one per breeding type found, possibly none.
+        Mixed products are not managed: they have no scenario.
+        """
         if self.product_type.is_mixed:
-            # not managed
-            return PainReport(
-                scenarios=[],
-                product_name=self.product_data.product_name,
-                product_image_url=self.product_data.image_url,
-                product_type=self.product_type,
-            )
+            return []
 
         animal_type = list(self.product_type.animal_types)[0]
-
-        breeding_types_and_quantity = self.breeding_types_and_quantities.get(
+        return self.breeding_types_and_quantities.get(
             animal_type, [BreedingTypeAndQuantity(breeding_type=None, quantity=None)]
         )
 
-        # compute a scenario for each breeding type found, possibly none
+    def _build_pain_report(self, seconds_in_pain: Iterator[list[int]]) -> PainReport:
+        """
+        Build the pain report from the seconds in pain looked up for the scenarios of the product.
+
+        Args:
+            seconds_in_pain: The seconds in pain of each pain level of the next scenarios with a pain table lookup,
+                in the order of `_get_pain_table_lookup` calls
+        """
         scenarios = []
-        for breeding_type_and_quantity in breeding_types_and_quantity:
+        for breeding_type_and_quantity in self._get_scenarios_breeding_types_and_quantities():
+            animal_type = list(self.product_type.animal_types)[0]
             try:
-                pain_levels = self._generate_pain_levels_for_animal(animal_type, breeding_type_and_quantity)
+                lookup = self._get_pain_table_lookup(animal_type, breeding_type_and_quantity)
+                seconds = next(seconds_in_pain) if lookup is not None else [0] * len(PAIN_TABLE.pain_levels)
+                pain_levels = [
+                    PainLevelData(pain_intensity=pain_intensity, pain_type=pain_type, seconds_in_pain=value)
+                    for (pain_type, pain_intensity), value in zip(PAIN_TABLE.pain_levels, seconds, strict=True)
+                ]
             except MissingBreedingType:
                 pain_levels = []
 
@@ -118,56 +131,19 @@ class PainReportCalculator:
             product_type=self.product_type,
         )
 
-    def _generate_pain_levels_for_animal(
-        self, animal_type: AnimalType, breeding_type: BreedingTypeAndQuantity
-    ) -> List[PainLevelData]:
-        """
-        Generate pain levels for a specific animal type and breeding type.
-
-        Args:
-            animal_type: The type of animal
-            breeding_type: The breeding type with quantity information
-
-        Returns:
-            List of PainLevelData objects for all pain types and intensities
-        """
-        pain_levels = []
-
-        # Process each pain type
-        for pain_type in PainType:
-            pain_levels.extend(self._generate_pain_levels_for_pain_type(animal_type, breeding_type, pain_type))
-
-        return pain_levels
-
-    def _generate_pain_levels_for_pain_type(
-        self, animal_type: AnimalType, breeding_type_and_quantity: BreedingTypeAndQuantity, pain_type: PainType
-    ) -> List[PainLevelData]:
-        """
-        Generate pain levels for a specific animal, breeding type, and pain type.
-
-        Args:
-            animal_type: The type of animal
-            breeding_type: The breeding type with quantity information
-            pain_type: The type of pain (physical or psychological)
-
-        Returns:
-            List of PainLevelData objects for all pain intensities of the given type
-        """
-        pain_levels = []
-
-        # Process each pain intensity for this pain type
-        for pain_intensity in PainIntensity:
-            # Calculate seconds in pain for this animal, pain type, and intensity
-            seconds_in_pain = self._calculate_time_in_pain_for_animal_with_type(
-                animal_type, breeding_type_and_quantity, pain_type, pain_intensity
-            )
-
-            # Add pain level entry
-            pain_levels.append(
-                PainLevelData(pain_intensity=pain_intensity, pain_type=pain_type, seconds_in_pain=seconds_in_pain)
-            )
-
-        return pain_levels
+    def _get_pain_table_lookups(self) -> list[PainTableLookup]:
+        """Returns the pain table lookups of the scenarios whose pain levels are computed, in scenario order"""
+        lookups = []
+        for breeding_type_and_quantity in self._get_scenarios_breeding_types_and_quantities():
+            try:
+                lookup = self._get_pain_table_lookup(
+                    list(self.product_type.animal_types)[0], breeding_type_and_quantity
+                )
+            except MissingBreedingType:
+                continue
+            if lookup is not None:
+                lookups.append(lookup)
+        return lookups
 
     def _get_breeding_types_and_quantities(self) -> dict[AnimalType, list[BreedingTypeAndQuantity]]:
         """
@@ -213,16 +189,18 @@ class PainReportCalculator:
             all the breeding types found for the different batches
         """
         if self.product_type.is_mixed:
-            return BreedingTypeCalculator(self.product_data, self.product_type).get_breeding_types_by_animal()
+            return BreedingTypeCalculator(
+                self.product_data, self.product_type, self.resolved_tags
+            ).get_breeding_types_by_animal()
 
         else:
             try:
                 animal_type = list(self.product_type.animal_types)[0]
             except IndexError:
                 raise IndexError("Issue with product type : no animal types found but not mixed")
-            breeding_types = BreedingTypeCalculator(self.product_data, self.product_type).get_breeding_types(
-                animal_type=animal_type
-            )
+            breeding_types = BreedingTypeCalculator(
+                self.product_data, self.product_type, self.resolved_tags
+            ).get_breeding_types(animal_type=animal_type)
             return {animal_type: breeding_types}
 
     def _get_quantities(self) -> dict[AnimalType, ProductQuantity | None]:
@@ -237,33 +215,35 @@ class PainReportCalculator:
             instances and values are their associated quantities (in grams).
         """
         if self.product_type.is_mixed:
-            return QuantityCalculator(self.product_data, self.product_type).get_quantities_by_animal()
+            return QuantityCalculator(
+                self.product_data, self.product_type, self.resolved_tags
+            ).get_quantities_by_animal()
         else:
             try:
                 animal_type = list(self.product_type.animal_types)[0]
             except IndexError:
                 return {}
-            quantity = QuantityCalculator(self.product_data, self.product_type).get_quantity(animal_type)
+            quantity = QuantityCalculator(self.product_data, self.product_type, self.resolved_tags).get_quantity(
+                animal_type
+            )
             return {animal_type: quantity}
 
-    def _calculate_time_in_pain_for_animal_with_type(
-        self,
-        animal_type: AnimalType,
-        breeding_type_and_quantity: BreedingTypeAndQuantity,
-        pain_type: PainType,
-        pain_intensity: PainIntensity,
-    ) -> int:
+    def _get_pain_table_lookup(
+        self, animal_type: AnimalType, breeding_type_and_quantity: BreedingTypeAndQuantity
+    ) -> PainTableLookup | None:
         """
-        Calculates time in pain for a given animal type, breeding type, pain type, and pain intensity.
+        Returns what to look up in the dense pain table to get the time in pain of a scenario,
+        for all pain types and intensities at once.
 
         Args:
             animal_type: The type of animal
             breeding_type_and_quantity: A BreedingTypeAndQuantity object
-            pain_type: The type of pain (physical or psychological)
-            pain_intensity: Pain intensity (from PainIntensity enum)
 
         Returns:
-            Duration of pain in seconds
+            The breeding type, egg caliber and egg count, or None when the animal is not in the pain table:
+            its time in pain is 0 for every pain level
+        Raises:
+            MissingBreedingType: If the breeding type is unknown, so that no pain level can be computed
         """
         breeding_type = breeding_type_and_quantity.breeding_type
         quantity = breeding_type_and_quantity.quantity
@@ -271,25 +251,37 @@ class PainReportCalculator:
         if breeding_type is None:
             raise MissingBreedingType()
 
-        if animal_type == AnimalType.LAYING_HEN:
-            try:
-                if quantity:
-                    caliber = quantity.caliber or EggCaliber.AVERAGE
-                    count = quantity.count
-                else:
-                    caliber = EggCaliber.AVERAGE
-                    count = 1
-
-                # Get the time in pain per egg for this combination of parameters
-                # Default to 0 if any level in the hierarchy is missing
-                time_in_pain = PAIN_PER_EGG_IN_SECONDS[animal_type][breeding_type][pain_type][pain_intensity][caliber]
-            except (KeyError, TypeError):
-                # This combination of animal, breeding type, pain type, and intensity is not defined
-                return 0
-
-            # Scale the time in pain based on the number of eggs
-            return int(time_in_pain * count)
-
         # Pain can only be computed for laying hens
+        if animal_type != AnimalType.LAYING_HEN:
+            return None
+
+        if quantity:
+            caliber = quantity.caliber or EggCaliber.AVERAGE
+            count = quantity.count
         else:
-            return 0
+            caliber = EggCaliber.AVERAGE
+            count = 1
+
+        return breeding_type, caliber, count
+
+
+def compute_pain_reports(calculators: Sequence[PainReportCalculator]) -> list[PainReport]:
+    """
+    Generate the pain reports of many products, looking up the time in pain of all their scenarios
+    in a single vectorized operation on the pain table (see PainTable.batch_seconds_in_pain).
+
+    Args:
+        calculators: The calculator of each product
+
+    Returns:
+        The pain report of each product, in the order of the calculators
+    """
+    lookups = [lookup for calculator in calculators for lookup in calculator._get_pain_table_lookups()]
+    seconds_in_pain = iter(
+        PAIN_TABLE.batch_seconds_in_pain(
+            [breeding_type for breeding_type, _, _ in lookups],
+            [caliber for _, caliber, _ in lookups],
+            [count for _, _, count in lookups],
+        ).tolist()
+    )
+    return [calculator._build_pain_report(seconds_in_pain) for calculator in calculators]
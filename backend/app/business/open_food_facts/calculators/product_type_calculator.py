@@ -1,29 +1,33 @@
 import re
 
+from app.business.open_food_facts.calculators.tag_index import ResolvedTags, resolve_categories_tags
 from app.config.exceptions import EggButNotFreshEgg, ResourceNotFoundException
 from app.enums.open_food_facts.enums import AnimalType
+from app.enums.open_food_facts.patterns.normalization import normalize_words
 from app.enums.open_food_facts.patterns.product_type_patterns import ProductTypePatternRepository
 from app.schemas.open_food_facts.external import ProductData
 from app.schemas.open_food_facts.internal import PainReport, ProductType
 
 
-def get_product_type(product_data: ProductData) -> ProductType:
+def get_product_type(product_data: ProductData, resolved_tags: ResolvedTags | None = None) -> ProductType:
     """
     Determine the product type based on the product data.
     checks if the product is mixed or single animal type,
     and identifies the animal types present.
+    Args:
+        product_data (ProductData): The product data containing categories_tags.
+        resolved_tags (ResolvedTags | None): The categories tags already resolved, resolved here if None.
     Returns:
         ProductType instance indicating if the product is mixed and the set of animal types.
     """
+    if resolved_tags is None:
+        resolved_tags = resolve_categories_tags(product_data.categories_tags)
+
     animal_types: set[AnimalType] = set()
-    for animal_type in AnimalType:
-        if (
-            animal_type.is_computed
-            and product_data.categories_tags
-            and animal_type.categories_tags in product_data.categories_tags
-        ):
+    for animal_type in resolved_tags.animal_types:
+        if animal_type.is_computed:
             if animal_type == AnimalType.LAYING_HEN:
-                if is_fresh_chicken_egg(product_data):
+                if is_fresh_chicken_egg(product_data, resolved_tags):
                     animal_types.add(animal_type)
 
                 # temp fix to display specific information for this kind of product
@@ -46,7 +50,7 @@ def get_product_type(product_data: ProductData) -> ProductType:
         return ProductType(is_mixed=True, animal_types=animal_types)
 
 
-def is_fresh_chicken_egg(product_data: ProductData) -> bool:
+def is_fresh_chicken_egg(product_data: ProductData, resolved_tags: ResolvedTags | None = None) -> bool:
     """
     Determine if the product is a fresh chicken egg based on its categories tags.
     Checks :
@@ -57,16 +61,18 @@ def is_fresh_chicken_egg(product_data: ProductData) -> bool:
         - if none of the above conditions are met, it is considered a fresh chicken egg
     Args:
         product_data (ProductData): The product data containing categories_tags.
+        resolved_tags (ResolvedTags | None): The categories tags already resolved, resolved here if None.
     Returns:
         bool: True if the product is a fresh chicken egg, False otherwise.
     """
-    categories_tags = product_data.categories_tags or []
+    if resolved_tags is None:
+        resolved_tags = resolve_categories_tags(product_data.categories_tags)
 
-    if all(tag in ProductTypePatternRepository.FRESH_CHICKEN_EGG_TAGS for tag in categories_tags):
+    if resolved_tags.only_fresh_chicken_egg_tags:
         return True
 
     names = {product_data.product_name, product_data.generic_name}
-    names = {ProductTypePatternRepository.clean(name.lower()) for name in names if name}
+    names = {normalize_words(name) for name in names if name}
 
     if (
         names
@@ -75,7 +81,7 @@ def is_fresh_chicken_egg(product_data: ProductData) -> bool:
     ):
         return True
 
-    if categories_tags and any(tag in ProductTypePatternRepository.EXCLUDED_CATEGORY_TAGS for tag in categories_tags):
+    if resolved_tags.has_excluded_tag:
         return False
 
     if names and any({re.search(ProductTypePatternRepository.EXCLUDED_PATTERNS, name) for name in names if name}):
@@ -1,4 +1,5 @@
 from app.business.open_food_facts.calculators.egg_quantity_calculator import EggQuantityCalculator
+from app.business.open_food_facts.calculators.tag_index import ResolvedTags
 from app.enums.open_food_facts.enums import ProductQuantity
 from app.schemas.open_food_facts.external import ProductData
 from app.schemas.open_food_facts.internal import AnimalType, ProductType
@@ -10,17 +11,19 @@ class QuantityCalculator:
     and type. Supports specific logic for egg-based products (LAYING_HEN).
     """
 
-    def __init__(self, product_data: ProductData, product_type: ProductType):
+    def __init__(self, product_data: ProductData, product_type: ProductType, resolved_tags: ResolvedTags | None = None):
         """
         Initializes the calculator with product data and type.
 
         Args:
             product_data (ProductData): Structured product information including quantity, unit, and tags.
             product_type (ProductType): The type of product, including associated animal types.
+            resolved_tags (ResolvedTags | None): The categories tags already resolved, resolved on demand if None.
         """
 
         self.product_data = product_data
         self.product_type = product_type
+        self.resolved_tags = resolved_tags
 
     def get_quantities_by_animal(self) -> dict[AnimalType, ProductQuantity | None]:
         """
@@ -49,7 +52,7 @@ class QuantityCalculator:
             None is not found or animal is not managed
         """
         if animal_type == AnimalType.LAYING_HEN:
-            quantity = EggQuantityCalculator().calculate_egg_quantity(self.product_data)
+            quantity = EggQuantityCalculator().calculate_egg_quantity(self.product_data, self.resolved_tags)
             return quantity
         else:
             return None
@@ -0,0 +1,129 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from app.enums.open_food_facts.enums import AnimalType, BreedingType, EggCaliber
+from app.enums.open_food_facts.patterns.breeding_type_patterns import BreedingTypesPatternRepository
+from app.enums.open_food_facts.patterns.egg_quantity_patterns import EggQuantityPatternRepository
+from app.enums.open_food_facts.patterns.product_type_patterns import ProductTypePatternRepository
+
+_BREEDING_TYPES_BY_CATEGORIES_TAGS = BreedingTypesPatternRepository.BREEDING_TYPES_BY_CATEGORIES_TAGS
+
+
+@dataclass(frozen=True)
+class TagInfo:
+    """
+    What a single categories tag tells about a product, on its own.
+    """
+
+    animal_types: frozenset[AnimalType] = frozenset()
+    breeding_types: frozenset[tuple[AnimalType, BreedingType]] = frozenset()
+    caliber: EggCaliber | None = None
+    # Category of egg products which are not fresh eggs (egg yolk, boiled eggs...)
+    excluded: bool = False
+    # One of the categories tags that together indicate a fresh chicken egg
+    fresh_chicken_egg: bool = False
+
+
+@dataclass(frozen=True)
+class ResolvedTags:
+    """
+    What the categories tags of a product tell, resolved once and shared by all the calculators.
+    """
+
+    tags: frozenset[str] = frozenset()
+    animal_types: frozenset[AnimalType] = frozenset()
+    # Breeding types found for each animal type, in the order of BREEDING_TYPES_BY_CATEGORIES_TAGS
+    breeding_types: dict[AnimalType, list[BreedingType]] = field(default_factory=dict)
+    # Smallest caliber found, in the order of EGG_CALIBERS_BY_TAG
+    caliber: EggCaliber | None = None
+    has_excluded_tag: bool = False
+    # True when every tag is a fresh chicken egg tag, including when there is no tag at all
+    only_fresh_chicken_egg_tags: bool = True
+
+
+def _build_tag_index() -> dict[str, TagInfo]:
+    """
+    Inverts the tags patterns of the repositories into a tag -> TagInfo index.
+    Returns:
+        dict[str, TagInfo]: The information of every known categories tag
+    """
+    animal_types: dict[str, set[AnimalType]] = {}
+    for animal_type in AnimalType:
+        animal_types.setdefault(animal_type.categories_tags, set()).add(animal_type)
+
+    breeding_types: dict[str, set[tuple[AnimalType, BreedingType]]] = {}
+    for animal_type, tags_by_breeding_type in _BREEDING_TYPES_BY_CATEGORIES_TAGS.items():
+        for breeding_type, tags in tags_by_breeding_type.items():
+            for tag in tags:
+                breeding_types.setdefault(tag, set()).add((animal_type, breeding_type))
+
+    calibers: dict[str, EggCaliber] = {}
+    for caliber, tags in EggQuantityPatternRepository.EGG_CALIBERS_BY_TAG.items():
+        for tag in tags:
+            # Calibers are listed from the smallest one, which wins
+            calibers.setdefault(tag, caliber)
+
+    excluded = ProductTypePatternRepository.EXCLUDED_CATEGORY_TAGS
+    fresh_chicken_egg = ProductTypePatternRepository.FRESH_CHICKEN_EGG_TAGS
+
+    all_tags = set(animal_types) | set(breeding_types) | set(calibers) | excluded | fresh_chicken_egg
+    return {
+        tag: TagInfo(
+            animal_types=frozenset(animal_types.get(tag, ())),
+            breeding_types=frozenset(breeding_types.get(tag, ())),
+            caliber=calibers.get(tag),
+            excluded=tag in excluded,
+            fresh_chicken_egg=tag in fresh_chicken_egg,
+        )
+        for tag in all_tags
+    }
+
+
+TAG_INDEX: dict[str, TagInfo] = _build_tag_index()
+
+_CALIBER_RANKS = {caliber: rank for rank, caliber in enumerate(EggQuantityPatternRepository.EGG_CALIBERS_BY_TAG)}
+
+
+def resolve_categories_tags(categories_tags: Iterable[str] | None) -> ResolvedTags:
+    """
+    Resolves the categories tags of a product against TAG_INDEX, in a single pass over them.
+    Args:
+        categories_tags (Iterable[str] | None): The categories tags of the product
+    Returns:
+        ResolvedTags: What the tags tell about the product
+    """
+    tags = frozenset(categories_tags or ())
+
+    animal_types: set[AnimalType] = set()
+    breeding_types: set[tuple[AnimalType, BreedingType]] = set()
+    caliber: EggCaliber | None = None
+    has_excluded_tag = False
+    only_fresh_chicken_egg_tags = True
+
+    for tag in tags:
+        info = TAG_INDEX.get(tag)
+        if info is None:
+            only_fresh_chicken_egg_tags = False
+            continue
+        animal_types |= info.animal_types
+        breeding_types |= info.breeding_types
+        if info.caliber is not None and (caliber is None or _CALIBER_RANKS[info.caliber] < _CALIBER_RANKS[caliber]):
+            caliber = info.caliber
+        has_excluded_tag = has_excluded_tag or info.excluded
+        only_fresh_chicken_egg_tags = only_fresh_chicken_egg_tags and info.fresh_chicken_egg
+
+    return ResolvedTags(
+        tags=tags,
+        animal_types=frozenset(animal_types),
+        breeding_types={
+            animal_type: [
+                breeding_type
+                for breeding_type in tags_by_breeding_type
+                if (animal_type, breeding_type) in breeding_types
+            ]
+            for animal_type, tags_by_breeding_type in _BREEDING_TYPES_BY_CATEGORIES_TAGS.items()
+        },
+        caliber=caliber,
+        has_excluded_tag=has_excluded_tag,
+        only_fresh_chicken_egg_tags=only_fresh_chicken_egg_tags,
+    )
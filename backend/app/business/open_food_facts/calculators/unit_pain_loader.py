@@ -1,7 +1,11 @@
 import csv
+import hashlib
+from array import array
 from collections import defaultdict
 from pathlib import Path
-from typing import DefaultDict, Dict, TextIO, TypeAlias
+from typing import DefaultDict, Dict, Sequence, TextIO, TypeAlias
+
+import numpy as np
 
 from app.enums.open_food_facts.enums import (
     AnimalType,
@@ -72,4 +76,84 @@ def get_pain_per_egg_data() -> LayingHenPainPerProductUnit:
         raise FileNotFoundError(f"CSV pain data not found: {csv_path}")
 
 
+class PainTable:
+    """
+    Dense table of the pain per egg of laying hens, in seconds.
+
+    The values are kept in a flat array of doubles, indexed by the ordinals of
+    breeding type x pain type x pain intensity x caliber, so that looking up all the pain levels
+    of an egg is a single slice. The same values are viewed without copy as a NumPy array of that shape,
+    to look up the pain levels of many eggs at once.
+
+    Combinations missing from the pain data are worth 0 seconds.
+    """
+
+    BREEDING_TYPES: tuple[BreedingType, ...] = tuple(LayingHenBreedingType)
+    PAIN_TYPES: tuple[PainType, ...] = tuple(PainType)
+    PAIN_INTENSITIES: tuple[PainIntensity, ...] = tuple(PainIntensity)
+    CALIBERS: tuple[EggCaliber, ...] = tuple(EggCaliber)
+
+    def __init__(self, pain_per_egg: Dict[BreedingType, Dict[PainType, Dict[PainIntensity, Dict[EggCaliber, float]]]]):
+        self.shape = (len(self.BREEDING_TYPES), len(self.PAIN_TYPES), len(self.PAIN_INTENSITIES), len(self.CALIBERS))
+        self.values = array(
+            "d",
+            [
+                pain_per_egg.get(breeding_type, {}).get(pain_type, {}).get(pain_intensity, {}).get(caliber, 0.0)
+                for breeding_type in self.BREEDING_TYPES
+                for pain_type in self.PAIN_TYPES
+                for pain_intensity in self.PAIN_INTENSITIES
+                for caliber in self.CALIBERS
+            ],
+        )
+        # Order of the pain levels returned for an egg
+        self.pain_levels: tuple[tuple[PainType, PainIntensity], ...] = tuple(
+            (pain_type, pain_intensity) for pain_type in self.PAIN_TYPES for pain_intensity in self.PAIN_INTENSITIES
+        )
+        self.breeding_type_ordinals = {breeding_type: i for i, breeding_type in enumerate(self.BREEDING_TYPES)}
+        self.caliber_ordinals = {caliber: i for i, caliber in enumerate(self.CALIBERS)}
+        # View of the values without copy: breeding type x pain type x pain intensity x caliber
+        self.array = np.frombuffer(self.values).reshape(self.shape)
+        # Changes whenever a pain value changes, e.g. to invalidate the panels cached by HTTP clients
+        self.version = hashlib.sha256(self.values.tobytes()).hexdigest()[:16]
+
+    def seconds_in_pain(self, breeding_type: BreedingType, caliber: EggCaliber, count: int) -> list[int]:
+        """
+        Returns the seconds in pain of each pain level (in the order of `pain_levels`) for a number of eggs.
+        """
+        calibers_count = self.shape[3]
+        start = self.breeding_type_ordinals[breeding_type] * len(self.pain_levels) * calibers_count
+        stop = start + len(self.pain_levels) * calibers_count
+        return [
+            int(value * count) for value in self.values[start + self.caliber_ordinals[caliber] : stop : calibers_count]
+        ]
+
+    def batch_seconds_in_pain(
+        self, breeding_types: Sequence[BreedingType], calibers: Sequence[EggCaliber], counts: Sequence[int]
+    ) -> np.ndarray:
+        """
+        Returns the seconds in pain of each pain level for many (breeding type, caliber, count) at once,
+        with a single vectorized lookup in the table. The values are truncated like seconds_in_pain.
+
+        Args:
+            breeding_types: The breeding type of each item
+            calibers: The egg caliber of each item
+            counts: The number of eggs of each item
+
+        Returns:
+            An array of integers with a row per item, and a column per pain level, in the order of `pain_levels`
+        """
+        if not len(breeding_types) == len(calibers) == len(counts):
+            raise ValueError("breeding_types, calibers and counts must have the same length")
+        breeding_type_ordinals = np.array(
+            [self.breeding_type_ordinals[breeding_type] for breeding_type in breeding_types], dtype=np.intp
+        )
+        caliber_ordinals = np.array([self.caliber_ordinals[caliber] for caliber in calibers], dtype=np.intp)
+        pain_per_egg = self.array[breeding_type_ordinals, :, :, caliber_ordinals].reshape(
+            len(counts), len(self.pain_levels)
+        )
+        return (pain_per_egg * np.asarray(counts, dtype=np.float64)[:, np.newaxis]).astype(np.int64)
+
+
 PAIN_PER_EGG_IN_SECONDS = get_pain_per_egg_data()
+
+PAIN_TABLE = PainTable(PAIN_PER_EGG_IN_SECONDS[AnimalType.LAYING_HEN])
@@ -1,13 +1,32 @@
 import asyncio
 import logging
-from typing import Callable
+import os
+from typing import AsyncIterator, Callable, Optional
 
+import httpx
 from pydantic import ValidationError
 
-from app.business.open_food_facts.calculators.pain_report_calculator import PainReportCalculator
+from app.business.open_food_facts.calculators.pain_report_calculator import (
+    PainReportCalculator,
+    compute_pain_reports,
+)
+from app.business.open_food_facts.calculators.product_type_calculator import get_product_type
 from app.business.open_food_facts.panel_renderer.generator import EggKnowledgePanelGenerator
-from app.config.exceptions import EggButNotFreshEgg, ResourceNotFoundException
-from app.config.http_client import get_with_retry
+from app.config.barcode_index import egg_barcode_index
+from app.config.cache import (
+    PAIN_REPORT_TTL_SECONDS,
+    PRODUCT_DATA_TTL_SECONDS,
+    PRODUCT_NOT_FOUND_TTL_SECONDS,
+    UNSUPPORTED_PRODUCT_TTL_SECONDS,
+    CachedFailure,
+    pain_report_cache,
+    product_data_cache,
+)
+from app.config.exceptions import EggButNotFreshEgg, ExternalServiceException, ResourceNotFoundException
+from app.config.http_client import HEDGED_REQUESTS_ENABLED, CircuitOpenError, get_with_retry, hedge_delay
+from app.config.metrics import observe_stage
+from app.config.product_store import product_store
+from app.config.single_flight import SingleFlight
 from app.enums.open_food_facts.enums import AnimalType
 from app.schemas.open_food_facts.external import ProductData, ProductResponse, ProductResponseSearchALicious
 from app.schemas.open_food_facts.internal import (
@@ -18,12 +37,91 @@ from app.schemas.open_food_facts.internal import (
 
 logger = logging.getLogger("app")
 
+# Concurrent requests for the same product share one OFF fetch (the payload does not depend
+# on the locale) and one pain report computation per locale
+off_v3_requests: SingleFlight[dict] = SingleFlight()
+pain_report_requests: SingleFlight[PainReport] = SingleFlight()
+
+SEARCH_A_LICIOUS_URL = "https://search.openfoodfacts.org/search"
+
+# Batches fetch their products from search-a-licious in a few multi-code queries instead of one OFF v3 request
+# per barcode. Codes missing from the search index still fall back to OFF v3, one by one.
+OFF_BULK_SEARCH_ENABLED = os.getenv("OFF_BULK_SEARCH_ENABLED", "false").lower() in ("1", "true", "yes")
+# Number of codes per search query (which bounds the URL length), and of hits per result page
+OFF_BULK_SEARCH_CODES_PER_QUERY = int(os.getenv("OFF_BULK_SEARCH_CODES_PER_QUERY", "50"))
+OFF_BULK_SEARCH_PAGE_SIZE = int(os.getenv("OFF_BULK_SEARCH_PAGE_SIZE", "100"))
+
+
+async def get_off_v3_payload(barcode: str) -> dict:
+    """
+    Return the OFF API v3 payload for a product, from the product data cache or the local product store
+    when possible. The payload holds the product names of every locale, so it is cached by barcode only.
+    When the snapshot of the product store is stale, OFF is requested first and the store is its fallback.
+    """
+    cached_payload = product_data_cache.get(f"off_v3_payload:{barcode}")
+    if cached_payload is not None:
+        return cached_payload
+
+    stored_payload = product_store.get_payload(barcode)
+    if stored_payload is not None and not product_store.is_stale():
+        return stored_payload
+
+    try:
+        return await off_v3_requests.do(barcode, lambda: _fetch_off_v3_json(barcode))
+    except Exception as e:
+        if stored_payload is None:
+            raise
+        logger.warning(f"OFF API error, using the product store for {barcode}: {type(e).__name__}: {e}")
+        return stored_payload
+
+
+async def _fetch_off_v3_json(barcode: str) -> dict:
+    """
+    Fetch the raw OFF API v3 payload for a product, and cache it.
+    A barcode unknown to OFF is cached too, for a shorter time, as a payload without product.
+    The "off_fetch" stage covers the retries and the wait for a concurrency slot.
+    """
+    url = f"https://world.openfoodfacts.org/api/v3/product/{barcode}.json"
+    try:
+        with observe_stage("off_fetch"):
+            response = await get_with_retry(url)
+        response.raise_for_status()  # Raise exception for 4XX/5XX responses
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 404:
+            raise
+        json_response: dict = {}
+    else:
+        json_response = response.json()
+
+    cache_key = f"off_v3_payload:{barcode}"
+    if product := json_response.get("product"):
+        product_data_cache.set(
+            cache_key, {"product": _keep_product_data_fields(product)}, ttl_seconds=PRODUCT_DATA_TTL_SECONDS
+        )
+    else:
+        product_data_cache.set(cache_key, {"product": None}, ttl_seconds=PRODUCT_NOT_FOUND_TTL_SECONDS)
+
+    return json_response
+
+
+def _keep_product_data_fields(product):
+    """Drop the fields of an OFF product which are not used to build a ProductData, in any locale"""
+    if not isinstance(product, dict):
+        return product
+    return {
+        field: value
+        for field, value in product.items()
+        if field in ProductData.model_fields or field.startswith("product_name_")
+    }
+
 
 async def get_data_from_off_v3(barcode: str, locale: str) -> ProductData:
     """
     Retrieve useful product data from OFF API v3 to compute the breeding type and the quantity of animal product
 
-    If an error occurs, we raise a ResourceNotFoundException to return a clean response to OFF
+    If an error occurs, we raise a ResourceNotFoundException to return a clean response to OFF,
+    unless OFF is known to be unavailable (open circuit breaker, rate limiting): the product may exist,
+    so a 503 is returned instead, and it is never cached as a missing product
 
     Args:
         barcode: The product barcode
@@ -32,26 +130,31 @@ async def get_data_from_off_v3(barcode: str, locale: str) -> ProductData:
         A ProductData containing the name, image_url, categories, labels tags and other tags
     Raises:
         ResourceNotFoundException: If the product cannot be found or data validation fails
+        ExternalServiceException: If OFF is unavailable and the product store has no fallback payload
     """
-    url = f"https://world.openfoodfacts.org/api/v3/product/{barcode}.json"
     product_name_with_locale = f"product_name_{locale}"
 
     try:
-        response = await get_with_retry(url)
-        response.raise_for_status()  # Raise exception for 4XX/5XX responses
-        json_response = response.json()
+        json_response = await get_off_v3_payload(barcode)
+    except (CircuitOpenError, ExternalServiceException) as e:
+        logger.warning(f"OFF API unavailable: {type(e).__name__}: {e}")
+        raise ExternalServiceException(
+            f"OFF API is unavailable, can't get product data: {barcode}", status_code=503
+        ) from e
     except Exception as e:
         logger.warning(f"OFF API error: {type(e).__name__}: {e}")
         raise ResourceNotFoundException(f"Can't get product data from OFF API: {barcode}") from e
 
     if product := json_response.get("product"):
-        if product_name_with_locale in product:
-            product["product_name"] = product[product_name_with_locale]
+        if isinstance(product, dict) and product_name_with_locale in product:
+            # The payload may be shared with concurrent requests in other locales: copy it instead of mutating it
+            json_response = {**json_response, "product": {**product, "product_name": product[product_name_with_locale]}}
     else:
         raise ResourceNotFoundException(f"No hits returned by OFF API: {barcode}")
 
     try:
-        product_response = ProductResponse.model_validate(json_response)
+        with observe_stage("validation"):
+            product_response = ProductResponse.model_validate(json_response)
     except Exception as e:
         logger.error(f"Failed to validate product data: {e}")
         raise ResourceNotFoundException(f"Failed to validate product data retrieved from OFF: {barcode}") from e
@@ -74,27 +177,11 @@ async def get_data_from_off_search_a_licious(barcode: str, locale: str) -> Produ
     Raises:
         ResourceNotFoundException: If the product cannot be found or data validation fails
     """
-    url = "https://search.openfoodfacts.org/search"
     product_name_with_locale = f"product_name_{locale}"
-    tags = [
-        "categories_tags",
-        "labels_tags",
-        "image_url",
-        "product_name",
-        product_name_with_locale,
-        "product_quantity_unit",
-        "product_quantity",
-        "quantity",
-        "allergens_tags",
-        "ingredients_tags",
-        "ingredients",
-        "countries",
-        "countries_tags",
-    ]
-    params = {"q": f"code:{barcode}", "fields": ",".join(tags)}
+    params = {"q": f"code:{barcode}", "fields": ",".join(_search_a_licious_fields(locale))}
 
     try:
-        response = await get_with_retry(url, params=params)
+        response = await get_with_retry(SEARCH_A_LICIOUS_URL, params=params)
         response.raise_for_status()  # Raise exception for 4XX/5XX responses
         json_response = response.json()
     except Exception as e:
@@ -120,29 +207,279 @@ async def get_data_from_off_search_a_licious(barcode: str, locale: str) -> Produ
     return product_data
 
 
-async def get_pain_reports(barcode: str, locale: str) -> PainReport:
+def _search_a_licious_fields(locale: str) -> list[str]:
+    """Fields of a product to request from search-a-licious"""
+    return [
+        "categories_tags",
+        "labels_tags",
+        "image_url",
+        "product_name",
+        f"product_name_{locale}",
+        "product_quantity_unit",
+        "product_quantity",
+        "quantity",
+        "allergens_tags",
+        "ingredients_tags",
+        "ingredients",
+        "countries",
+        "countries_tags",
+    ]
+
+
+async def get_products_data_from_off_search_a_licious(barcodes: list[str], locale: str) -> dict[str, ProductData]:
+    """
+    Retrieve the product data of many products from OFF search-a-licious API at once,
+    with concurrent OR queries on their codes, following the result pages.
+
+    The results are not written to the product data cache: it holds OFF API v3 payloads with the
+    product names of every locale, whereas the hits only have the names of the requested locale.
+    The pain reports computed from them are cached per locale, like any other.
+
+    Args:
+        barcodes: The product barcodes
+        locale: alpha2 locale (fr, en...)
+    Returns:
+        A dict mapping the barcodes found in the search index to their ProductData.
+        Barcodes without hit, or whose hit is invalid, are left out.
+    Raises:
+        ResourceNotFoundException: If a search request fails
+    """
+    chunks = [
+        barcodes[start : start + OFF_BULK_SEARCH_CODES_PER_QUERY]
+        for start in range(0, len(barcodes), OFF_BULK_SEARCH_CODES_PER_QUERY)
+    ]
+    hits_by_chunk = await asyncio.gather(*(_search_codes(codes, locale) for codes in chunks))
+
+    products: dict[str, ProductData] = {}
+    for codes, hits in zip(chunks, hits_by_chunk, strict=True):
+        for hit in hits:
+            code = hit.get("code")
+            if code not in codes or code in products:
+                continue
+
+            if (localized_name := hit.get(f"product_name_{locale}")) is not None:
+                hit = {**hit, "product_name": localized_name}
+            try:
+                products[code] = ProductData.model_validate(hit)
+            except ValidationError as e:
+                logger.warning(f"Failed to validate search-a-licious product data for {code}: {e}")
+
+    return products
+
+
+async def _search_codes(codes: list[str], locale: str) -> list[dict]:
+    """Return the search-a-licious hits of every result page of an OR query on product codes"""
+    params = {
+        "q": " OR ".join(f"code:{code}" for code in codes),
+        "fields": ",".join(["code", *_search_a_licious_fields(locale)]),
+        "page_size": str(OFF_BULK_SEARCH_PAGE_SIZE),
+    }
+
+    hits: list[dict] = []
+    page = 1
+    while True:
+        try:
+            response = await get_with_retry(SEARCH_A_LICIOUS_URL, params={**params, "page": str(page)})
+            json_response = response.json()
+        except Exception as e:
+            logger.warning(f"Can't get product data from OFF search-a-licious API for {len(codes)} codes: {e}")
+            raise ResourceNotFoundException("Can't get product data from OFF API") from e
+
+        page_hits = [hit for hit in json_response.get("hits") or [] if isinstance(hit, dict)]
+        hits += page_hits
+
+        page_count = json_response.get("page_count")
+        if not page_hits or (page_count is not None and page >= page_count):
+            return hits
+        page += 1
+
+
+async def get_product_data(barcode: str, locale: str) -> ProductData:
+    """
+    Retrieve the product data from OFF API v3. When hedged requests are enabled and OFF API v3
+    is slower than usual (p95 of its recent latencies), the product is also requested from
+    search-a-licious, and the first successful response is used.
+
+    Args:
+        barcode: The product barcode
+        locale: alpha2 locale (fr, en...)
+    Raises:
+        ResourceNotFoundException: If the product cannot be found by any of the APIs
+    """
+    if not HEDGED_REQUESTS_ENABLED:
+        return await get_data_from_off_v3(barcode, locale)
+
+    primary = asyncio.ensure_future(get_data_from_off_v3(barcode, locale))
+    done, _ = await asyncio.wait({primary}, timeout=hedge_delay("world.openfoodfacts.org"))
+    if done:
+        return primary.result()
+
+    logger.info(f"OFF API v3 is slow for product {barcode}, hedging with search-a-licious")
+    hedge = asyncio.ensure_future(get_data_from_off_search_a_licious(barcode, locale))
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        # Both failed: report the error of OFF API v3
+        return primary.result()
+    finally:
+        # The OFF API v3 fetch itself is shielded by single-flight, and still fills the cache once cancelled here
+        for task in pending:
+            task.cancel()
+
+
+async def get_pain_reports(barcode: str, locale: str, product_data: Optional[ProductData] = None) -> PainReport:
     """
     Compute the pain report for a product based on its barcode
 
     Args:
         barcode: The product barcode
         locale: alpha2 locale (fr, en...)
+        product_data: The product data, when already fetched (e.g. in bulk for a batch)
 
     Returns:
         A PainReport, whose `scenarios` list may be empty when no pain data
         could be computed (e.g. no fresh egg found), to display a specific knowledge panel
+    Raises:
+        ResourceNotFoundException: If the product cannot be found or is not supported
+        ExternalServiceException: If OFF is unavailable, which is not cached
+    """
+    ensure_may_be_egg(barcode)
+
+    cached_pain_report = _get_cached_pain_report(barcode, locale)
+    if cached_pain_report is not None:
+        return cached_pain_report
+
+    return await pain_report_requests.do(
+        (barcode, locale), lambda: _compute_pain_reports(barcode, locale, product_data)
+    )
+
+
+def _get_cached_pain_report(barcode: str, locale: str) -> PainReport | None:
+    """
+    Returns the cached pain report of a product, if any
+
+    Raises:
+        ResourceNotFoundException: If the product is cached as not supported
+    """
+    cached_pain_report = pain_report_cache.get(f"pain_report:{barcode}:{locale}")
+    if isinstance(cached_pain_report, CachedFailure):
+        raise ResourceNotFoundException(cached_pain_report.message)
+    return cached_pain_report
+
+
+async def _compute_pain_reports(barcode: str, locale: str, product_data: Optional[ProductData] = None) -> PainReport:
+    """Fetch the product data unless already given, compute its pain report and cache it"""
+    calculator = await _get_pain_report_calculator(barcode, locale, product_data)
+    if isinstance(calculator, PainReport):
+        return calculator
+    return _compute_and_cache_pain_reports([barcode], [calculator], locale)[0]
+
+
+async def _get_pain_report_calculator(
+    barcode: str, locale: str, product_data: Optional[ProductData] = None
+) -> PainReportCalculator | PainReport:
     """
+    Fetch the product data unless already given, and create the calculator of its pain report
+
+    Returns:
+        The calculator, or the pain report itself when it is known without computation (e.g. no fresh egg found),
+        already cached
+    Raises:
+        ResourceNotFoundException: If the product is not supported by the calculators, which is cached
+    """
+    cache_key = f"pain_report:{barcode}:{locale}"
+
     # Get the product data
-    product_data = await get_data_from_off_v3(barcode, locale)
+    if product_data is None:
+        product_data = await get_product_data(barcode, locale)
 
     try:
         # Create calculator with the retrieved data
-        calculator = PainReportCalculator(product_data)
+        with observe_stage("calculator"):
+            return PainReportCalculator(product_data)
 
     except EggButNotFreshEgg as e:
+        pain_report_cache.set(cache_key, e.pain_report, ttl_seconds=PAIN_REPORT_TTL_SECONDS)
         return e.pain_report
 
-    return calculator.get_pain_reports()
+    except ResourceNotFoundException as e:
+        # The product is not supported by the calculators (e.g. it is not an egg): remember it for a while
+        pain_report_cache.set(cache_key, CachedFailure(e.message), ttl_seconds=UNSUPPORTED_PRODUCT_TTL_SECONDS)
+        raise
+
+
+def _compute_and_cache_pain_reports(
+    barcodes: list[str], calculators: list[PainReportCalculator], locale: str
+) -> list[PainReport]:
+    """Compute the pain reports of products in one vectorized lookup of the pain table, and cache them"""
+    with observe_stage("pain_report"):
+        pain_reports = compute_pain_reports(calculators)
+
+    for barcode, pain_report in zip(barcodes, pain_reports, strict=True):
+        pain_report_cache.set(f"pain_report:{barcode}:{locale}", pain_report, ttl_seconds=PAIN_REPORT_TTL_SECONDS)
+    return pain_reports
+
+
+async def refresh_pain_reports(barcode: str, locale: str) -> PainReport:
+    """
+    Recompute the pain report of a product from fresh OFF data, bypassing the product data
+    and pain report caches. Used to refresh stale knowledge panels in the background.
+
+    Args:
+        barcode: The product barcode
+        locale: alpha2 locale (fr, en...)
+    """
+    product_data_cache.delete(f"off_v3_payload:{barcode}")
+    pain_report_cache.delete(f"pain_report:{barcode}:{locale}")
+    return await get_pain_reports(barcode=barcode, locale=locale)
+
+
+async def check_knowledge_panel_exists(barcode: str, locale: str) -> None:
+    """
+    Check that a knowledge panel can be rendered for a product, without computing its pain report
+    nor rendering it: the product must be known to OFF and be of a supported product type.
+    The product data is fetched through its cache, so that a following GET request reuses it.
+
+    Args:
+        barcode: The product barcode
+        locale: alpha2 locale (fr, en...)
+    Raises:
+        ResourceNotFoundException: If no knowledge panel can be rendered for the product
+    """
+    ensure_may_be_egg(barcode)
+
+    cached_pain_report = _get_cached_pain_report(barcode, locale)
+    if cached_pain_report is not None:
+        product_type = cached_pain_report.product_type
+    else:
+        product_data = await get_product_data(barcode, locale)
+        try:
+            product_type = get_product_type(product_data)
+        except EggButNotFreshEgg as e:
+            product_type = e.pain_report.product_type
+
+    if not is_supported_product_type(product_type):
+        raise ResourceNotFoundException(f"Unsupported product type: {product_type}")
+
+
+def ensure_may_be_egg(barcode: str) -> None:
+    """
+    Reject the barcodes which the egg barcode index knows are not egg products, without any upstream request.
+
+    Raises:
+        ResourceNotFoundException: If the product is definitely not an egg product
+    """
+    if egg_barcode_index.is_definitely_not_egg(barcode):
+        raise ResourceNotFoundException(f"No animal types found in product data: {barcode} is not an egg product")
+
+
+def is_supported_product_type(product_type: ProductType) -> bool:
+    """Whether a knowledge panel generator exists for the product type"""
+    return product_type.is_mixed is False and AnimalType.LAYING_HEN in product_type.animal_types
 
 
 def get_generator(
@@ -152,7 +489,7 @@ def get_generator(
     Return the appropriate generator depending on product type.
     """
 
-    if product_type.is_mixed is False and AnimalType.LAYING_HEN in product_type.animal_types:
+    if is_supported_product_type(product_type):
         return EggKnowledgePanelGenerator(
             pain_report=pain_report,
             locale=locale,
@@ -167,6 +504,9 @@ async def get_pain_reports_batch(barcodes: list[str], locale: str) -> dict[str,
     Compute pain reports for multiple products in parallel.
 
     Each barcode is processed independently — a failure on one does not affect the others.
+    With the bulk search mode, the products missing from the caches are first fetched together
+    from search-a-licious; the ones it does not know are then fetched from OFF API v3.
+    The pain levels of all the products are then looked up at once in the pain table.
 
     Args:
         barcodes: List of product barcodes
@@ -175,9 +515,87 @@ async def get_pain_reports_batch(barcodes: list[str], locale: str) -> dict[str,
     Returns:
         A dict mapping each barcode to either a PainReport or an Exception
     """
-    tasks = [get_pain_reports(barcode=barcode, locale=locale) for barcode in barcodes]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    return {barcode: result for barcode, result in zip(barcodes, results)}
+    products_data: dict[str, ProductData] = {}
+    if OFF_BULK_SEARCH_ENABLED:
+        products_data = await _prefetch_products_data(barcodes, locale)
+
+    async def get_calculator(barcode: str) -> PainReportCalculator | PainReport:
+        ensure_may_be_egg(barcode)
+        cached_pain_report = _get_cached_pain_report(barcode, locale)
+        if cached_pain_report is not None:
+            return cached_pain_report
+        return await _get_pain_report_calculator(barcode, locale, products_data.get(barcode))
+
+    results = await asyncio.gather(*[get_calculator(barcode) for barcode in barcodes], return_exceptions=True)
+    calculators = {
+        barcode: result
+        for barcode, result in zip(barcodes, results, strict=True)
+        if isinstance(result, PainReportCalculator)
+    }
+    pain_reports = dict(
+        zip(
+            calculators,
+            _compute_and_cache_pain_reports(list(calculators), list(calculators.values()), locale),
+            strict=True,
+        )
+    )
+    return {
+        barcode: pain_reports[barcode] if isinstance(result, PainReportCalculator) else result
+        for barcode, result in zip(barcodes, results, strict=True)
+    }
+
+
+async def iter_pain_reports(barcodes: list[str], locale: str) -> AsyncIterator[tuple[str, PainReport | BaseException]]:
+    """
+    Compute pain reports for multiple products in parallel, like get_pain_reports_batch,
+    but yield each of them as soon as it is ready: the pain levels of each product are looked up
+    in the pain table on their own, all its scenarios at once.
+
+    Args:
+        barcodes: List of product barcodes
+        locale: alpha2 locale (fr, en...)
+
+    Yields:
+        (barcode, PainReport or Exception) tuples, in completion order
+    """
+    products_data: dict[str, ProductData] = {}
+    if OFF_BULK_SEARCH_ENABLED:
+        products_data = await _prefetch_products_data(barcodes, locale)
+
+    async def get_result(barcode: str) -> tuple[str, PainReport | BaseException]:
+        try:
+            return barcode, await get_pain_reports(
+                barcode=barcode, locale=locale, product_data=products_data.get(barcode)
+            )
+        except Exception as e:
+            return barcode, e
+
+    for next_result in asyncio.as_completed([get_result(barcode) for barcode in barcodes]):
+        yield await next_result
+
+
+async def _prefetch_products_data(barcodes: list[str], locale: str) -> dict[str, ProductData]:
+    """Fetch in bulk the products of a batch whose pain report and product data are not cached yet"""
+    barcodes_to_fetch = [
+        barcode
+        for barcode in barcodes
+        if not egg_barcode_index.is_definitely_not_egg(barcode)
+        and pain_report_cache.get(f"pain_report:{barcode}:{locale}") is None
+        and product_data_cache.get(f"off_v3_payload:{barcode}") is None
+        and (product_store.is_stale() or product_store.get_payload(barcode) is None)
+    ]
+    # A single product is as cheap to fetch from OFF API v3
+    if len(barcodes_to_fetch) < 2:
+        return {}
+
+    try:
+        products_data = await get_products_data_from_off_search_a_licious(barcodes_to_fetch, locale)
+    except ResourceNotFoundException:
+        # Every product falls back to OFF API v3
+        return {}
+
+    logger.info(f"Bulk search found {len(products_data)}/{len(barcodes_to_fetch)} products (locale: {locale})")
+    return products_data
 
 
 def get_knowledge_panel_response(
@@ -197,4 +615,5 @@ def get_knowledge_panel_response(
 
     panel_generator = get_generator(pain_report, pain_report.product_type, locale, translator)
 
-    return panel_generator.get_response()
+    with observe_stage("render"):
+        return panel_generator.get_response()
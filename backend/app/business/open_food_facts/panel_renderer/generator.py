@@ -1,11 +1,11 @@
 import logging
 import os
-from pathlib import Path
 from typing import Callable, List
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment
 from pydantic import HttpUrl
 
+from app.business.open_food_facts.panel_renderer.templates import template_registry
 from app.enums.open_food_facts.content.panel_texts import (
     DurationTexts,
     PanelTextManager,
@@ -31,12 +31,13 @@ logger = logging.getLogger("app")
 
 class PanelRenderer:
     def __init__(self, env: Environment, locale: str, base_url: str):
+        # Templates environment of the locale, see TemplateRegistry
         self.env = env
         self.locale = locale
         self.base_url = base_url
 
     def render(self, template_name: str, **context) -> str:
-        template = self.env.get_template(f"{self.locale}/{template_name}")
+        template = self.env.get_template(template_name)
         return template.render(kp_images_base_url=self.base_url, **context)
 
 
@@ -116,10 +117,8 @@ class EggKnowledgePanelGenerator:
         self._, self._n = translator
         self.locale = locale
 
-        self.env = Environment(
-            loader=FileSystemLoader(Path(__file__).resolve().parent / "html_templates"),
-            autoescape=True,
-        )
+        # Shared by all requests, so that templates are compiled once per process
+        self.env = template_registry.get_environment(locale)
 
         self.kp_images_base_url = os.getenv("KP_IMAGES_BASE_URL", "http://localhost:3000/kp")
 
@@ -205,7 +204,9 @@ class EggKnowledgePanelGenerator:
         if btq.quantity is None:
             elements += self._create_element_from_html("no_quantity.html")
 
-            mock_scenarios = scenarios.copy()
+            # Deep copy, as in _handle_single_breeding: the pain report may be shared with
+            # concurrent requests and must not be mutated
+            mock_scenarios = [scenario.model_copy(deep=True) for scenario in scenarios]
             for s in mock_scenarios:
                 s.animal_pain_reports[0].breeding_type_and_quantity.quantity = EggQuantity.from_count(1)
 
@@ -0,0 +1,71 @@
+import logging
+import os
+from pathlib import Path
+
+from jinja2 import BytecodeCache, Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+
+logger = logging.getLogger("app")
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / "html_templates"
+
+# Re-read templates whose file changed since they were compiled (development only: it stats them on every render)
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "false").lower() in ("1", "true", "yes")
+# Optional directory where compiled templates are kept, so that new processes skip their compilation
+TEMPLATES_BYTECODE_CACHE_DIR = os.getenv("TEMPLATES_BYTECODE_CACHE_DIR")
+
+
+class TemplateRegistry:
+    """
+    Process-wide registry of the Jinja2 environments of the knowledge panel templates, one per locale.
+
+    Each environment keeps its compiled templates for the lifetime of the process, so rendering
+    a panel only costs the execution of its templates.
+    """
+
+    def __init__(self, templates_dir: Path, auto_reload: bool = False, bytecode_cache_dir: str | None = None):
+        self.templates_dir = templates_dir
+        self.auto_reload = auto_reload
+        self.bytecode_cache: BytecodeCache | None = (
+            FileSystemBytecodeCache(bytecode_cache_dir) if bytecode_cache_dir else None
+        )
+        self._environments: dict[str, Environment] = {}
+
+    def get_environment(self, locale: str) -> Environment:
+        """Return the environment of the templates of a locale, creating it on first use."""
+        env = self._environments.get(locale)
+        if env is None:
+            env = Environment(
+                loader=FileSystemLoader(self.templates_dir / locale),
+                autoescape=True,
+                auto_reload=self.auto_reload,
+                # Never evict a compiled template: there are only a few of them
+                cache_size=-1,
+                bytecode_cache=self.bytecode_cache,
+            )
+            self._environments[locale] = env
+        return env
+
+    def get_template(self, locale: str, template_name: str) -> Template:
+        return self.get_environment(locale).get_template(template_name)
+
+    def precompile(self) -> int:
+        """
+        Compile the templates of every locale, so that no request pays for it.
+
+        Returns:
+            The number of compiled templates
+        """
+        count = 0
+        for locale_dir in sorted(path for path in self.templates_dir.iterdir() if path.is_dir()):
+            env = self.get_environment(locale_dir.name)
+            for template_name in env.list_templates(extensions=["html"]):
+                env.get_template(template_name)
+                count += 1
+
+        logger.info(f"Precompiled {count} knowledge panel templates")
+        return count
+
+
+template_registry = TemplateRegistry(
+    TEMPLATES_DIR, auto_reload=TEMPLATES_AUTO_RELOAD, bytecode_cache_dir=TEMPLATES_BYTECODE_CACHE_DIR
+)
@@ -0,0 +1,247 @@
+"""
+Membership index of the egg products, built from the OFF Parquet dump by pipelines/extract_egg_products.py.
+
+The index file holds two structures:
+    - the exact sorted array of the barcodes of the egg products (and candidate egg products),
+    - a Bloom filter over the barcodes of every other product of the dump.
+
+A barcode found in the Bloom filter but not in the egg array is definitely not an egg product,
+up to the false positive rate of the filter, so no knowledge panel can be rendered for it:
+it is answered without any upstream request. Barcodes missing from both structures (e.g. products
+created after the dump) are unknown, and still fetched from OFF.
+
+The file is memory-mapped: lookups read a few pages of it and it is shared by the workers of a host.
+
+File layout, little-endian:
+    header: magic (8 bytes), number of hash functions, number of bits of the Bloom filter,
+            number of egg barcodes (unsigned 64-bit integers)
+    Bloom filter bits, padded to a multiple of 64 bits
+    egg barcodes, as sorted unsigned 64-bit integers
+"""
+
+import asyncio
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app.config.metrics import Counter, registry
+
+logger = logging.getLogger("app")
+
+MAGIC = b"EGGIDX01"
+_HEADER = struct.Struct("<8sQQQ")
+_MASK_64 = (1 << 64) - 1
+# Barcodes are stored as unsigned 64-bit integers
+_MAX_BARCODE_LENGTH = 19
+
+
+def barcode_to_int(barcode: str) -> int | None:
+    """
+    Return the integer key of a barcode in the index, None if it cannot be indexed.
+    Leading zeros are not significant: barcodes which only differ by them share their key,
+    which can only make the index answer "unknown" more often, never wrongly reject an egg.
+    """
+    if not barcode.isascii() or not barcode.isdigit() or len(barcode.lstrip("0")) > _MAX_BARCODE_LENGTH:
+        return None
+    return int(barcode)
+
+
+def _mix(value: int) -> int:
+    """Finalizer of splitmix64: spreads the bits of consecutive barcodes over the whole 64-bit range"""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return value ^ (value >> 31)
+
+
+def _bit_positions(key: int, hash_count: int, bit_count: int) -> Iterable[int]:
+    """Positions of the bits of a key in the Bloom filter, by double hashing"""
+    h1 = _mix(key)
+    h2 = _mix(key ^ 0x9E3779B97F4A7C15) | 1
+    return ((h1 + i * h2) % bit_count for i in range(hash_count))
+
+
+def bloom_filter_parameters(item_count: int, false_positive_rate: float) -> tuple[int, int]:
+    """Return the optimal number of bits and hash functions of a Bloom filter, as a multiple of 64 bits"""
+    item_count = max(item_count, 1)
+    bit_count = math.ceil(-item_count * math.log(false_positive_rate) / math.log(2) ** 2)
+    bit_count = max(64, (bit_count + 63) // 64 * 64)
+    hash_count = max(1, round(bit_count / item_count * math.log(2)))
+    return bit_count, hash_count
+
+
+def write_barcode_index(
+    path: str | Path, egg_barcodes: Iterable[str], other_barcodes: Iterable[str], false_positive_rate: float = 0.001
+) -> None:
+    """
+    Write an index file, atomically: workers which memory-mapped the previous file keep reading it
+    until they load the new one.
+
+    Args:
+        path: Path of the index file
+        egg_barcodes: Barcodes of the egg products, and of the products which could be eggs
+        other_barcodes: Barcodes of every other product
+        false_positive_rate: Share of the barcodes unknown to the index wrongly reported as not eggs
+    """
+    egg_keys = sorted({key for barcode in egg_barcodes if (key := barcode_to_int(barcode)) is not None})
+    other_keys = {key for barcode in other_barcodes if (key := barcode_to_int(barcode)) is not None}
+
+    bit_count, hash_count = bloom_filter_parameters(len(other_keys), false_positive_rate)
+    bits = bytearray(bit_count // 8)
+    for key in other_keys:
+        for position in _bit_positions(key, hash_count, bit_count):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    eggs = array("Q", egg_keys)
+    if sys.byteorder != "little":
+        eggs.byteswap()
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, hash_count, bit_count, len(eggs)))
+        f.write(bits)
+        f.write(eggs.tobytes())
+    os.replace(tmp_path, path)
+
+
+class BarcodeIndex:
+    """A memory-mapped index file"""
+
+    def __init__(self, path: str | Path) -> None:
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if len(self._mmap) < _HEADER.size or self._mmap[: len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a barcode index file")
+            _, self.hash_count, self.bit_count, self.egg_count = _HEADER.unpack_from(self._mmap)
+            eggs_offset = _HEADER.size + self.bit_count // 8
+            if self.bit_count % 64 or len(self._mmap) != eggs_offset + 8 * self.egg_count:
+                raise ValueError(f"{path} is truncated or corrupted")
+            if sys.byteorder != "little":
+                raise ValueError("Barcode index files can only be memory-mapped on little-endian hosts")
+        except Exception:
+            self._mmap.close()
+            raise
+
+        view = memoryview(self._mmap)
+        self._bits = view[_HEADER.size : eggs_offset]
+        self._eggs = view[eggs_offset:].cast("Q")
+        view.release()
+
+    def is_egg(self, key: int) -> bool:
+        """Whether the barcode key is one of the egg barcodes, exactly"""
+        position = bisect_left(self._eggs, key)
+        return position < self.egg_count and self._eggs[position] == key
+
+    def may_be_other_product(self, key: int) -> bool:
+        """Whether the barcode key may be in the Bloom filter of the other products"""
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in _bit_positions(key, self.hash_count, self.bit_count)
+        )
+
+    def is_definitely_not_egg(self, barcode: str) -> bool:
+        """Whether the barcode is known to the dump and is not an egg product"""
+        key = barcode_to_int(barcode)
+        if key is None or self.is_egg(key):
+            return False
+        return self.may_be_other_product(key)
+
+    def close(self) -> None:
+        self._bits.release()
+        self._eggs.release()
+        self._mmap.close()
+
+
+BARCODE_INDEX_LOOKUPS = registry.register(
+    Counter(
+        "app_barcode_index_lookups",
+        "Lookups of barcodes in the egg barcode index, by answer ('not_egg' ones are answered without upstream call)",
+        labelnames=("answer",),
+    )
+)
+_NOT_EGG_LOOKUPS = BARCODE_INDEX_LOOKUPS.labels("not_egg")
+_MAYBE_EGG_LOOKUPS = BARCODE_INDEX_LOOKUPS.labels("maybe_egg")
+
+
+class ReloadableBarcodeIndex:
+    """
+    The index file at a path, loaded again when the file is replaced (see refresh_barcode_index).
+    Until a valid file is loaded, no barcode is reported as not an egg.
+    """
+
+    def __init__(self, path: str | Path | None) -> None:
+        self.path = Path(path) if path else None
+        self._index: Optional[BarcodeIndex] = None
+        self._file_id: Optional[tuple[int, int, int]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def reload_if_changed(self) -> bool:
+        """Load the index file if it changed since it was last loaded. Returns whether it was loaded."""
+        if self.path is None:
+            return False
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            logger.warning(f"Barcode index file not found: {self.path}")
+            return False
+
+        file_id = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return False
+
+        try:
+            index = BarcodeIndex(self.path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load the barcode index {self.path}: {e}")
+            return False
+
+        previous, self._index, self._file_id = self._index, index, file_id
+        if previous is not None:
+            previous.close()
+        logger.info(f"Loaded the barcode index {self.path} ({index.egg_count} egg barcodes)")
+        return True
+
+    def is_definitely_not_egg(self, barcode: str) -> bool:
+        if self._index is None:
+            return False
+        if self._index.is_definitely_not_egg(barcode):
+            _NOT_EGG_LOOKUPS.inc()
+            return True
+        _MAYBE_EGG_LOOKUPS.inc()
+        return False
+
+    def close(self) -> None:
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+            self._file_id = None
+
+
+async def refresh_barcode_index(index: ReloadableBarcodeIndex, interval_seconds: float) -> None:
+    """
+    Periodically load the index file again when it is replaced, e.g. by a new run of the pipeline.
+    Meant to run as a background task for the whole lifetime of the application.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        index.reload_if_changed()
+
+
+# Path of the index file written by pipelines/extract_egg_products.py --barcode-index; unset disables the index
+EGG_BARCODE_INDEX_PATH = os.getenv("EGG_BARCODE_INDEX_PATH")
+# How often the index file is checked for a new version, in seconds
+EGG_BARCODE_INDEX_REFRESH_SECONDS = float(os.getenv("EGG_BARCODE_INDEX_REFRESH_SECONDS", "3600"))
+
+egg_barcode_index = ReloadableBarcodeIndex(EGG_BARCODE_INDEX_PATH)
@@ -1,8 +1,25 @@
+import asyncio
+import gzip
+import hashlib
 import json
+import logging
+import os
+import sqlite3
+import sys
 import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass
+from pathlib import Path
 from threading import Lock
-from typing import Any, Optional
+from typing import Any, Generic, Optional, TypeVar
+
+from pydantic import BaseModel
+
+from app.config.metrics import CACHE_OPERATION_DURATION_SECONDS, registry
+
+logger = logging.getLogger("app")
 
 
 @dataclass
@@ -10,20 +27,277 @@ class CacheEntry:
     data: Any
     timestamp: float
     ttl_seconds: int
+    size: int = 0
+    # Extra time during which the entry can still be served as stale, while it is being refreshed
+    stale_ttl_seconds: int = 0
 
-    def is_expired(self) -> bool:
+    def is_stale(self) -> bool:
         return time.time() - self.timestamp > self.ttl_seconds
 
+    def is_expired(self) -> bool:
+        return time.time() - self.timestamp > self.ttl_seconds + self.stale_ttl_seconds
+
+
+@dataclass(frozen=True)
+class CachedFailure:
+    """
+    Negative cache entry: records that a lookup failed in a way which is not expected to change
+    soon (e.g. unknown barcode), so that it is not retried upstream on every request.
+    """
+
+    message: str
+
+
+@dataclass
+class CacheStats:
+    """Counters exposed by SimpleCache.stats(), reset only by the process restarting."""
+
+    hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+
+
+@dataclass(frozen=True)
+class EncodedResponse:
+    """
+    A JSON response body encoded once, when it is cached, so that a cache hit is served as is,
+    without validating nor serializing the model again. A gzipped copy of the body is kept too
+    when pre-compression is enabled.
+    """
+
+    body: bytes
+    gzip_body: bytes | None = None
+    # Strong HTTP validator of the body, quoted, which also depends on the version of the data behind it
+    etag: str = ""
+
+    @classmethod
+    def from_model(cls, model: BaseModel, gzip_level: int | None = None, version: str = "") -> "EncodedResponse":
+        """Encode a model like FastAPI does for a response_model with response_model_exclude_none=True"""
+        body = model.model_dump_json(exclude_none=True).encode("utf-8")
+        return cls.from_body(body, gzip_level, compute_etag(body, version))
+
+    @classmethod
+    def from_body(cls, body: bytes, gzip_level: int | None = None, etag: str = "") -> "EncodedResponse":
+        # mtime=0 keeps the gzipped bytes identical for identical bodies
+        gzip_body = gzip.compress(body, compresslevel=gzip_level, mtime=0) if gzip_level is not None else None
+        return cls(body=body, gzip_body=gzip_body, etag=etag)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip_body or b"")
+
+
+def compute_etag(body: bytes, version: str = "") -> str:
+    """Return a strong ETag, quoted, for a body computed from data at the given version"""
+    digest = hashlib.blake2b(version.encode("utf-8") + b"\0", digest_size=16)
+    digest.update(body)
+    return f'"{digest.hexdigest()}"'
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimate the memory footprint of a cached value, in bytes.
+    Pydantic models are measured through their JSON encoding, which is a good proxy
+    for the size of the nested objects they hold; other values use sys.getsizeof.
+    """
+    if isinstance(value, EncodedResponse):
+        return value.size
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, BaseModel):
+        return len(value.model_dump_json())
+    return sys.getsizeof(value)
+
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class PydanticCodec(Generic[ModelT]):
+    """
+    Serializes Pydantic models to a compact binary form for shared cache backends:
+    the model JSON encoding, zlib-compressed.
+    """
+
+    def __init__(self, model: type[ModelT], compression_level: int = 6) -> None:
+        self.model = model
+        self.compression_level = compression_level
+
+    def dumps(self, value: ModelT) -> bytes:
+        return zlib.compress(value.model_dump_json().encode("utf-8"), self.compression_level)
+
+    def loads(self, data: bytes) -> ModelT:
+        return self.model.model_validate_json(zlib.decompress(data))
+
+
+class EncodedResponseCodec:
+    """
+    Serializes encoded responses for shared cache backends: the ETag line then the body, zlib-compressed.
+    The gzipped copy is compressed again when loaded, with the gzip level of this process.
+    """
+
+    def __init__(self, compression_level: int = 6, gzip_level: int | None = None) -> None:
+        self.compression_level = compression_level
+        self.gzip_level = gzip_level
+
+    def dumps(self, value: EncodedResponse) -> bytes:
+        return zlib.compress(value.etag.encode("utf-8") + b"\n" + value.body, self.compression_level)
+
+    def loads(self, data: bytes) -> EncodedResponse:
+        etag, _, body = zlib.decompress(data).partition(b"\n")
+        return EncodedResponse.from_body(body, self.gzip_level, etag.decode("utf-8"))
+
+
+class CacheBackend(ABC):
+    """
+    Interface for a cache storage shared between several processes (e.g. API replicas).
+    Values are already serialized: backends only store bytes with an expiration date.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[tuple[bytes, float]]:
+        """Return the stored value and its expiration timestamp, or None if missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, expires_at: float) -> None:
+        """Store a value until the given expiration timestamp."""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Delete a key. Returns True if key existed."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Delete all entries."""
+
+    @abstractmethod
+    def cleanup_expired(self) -> int:
+        """Remove expired entries. Returns number of entries removed."""
+
+
+def _is_busy(error: sqlite3.Error) -> bool:
+    """Whether a SQLite error only means that the database is locked by another connection"""
+    return (getattr(error, "sqlite_errorcode", 0) & 0xFF) == sqlite3.SQLITE_BUSY
+
+
+class SqliteCacheBackend(CacheBackend):
+    """
+    Cache backend storing entries in a SQLite database file.
+    When the file lives on a volume mounted by every replica of the API, a value computed
+    by one replica is available to the others. WAL mode lets readers work concurrently
+    with a writer from another process.
+
+    The backend is called from the event loop: it only waits for a lock held by another replica
+    for a few milliseconds, then gives up, the lookup being a miss and the write being skipped.
+    """
+
+    def __init__(self, path: str | Path, timeout_seconds: float = 0.005) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            self.path, timeout=timeout_seconds, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _execute(self, sql: str, parameters: tuple = ()) -> Optional[sqlite3.Cursor]:
+        """Execute a statement, or return None if the database stayed locked for the whole busy timeout"""
+        with self._lock:
+            try:
+                return self._connection.execute(sql, parameters)
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                logger.debug(f"Cache database is busy, skipping: {sql}")
+                return None
+
+    def get(self, key: str) -> Optional[tuple[bytes, float]]:
+        cursor = self._execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        )
+        row = cursor.fetchone() if cursor is not None else None
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, value: bytes, expires_at: float) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at),
+        )
+
+    def delete(self, key: str) -> bool:
+        cursor = self._execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        return cursor is not None and cursor.rowcount > 0
+
+    def clear(self) -> None:
+        self._execute("DELETE FROM cache_entries")
+
+    def cleanup_expired(self) -> int:
+        cursor = self._execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount if cursor is not None else 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
 
 class SimpleCache:
     """
-    A simple in-memory cache with TTL (Time To Live) support.
+    An in-memory LRU cache with TTL (Time To Live) support.
     Thread-safe for concurrent access.
+
+    The cache can be bounded by a number of entries and/or an estimated size in bytes:
+    when a bound is exceeded, the least recently used entries are evicted first.
+    Expired entries are dropped on access, and by cleanup_expired(), which is meant
+    to be called periodically (see sweep_expired_entries).
+
+    An entry can be given a stale TTL on top of its TTL: once its TTL is over, get() ignores it,
+    but get_with_staleness() still returns it, flagged as stale, until the stale TTL is over too.
+    This lets callers serve a stale value immediately while refreshing it in the background.
+
+    An optional shared backend can be plugged behind the in-memory entries, which then act
+    as a local L1: a local miss falls back to the backend, and writes go to both. The codec
+    converts values to and from the bytes stored by the backend. Backend errors are logged
+    and treated as misses, so that a broken shared store never fails a request. The backend
+    only stores fresh values: stale copies are only kept in the local L1.
+
+    A named cache records the duration of its get and set operations in the metrics.
     """
 
-    def __init__(self) -> None:
-        self._cache: dict[str, CacheEntry] = {}
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        backend: CacheBackend | None = None,
+        codec: PydanticCodec | EncodedResponseCodec | None = None,
+        name: str | None = None,
+    ) -> None:
+        if backend is not None and codec is None:
+            raise ValueError("A codec is required to store values in a cache backend")
+        self._cache: OrderedDict[str, CacheEntry] = OrderedDict()
         self._lock = Lock()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.codec = codec
+        self._size_bytes = 0
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self.name = name
+        self._get_duration = CACHE_OPERATION_DURATION_SECONDS.labels(name, "get") if name else None
+        self._set_duration = CACHE_OPERATION_DURATION_SECONDS.labels(name, "set") if name else None
 
     def _generate_key(self, *args, **kwargs) -> str:
         """Generate a cache key from arguments."""
@@ -31,41 +305,278 @@ class SimpleCache:
         return json.dumps(key_data, sort_keys=True, default=str)
 
     def get(self, key: str) -> Optional[Any]:
-        """Get a value from cache if it exists and is not expired."""
+        """Get a value from cache if it exists and is neither expired nor stale."""
+        started_at = time.perf_counter()
+        found = self._lookup(key, allow_stale=False)
+        if self._get_duration is not None:
+            self._get_duration.observe(time.perf_counter() - started_at)
+        return found[0] if found is not None else None
+
+    def get_with_staleness(self, key: str) -> Optional[tuple[Any, bool]]:
+        """
+        Get a value from cache, even if it is stale.
+        Returns:
+            A (value, is_stale) tuple, or None if the key is missing or expired.
+            A fresh value from the backend is preferred over a stale local one.
+        """
+        started_at = time.perf_counter()
+        found = self._lookup(key, allow_stale=True)
+        if self._get_duration is not None:
+            self._get_duration.observe(time.perf_counter() - started_at)
+        return found
+
+    def _lookup(self, key: str, allow_stale: bool) -> Optional[tuple[Any, bool]]:
         with self._lock:
             entry = self._cache.get(key)
-            if entry is None:
-                return None
+            if entry is not None and entry.is_expired():
+                self._remove(key)
+                self._expirations += 1
+                entry = None
+
+            if entry is not None and not entry.is_stale():
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return entry.data, False
+            stale_entry = entry
+
+        value = self._get_from_backend(key)
+        with self._lock:
+            if value is not None:
+                self._hits += 1
+                return value, False
+
+            if stale_entry is not None and allow_stale:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                self._stale_hits += 1
+                return stale_entry.data, True
 
-            if entry.is_expired():
-                del self._cache[key]
+            self._misses += 1
+            return None
+
+    def set(self, key: str, value: Any, ttl_seconds: int = 3600, stale_ttl_seconds: int = 0) -> None:
+        """
+        Set a value in cache with TTL, evicting least recently used entries if needed.
+        The value can still be read with get_with_staleness() for stale_ttl_seconds after its TTL.
+        """
+        started_at = time.perf_counter()
+        self._set_local(key, value, ttl_seconds, stale_ttl_seconds)
+
+        if self.backend is not None and self.codec is not None:
+            try:
+                self.backend.set(key, self.codec.dumps(value), time.time() + ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Cache backend error on set for {key}: {type(e).__name__}: {e}")
+
+        if self._set_duration is not None:
+            self._set_duration.observe(time.perf_counter() - started_at)
+
+    def _get_from_backend(self, key: str) -> Optional[Any]:
+        """Look a key up in the shared backend, and keep a local copy for its remaining lifetime."""
+        if self.backend is None or self.codec is None:
+            return None
+
+        try:
+            stored = self.backend.get(key)
+            if stored is None:
                 return None
+            data, expires_at = stored
+            value = self.codec.loads(data)
+        except Exception as e:
+            logger.warning(f"Cache backend error on get for {key}: {type(e).__name__}: {e}")
+            return None
+
+        remaining_ttl = int(expires_at - time.time())
+        if remaining_ttl > 0:
+            self._set_local(key, value, remaining_ttl)
+        return value
 
-            return entry.data
+    def _set_local(self, key: str, value: Any, ttl_seconds: int, stale_ttl_seconds: int = 0) -> None:
+        size = estimate_size(value) if self.max_bytes is not None else 0
 
-    def set(self, key: str, value: Any, ttl_seconds: int = 3600) -> None:
-        """Set a value in cache with TTL."""
         with self._lock:
-            self._cache[key] = CacheEntry(data=value, timestamp=time.time(), ttl_seconds=ttl_seconds)
+            if key in self._cache:
+                self._remove(key)
+
+            if self.max_bytes is not None and size > self.max_bytes:
+                # A value larger than the whole budget would flush every other entry for nothing
+                self._evictions += 1
+                return
+
+            self._cache[key] = CacheEntry(
+                data=value,
+                timestamp=time.time(),
+                ttl_seconds=ttl_seconds,
+                size=size,
+                stale_ttl_seconds=stale_ttl_seconds,
+            )
+            self._size_bytes += size
+            self._evict_if_needed()
 
     def delete(self, key: str) -> bool:
         """Delete a key from cache. Returns True if key existed."""
         with self._lock:
-            return self._cache.pop(key, None) is not None
+            existed = self._remove(key) is not None
+
+        if self.backend is not None:
+            try:
+                existed = self.backend.delete(key) or existed
+            except Exception as e:
+                logger.warning(f"Cache backend error on delete for {key}: {type(e).__name__}: {e}")
+        return existed
 
     def clear(self) -> None:
         """Clear all cached entries."""
         with self._lock:
             self._cache.clear()
+            self._size_bytes = 0
+
+        if self.backend is not None:
+            try:
+                self.backend.clear()
+            except Exception as e:
+                logger.warning(f"Cache backend error on clear: {type(e).__name__}: {e}")
 
     def cleanup_expired(self) -> int:
-        """Remove expired entries. Returns number of entries removed."""
+        """Remove expired entries. Returns number of local entries removed."""
         with self._lock:
             expired_keys = [key for key, entry in self._cache.items() if entry.is_expired()]
             for key in expired_keys:
-                del self._cache[key]
-            return len(expired_keys)
+                self._remove(key)
+            self._expirations += len(expired_keys)
+
+        if self.backend is not None:
+            try:
+                self.backend.cleanup_expired()
+            except Exception as e:
+                logger.warning(f"Cache backend error on cleanup: {type(e).__name__}: {e}")
+        return len(expired_keys)
+
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                stale_hits=self._stale_hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                entries=len(self._cache),
+                size_bytes=self._size_bytes,
+            )
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _remove(self, key: str) -> Optional[CacheEntry]:
+        """Remove an entry and keep the size accounting up to date. Must be called with the lock held."""
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._size_bytes -= entry.size
+        return entry
+
+    def _evict_if_needed(self) -> None:
+        """Evict least recently used entries until both bounds are met. Must be called with the lock held."""
+        while self._cache and (
+            (self.max_entries is not None and len(self._cache) > self.max_entries)
+            or (self.max_bytes is not None and self._size_bytes > self.max_bytes)
+        ):
+            _, entry = self._cache.popitem(last=False)
+            self._size_bytes -= entry.size
+            self._evictions += 1
+
+
+async def sweep_expired_entries(cache: SimpleCache, interval_seconds: float) -> None:
+    """
+    Periodically drop expired entries from the cache, so that entries which are never
+    read again do not hold memory until they are evicted by the LRU policy.
+    Meant to run as a background task for the whole lifetime of the application.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        removed = cache.cleanup_expired()
+        if removed:
+            logger.debug(f"Cache sweeper removed {removed} expired entries")
+
+
+def _get_optional_int_env(name: str, default: int | None) -> int | None:
+    """Read an integer from the environment, 0 or a negative value meaning 'no limit'."""
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    parsed = int(value)
+    return parsed if parsed > 0 else None
+
+
+KNOWLEDGE_PANEL_CACHE_MAX_ENTRIES = _get_optional_int_env("KNOWLEDGE_PANEL_CACHE_MAX_ENTRIES", 20_000)
+KNOWLEDGE_PANEL_CACHE_MAX_BYTES = _get_optional_int_env("KNOWLEDGE_PANEL_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+PRODUCT_DATA_CACHE_MAX_ENTRIES = _get_optional_int_env("PRODUCT_DATA_CACHE_MAX_ENTRIES", 20_000)
+PAIN_REPORT_CACHE_MAX_ENTRIES = _get_optional_int_env("PAIN_REPORT_CACHE_MAX_ENTRIES", 20_000)
+CACHE_SWEEP_INTERVAL_SECONDS = float(os.getenv("CACHE_SWEEP_INTERVAL_SECONDS", "300"))
+
+# Lifetime of each cached outcome, in seconds
+# Rendered knowledge panels are fresh for 1 day, then served stale while being refreshed for up to 1 week
+KNOWLEDGE_PANEL_TTL_SECONDS = int(os.getenv("KNOWLEDGE_PANEL_TTL_SECONDS", "86400"))
+KNOWLEDGE_PANEL_STALE_TTL_SECONDS = int(os.getenv("KNOWLEDGE_PANEL_STALE_TTL_SECONDS", "604800"))
+PRODUCT_DATA_TTL_SECONDS = int(os.getenv("PRODUCT_DATA_TTL_SECONDS", "86400"))
+PAIN_REPORT_TTL_SECONDS = int(os.getenv("PAIN_REPORT_TTL_SECONDS", "86400"))
+# Negative caching: barcodes unknown to OFF, and products which are not supported by the calculators
+PRODUCT_NOT_FOUND_TTL_SECONDS = int(os.getenv("PRODUCT_NOT_FOUND_TTL_SECONDS", "600"))
+UNSUPPORTED_PRODUCT_TTL_SECONDS = int(os.getenv("UNSUPPORTED_PRODUCT_TTL_SECONDS", "3600"))
+# Knowledge panels are cached along with a gzipped copy at this level (1-9); unset or 0 disables the pre-compression
+KNOWLEDGE_PANEL_GZIP_LEVEL = _get_optional_int_env("KNOWLEDGE_PANEL_GZIP_LEVEL", None)
+# Part of the knowledge panels ETags: bump it to invalidate the panels cached by HTTP clients and proxies
+# when the rendering rules change (changes of the pain data are accounted for automatically)
+KNOWLEDGE_PANEL_RULES_VERSION = os.getenv("KNOWLEDGE_PANEL_RULES_VERSION", "1")
+# Path of a SQLite file shared by all replicas (e.g. on a common volume); unset keeps the cache per process
+KNOWLEDGE_PANEL_CACHE_SQLITE_PATH = os.getenv("KNOWLEDGE_PANEL_CACHE_SQLITE_PATH")
+# Longest wait for a lock held by another replica on the shared SQLite file, blocking the event loop meanwhile
+KNOWLEDGE_PANEL_CACHE_SQLITE_BUSY_TIMEOUT_SECONDS = float(
+    os.getenv("KNOWLEDGE_PANEL_CACHE_SQLITE_BUSY_TIMEOUT_SECONDS", "0.005")
+)
+
+# Global cache instances
+# Rendered knowledge panels, by barcode and locale, as EncodedResponse
+knowledge_panel_cache = SimpleCache(
+    max_entries=KNOWLEDGE_PANEL_CACHE_MAX_ENTRIES,
+    max_bytes=KNOWLEDGE_PANEL_CACHE_MAX_BYTES,
+    backend=(
+        SqliteCacheBackend(
+            KNOWLEDGE_PANEL_CACHE_SQLITE_PATH, timeout_seconds=KNOWLEDGE_PANEL_CACHE_SQLITE_BUSY_TIMEOUT_SECONDS
+        )
+        if KNOWLEDGE_PANEL_CACHE_SQLITE_PATH
+        else None
+    ),
+    codec=EncodedResponseCodec(gzip_level=KNOWLEDGE_PANEL_GZIP_LEVEL),
+    name="knowledge_panel",
+)
+# Raw OFF product payloads, by barcode only: they hold the product names of every locale
+product_data_cache = SimpleCache(max_entries=PRODUCT_DATA_CACHE_MAX_ENTRIES, name="product_data")
+# Computed pain reports, by barcode and locale (the localized product name is used by the calculators)
+pain_report_cache = SimpleCache(max_entries=PAIN_REPORT_CACHE_MAX_ENTRIES, name="pain_report")
+
+# Counters and gauges of CacheStats exposed by the /metrics endpoint
+_CACHE_STATS_METRICS = {
+    "hits": ("counter", "Number of cache lookups which found a fresh value"),
+    "stale_hits": ("counter", "Number of cache lookups which found a stale value"),
+    "misses": ("counter", "Number of cache lookups which found nothing"),
+    "evictions": ("counter", "Number of entries evicted to respect the bounds of the cache"),
+    "expirations": ("counter", "Number of expired entries dropped"),
+    "entries": ("gauge", "Number of entries in the cache"),
+    "size_bytes": ("gauge", "Estimated size of the entries of the cache, for caches bounded in bytes"),
+}
+
+
+def collect_cache_metrics():
+    """Collect the statistics of the caches, for the /metrics endpoint"""
+    stats_by_cache = {
+        cache.name: cache.stats() for cache in (knowledge_panel_cache, product_data_cache, pain_report_cache)
+    }
+    for field, (metric_type, documentation) in _CACHE_STATS_METRICS.items():
+        name = f"app_cache_{field}"
+        sample_name = f"{name}_total" if metric_type == "counter" else name
+        samples = [(sample_name, {"cache": cache}, getattr(stats, field)) for cache, stats in stats_by_cache.items()]
+        yield name, metric_type, documentation, samples
 
 
-# Global cache instance
-knowledge_panel_cache = SimpleCache()
+registry.register_collector(collect_cache_metrics)
@@ -1,9 +1,17 @@
 import asyncio
 import logging
-from typing import Optional
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
 
 import httpx
 
+from app.config.exceptions import ExternalServiceException
+from app.config.metrics import UPSTREAM_RESPONSES, observe_stage, registry
+
 logger = logging.getLogger("app")
 
 client = httpx.AsyncClient(
@@ -16,14 +24,322 @@ client = httpx.AsyncClient(
     ),
 )
 
-_semaphore = asyncio.Semaphore(3)
+
+@dataclass(frozen=True)
+class ConcurrencyLimits:
+    """Bounds of the adaptive concurrency limit of an upstream host"""
+
+    min_limit: int
+    initial_limit: int
+    max_limit: int
+    # Responses slower than this are a sign of an overloaded upstream, and reduce the limit
+    latency_threshold_seconds: float
+
+
+@dataclass
+class _Slot:
+    started_at: float
+    overloaded: bool = False
+
+
+# Number of recent latencies kept by host, and needed to compute their percentiles
+LATENCY_WINDOW_SIZE = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of concurrent requests to an upstream host with AIMD
+    (additive increase, multiplicative decrease).
+
+    Each fast and successful response raises the limit by 1/limit, i.e. by about 1 once
+    a full window of requests succeeded, up to max_limit. A 429, a 5xx, a network error or
+    a response slower than the latency threshold halves it, down to min_limit.
+    """
+
+    def __init__(self, limits: ConcurrencyLimits, backoff_factor: float = 0.5):
+        self.limits = limits
+        self.backoff_factor = backoff_factor
+        self.limit = float(limits.initial_limit)
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        # Latencies of the last successful requests, to derive percentiles from
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW_SIZE)
+
+    def latency_percentile(self, quantile: float) -> Optional[float]:
+        """Return a percentile of the recent successful latencies, or None without enough samples"""
+        if len(self._latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[_Slot]:
+        """
+        Hold a concurrency slot for the duration of a request.
+        The caller sets `overloaded` on the yielded slot when the upstream shows signs of overload.
+        """
+        with observe_stage("upstream_slot_wait"):
+            await self._acquire()
+        slot = _Slot(started_at=time.monotonic())
+        try:
+            yield slot
+        finally:
+            self._release(time.monotonic() - slot.started_at, slot.overloaded)
+
+    async def _acquire(self) -> None:
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                # The slot this waiter was woken up for goes to the next one
+                self._wake_up_waiters()
+                raise
+        self.in_flight += 1
+
+    def _release(self, latency_seconds: float, overloaded: bool) -> None:
+        self.in_flight -= 1
+
+        if not overloaded:
+            self._latencies.append(latency_seconds)
+
+        if overloaded or latency_seconds > self.limits.latency_threshold_seconds:
+            self.limit = max(float(self.limits.min_limit), self.limit * self.backoff_factor)
+        else:
+            self.limit = min(float(self.limits.max_limit), self.limit + 1 / self.limit)
+
+        self._wake_up_waiters()
+
+    def _wake_up_waiters(self) -> None:
+        available = int(self.limit) - self.in_flight
+        while available > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                available -= 1
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to an upstream host whose circuit breaker is open"""
+
+    def __init__(self, host: str):
+        self.host = host
+        super().__init__(f"Circuit breaker open for {host}")
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to an upstream host while most of them fail.
+
+    The breaker opens when the failure rate of the last `window_size` requests exceeds
+    `failure_rate_threshold` (after at least `min_requests` requests): requests then fail
+    fast with CircuitOpenError. After `open_seconds`, a single probe request is let through
+    (half-open state): the breaker closes if it succeeds, and opens again otherwise.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        min_requests: int = 10,
+        open_seconds: float = 30.0,
+    ):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes: deque[bool] = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Tell whether a request may be sent, moving from open to half-open once open_seconds are over"""
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record(self, success: Optional[bool]) -> None:
+        """
+        Record the outcome of an allowed request.
+        None means the request gave no information on the upstream health (e.g. it was cancelled).
+        """
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            if success is True:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            elif success is False:
+                self._open()
+            return
+
+        if success is None:
+            return
+
+        self._outcomes.append(success)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) > self.failure_rate_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        logger.warning(f"Circuit breaker opened for {self.open_seconds} seconds")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+def _limits_from_env(prefix: str, default: ConcurrencyLimits) -> ConcurrencyLimits:
+    """Read the limits of a host from {prefix}_MIN_CONCURRENCY, {prefix}_INITIAL_CONCURRENCY..."""
+    return ConcurrencyLimits(
+        min_limit=int(os.getenv(f"{prefix}_MIN_CONCURRENCY", str(default.min_limit))),
+        initial_limit=int(os.getenv(f"{prefix}_INITIAL_CONCURRENCY", str(default.initial_limit))),
+        max_limit=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(default.max_limit))),
+        latency_threshold_seconds=float(
+            os.getenv(f"{prefix}_LATENCY_THRESHOLD_SECONDS", str(default.latency_threshold_seconds))
+        ),
+    )
+
+
+# Concurrency limits by upstream host, the connection pool of the client being shared by all of them
+HOST_CONCURRENCY_LIMITS = {
+    "world.openfoodfacts.org": _limits_from_env(
+        "OFF_WORLD", ConcurrencyLimits(min_limit=1, initial_limit=4, max_limit=16, latency_threshold_seconds=2.0)
+    ),
+    "search.openfoodfacts.org": _limits_from_env(
+        "OFF_SEARCH", ConcurrencyLimits(min_limit=1, initial_limit=2, max_limit=4, latency_threshold_seconds=2.0)
+    ),
+}
+DEFAULT_CONCURRENCY_LIMITS = _limits_from_env(
+    "HTTP_DEFAULT", ConcurrencyLimits(min_limit=1, initial_limit=3, max_limit=10, latency_threshold_seconds=5.0)
+)
+
+# Circuit breakers, and the hedged requests of the OFF API, rely on the outcome of the last requests to each host
+CIRCUIT_BREAKER_FAILURE_RATE_THRESHOLD = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE_THRESHOLD", "0.5"))
+CIRCUIT_BREAKER_WINDOW_SIZE = int(os.getenv("CIRCUIT_BREAKER_WINDOW_SIZE", "20"))
+CIRCUIT_BREAKER_MIN_REQUESTS = int(os.getenv("CIRCUIT_BREAKER_MIN_REQUESTS", "10"))
+CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", "30"))
+
+# Longest Retry-After of a 429 response waited for before retrying: beyond it, the request fails right away
+RETRY_AFTER_MAX_SECONDS = float(os.getenv("RETRY_AFTER_MAX_SECONDS", "10"))
+
+# Hedged requests: when a request is slower than the p95 latency of its host, a second one is sent
+HEDGED_REQUESTS_ENABLED = os.getenv("HEDGED_REQUESTS_ENABLED", "false").lower() in ("1", "true", "yes")
+# Hedging delay until enough latencies have been observed
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "1.0"))
+
+_limiters: dict[str, AdaptiveConcurrencyLimiter] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_limiter(host: str) -> AdaptiveConcurrencyLimiter:
+    """Return the concurrency limiter of an upstream host, creating it on first use."""
+    limiter = _limiters.get(host)
+    if limiter is None:
+        limiter = AdaptiveConcurrencyLimiter(HOST_CONCURRENCY_LIMITS.get(host, DEFAULT_CONCURRENCY_LIMITS))
+        _limiters[host] = limiter
+    return limiter
+
+
+def get_circuit_breaker(host: str) -> CircuitBreaker:
+    """Return the circuit breaker of an upstream host, creating it on first use."""
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            failure_rate_threshold=CIRCUIT_BREAKER_FAILURE_RATE_THRESHOLD,
+            window_size=CIRCUIT_BREAKER_WINDOW_SIZE,
+            min_requests=CIRCUIT_BREAKER_MIN_REQUESTS,
+            open_seconds=CIRCUIT_BREAKER_OPEN_SECONDS,
+        )
+        _breakers[host] = breaker
+    return breaker
+
+
+def collect_upstream_metrics():
+    """Collect the concurrency of the upstream hosts, for the /metrics endpoint"""
+    yield (
+        "app_upstream_requests_in_flight",
+        "gauge",
+        "Number of requests being sent to each upstream host",
+        [("app_upstream_requests_in_flight", {"host": host}, limiter.in_flight) for host, limiter in _limiters.items()],
+    )
+    yield (
+        "app_upstream_concurrency_limit",
+        "gauge",
+        "Adaptive concurrency limit of each upstream host",
+        [("app_upstream_concurrency_limit", {"host": host}, limiter.limit) for host, limiter in _limiters.items()],
+    )
+
+
+registry.register_collector(collect_upstream_metrics)
+
+
+def hedge_delay(host: str) -> float:
+    """Return how long to wait for a request to the host before hedging it: the p95 of its recent latencies."""
+    p95 = get_limiter(host).latency_percentile(0.95)
+    return HEDGE_DEFAULT_DELAY_SECONDS if p95 is None else p95
 
 
 async def get(url: str, **kwargs) -> httpx.Response:
-    async with _semaphore:
-        response = await client.get(url, **kwargs)
-        response.raise_for_status()
-        return response
+    host = httpx.URL(url).host
+    breaker = get_circuit_breaker(host)
+    if not breaker.allow_request():
+        UPSTREAM_RESPONSES.labels(host, "circuit_open").inc()
+        raise CircuitOpenError(host)
+
+    # Stays None when the request is cancelled, which tells nothing about the upstream health
+    healthy: Optional[bool] = None
+    try:
+        async with get_limiter(host).slot() as slot:
+            try:
+                response = await client.get(url, **kwargs)
+            except httpx.TransportError:
+                UPSTREAM_RESPONSES.labels(host, "error").inc()
+                slot.overloaded = True
+                healthy = False
+                raise
+            UPSTREAM_RESPONSES.labels(host, str(response.status_code)).inc()
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                # Rate limiting and server errors: the upstream asks for less traffic
+                slot.overloaded = e.response.status_code == 429 or e.response.status_code >= 500
+                healthy = not slot.overloaded
+                raise
+            healthy = True
+            return response
+    finally:
+        breaker.record(healthy)
+
+
+def _retry_after_seconds(error: Exception) -> float:
+    """Delay asked by a 429 response through its Retry-After header (in seconds), or 0"""
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+        try:
+            return float(error.response.headers.get("Retry-After", 0))
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+def _is_client_error(error: Exception) -> bool:
+    """Whether the error is a 4xx response other than a 429, which asks to retry later"""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False
+    status_code = error.response.status_code
+    return 400 <= status_code < 500 and status_code != 429
 
 
 async def get_with_retry(
@@ -39,11 +355,22 @@ async def get_with_retry(
             return await get(url, **kwargs)
 
         except (httpx.HTTPError, httpx.TimeoutException) as e:
+            if _is_client_error(e):
+                # The same request would get the same answer: no retry (e.g. a 404 for an unknown product)
+                raise
             last_exception = e
             logger.warning(f"HTTP error on attempt {attempt + 1}/{retries} for {url}: {type(e).__name__}")
 
+            retry_after = _retry_after_seconds(e)
+            if retry_after > RETRY_AFTER_MAX_SECONDS:
+                # Waiting would hold the client request, and the ones joined to it, for too long
+                raise ExternalServiceException(
+                    f"{httpx.URL(url).host} is rate limiting requests for {retry_after:g} seconds", status_code=503
+                ) from e
+
             if attempt < retries - 1:
-                await asyncio.sleep(base_delay * (2**attempt))
+                # Sleep outside of get(), so that the concurrency slot is free for other requests meanwhile
+                await asyncio.sleep(max(base_delay * (2**attempt), retry_after))
 
     raise last_exception or RuntimeError("Retry failed without exception")
 
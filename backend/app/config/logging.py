@@ -1,9 +1,25 @@
+import itertools
+import json
 import logging
+import os
 import sys
+import time
+import traceback
 from pathlib import Path
+from typing import Any, Callable
 
 from loguru import logger
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "text" for human readable logs, "json" for one JSON object per line, with the extra fields bound to the logger
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Hand the console logs over to a background writer thread instead of writing them from the event loop.
+# The file sink always uses it, so that its rotation and compression never run on the request path.
+LOG_ENQUEUE = os.getenv("LOG_ENQUEUE", "true").lower() in ("1", "true", "yes")
+# Share of the cache hits which are logged, by default and for some routes (e.g. "knowledge_panel=0.1,other=1")
+LOG_CACHE_HIT_SAMPLE_RATE = float(os.getenv("LOG_CACHE_HIT_SAMPLE_RATE", "0.01"))
+LOG_CACHE_HIT_SAMPLE_RATES = os.getenv("LOG_CACHE_HIT_SAMPLE_RATES", "")
+
 
 class InterceptHandler(logging.Handler):
     """
@@ -26,12 +42,91 @@ class InterceptHandler(logging.Handler):
         logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
 
 
-def setup_logging(log_level="INFO"):
+class LogSampler:
+    """
+    Lets through a share of the logs of each route, to keep the logs of hot paths (e.g. cache hits) cheap.
+    With a rate of 0.01, the 1st, 101st, 201st... calls of should_log() for a route return True.
+    A rate of 1 or more logs everything, a rate of 0 or less nothing.
+    """
+
+    def __init__(self, default_rate: float, rates_by_route: dict[str, float] | None = None):
+        self.default_rate = default_rate
+        self.rates_by_route = rates_by_route or {}
+        self._counters: dict[str, itertools.count] = {}
+
+    @classmethod
+    def from_config(cls, default_rate: float, rates_by_route: str) -> "LogSampler":
+        """Build a sampler from a default rate and a "route=rate,route=rate" string"""
+        rates = {}
+        for item in rates_by_route.split(","):
+            if item.strip():
+                route, rate = item.split("=")
+                rates[route.strip()] = float(rate)
+        return cls(default_rate, rates)
+
+    def should_log(self, route: str) -> bool:
+        rate = self.rates_by_route.get(route, self.default_rate)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        counter = self._counters.setdefault(route, itertools.count())
+        return next(counter) % round(1 / rate) == 0
+
+
+cache_hit_log_sampler = LogSampler.from_config(LOG_CACHE_HIT_SAMPLE_RATE, LOG_CACHE_HIT_SAMPLE_RATES)
+
+
+class StageTimer:
+    """
+    Measures the successive stages of a request, e.g. to log them:
+    each call to lap() records the time elapsed since the previous one (or since the timer was created).
+    """
+
+    def __init__(self) -> None:
+        self.timings_ms: dict[str, float] = {}
+        self._started = self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.timings_ms[stage] = round((now - self._last) * 1000, 3)
+        self._last = now
+
+    @property
+    def total_ms(self) -> float:
+        return round((self._last - self._started) * 1000, 3)
+
+
+def json_format(record) -> str:
+    """Loguru format function writing each record as one JSON object, with the extra fields bound to the logger"""
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "name": record["name"],
+        "message": record["message"],
+        **{key: value for key, value in record["extra"].items() if key != "json"},
+    }
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["json"] = json.dumps(entry, default=str, ensure_ascii=False)
+    return "{extra[json]}\n"
+
+
+def setup_logging(
+    log_level: str = LOG_LEVEL,
+    log_format: str = LOG_FORMAT,
+    enqueue: bool = LOG_ENQUEUE,
+    log_dir: Path = Path("logs"),
+):
     """
     Configure loguru logger with console and file sinks.
+    Meant to be called once, when the application starts.
 
     Args:
         log_level: Log level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        log_format: "text" or "json"
+        enqueue: Whether the console sink writes from a background thread
+        log_dir: Directory of the rotated log files
 
     Returns:
         loguru.logger instance
@@ -40,32 +135,39 @@ def setup_logging(log_level="INFO"):
     logger.remove()
 
     # Create logs directory if it doesn't exist
-    log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
 
     # Define log format
-    console_format = (
-        "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
-        "<level>{level: <8}</level> | "
-        "<cyan>{name}</cyan> - <level>{message}</level>"
-    )
+    console_format: str | Callable[[Any], str]
+    file_format: str | Callable[[Any], str]
+    if log_format == "json":
+        console_format = file_format = json_format
+    else:
+        console_format = (
+            "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
+            "<level>{level: <8}</level> | "
+            "<cyan>{name}</cyan> - <level>{message}</level>"
+        )
+        file_format = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {name} - {message}"
 
     # Add console handler
     logger.add(
         sys.stdout,
         format=console_format,
         level=log_level,
-        colorize=True,
+        colorize=log_format != "json",
+        enqueue=enqueue,
     )
 
-    # Add file handler
+    # Add file handler, written, rotated and compressed by a background thread
     logger.add(
         log_dir / "app.log",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name} - {message}",
+        format=file_format,
         level=log_level,
         rotation="10 MB",
         retention="1 week",
         compression="gz",
+        enqueue=True,
     )
 
     # Configure logging to intercept standard library logs
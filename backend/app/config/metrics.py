@@ -0,0 +1,239 @@
+"""
+In-process metrics, exposed in the Prometheus text format by the /metrics endpoint.
+
+Recording a value only updates a few numbers in memory: the text exposition is only built when
+the endpoint is scraped. Values which already exist elsewhere (e.g. cache statistics) are read
+by collectors at scrape time rather than being recorded twice.
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Generic, Iterable, Iterator, TypeVar
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets in seconds, from fast in-memory stages to slow upstream requests
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets in seconds, for cache operations which are expected to take microseconds
+CACHE_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+
+# A collected sample: metric name, labels and value
+Sample = tuple[str, dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+ChildT = TypeVar("ChildT")
+
+
+class Metric(Generic[ChildT]):
+    """Base class of the metrics: a family of children, one by combination of label values"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], ChildT] = {}
+
+    def labels(self, *values: str) -> ChildT:
+        """Return the child of the given label values, to record values with. Children can be kept and reused."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {values}")
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self) -> ChildT:
+        raise NotImplementedError
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+    def _labels_dict(self, values: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.labelnames, values, strict=True))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(Metric[_CounterChild]):
+    type = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def samples(self) -> Iterator[Sample]:
+        for values, child in self._children.items():
+            yield f"{self.name}_total", self._labels_dict(values), child.value
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(Metric[_GaugeChild]):
+    type = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def samples(self) -> Iterator[Sample]:
+        for values, child in self._children.items():
+            yield self.name, self._labels_dict(values), child.value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # One count per bucket, plus the +Inf one; they are only accumulated when collected
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of the block, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(Metric[_HistogramChild]):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: tuple[float, ...] = STAGE_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def samples(self) -> Iterator[Sample]:
+        for values, child in self._children.items():
+            labels = self._labels_dict(values)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), child.counts, strict=True):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, child.sum
+            yield f"{self.name}_count", labels, cumulative
+
+
+# A collector returns the samples of a metric family at scrape time: (name, type, documentation, samples)
+Collector = Callable[[], Iterable[tuple[str, str, str, Iterable[Sample]]]]
+
+
+MetricT = TypeVar("MetricT", bound=Metric)
+
+
+class MetricsRegistry:
+    """The metrics and collectors exposed by the /metrics endpoint"""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Collector] = []
+
+    def register(self, metric: MetricT) -> MetricT:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Build the Prometheus text exposition of every metric"""
+        families: list[tuple[str, str, str, Iterable[Sample]]] = [
+            (metric.name, metric.type, metric.documentation, metric.samples()) for metric in self._metrics.values()
+        ]
+        for collector in self._collectors:
+            families.extend(collector())
+
+        lines = []
+        for name, metric_type, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION_SECONDS = registry.register(
+    Histogram(
+        "app_stage_duration_seconds",
+        "Duration of the stages of the computation of knowledge panels",
+        labelnames=("stage",),
+    )
+)
+CACHE_OPERATION_DURATION_SECONDS = registry.register(
+    Histogram(
+        "app_cache_operation_duration_seconds",
+        "Duration of the cache operations",
+        labelnames=("cache", "operation"),
+        buckets=CACHE_BUCKETS,
+    )
+)
+UPSTREAM_RESPONSES = registry.register(
+    Counter(
+        "app_upstream_responses",
+        "Responses of the upstream hosts, by status code ('error' for network errors, 'circuit_open' when not sent)",
+        labelnames=("host", "status"),
+    )
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.register(
+    Gauge("app_http_requests_in_flight", "Number of HTTP requests being served")
+).labels()
+
+
+def observe_stage(stage: str):
+    """Context manager observing the duration of a stage in STAGE_DURATION_SECONDS"""
+    return STAGE_DURATION_SECONDS.labels(stage).time()
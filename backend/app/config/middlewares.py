@@ -1,78 +1,160 @@
+import os
+from functools import lru_cache
+from typing import Callable
 from urllib.parse import parse_qs
 
-from fastapi import Request
 from fastapi.responses import JSONResponse
 from loguru import logger
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.config.exceptions import BaseAppException
 from app.config.i18n import get_i18n
+from app.config.metrics import HTTP_REQUESTS_IN_FLIGHT
 
+# Maximum number of distinct (lang parameter, Accept-Language header) pairs whose locale is remembered
+LOCALE_CACHE_SIZE = int(os.getenv("LOCALE_CACHE_SIZE", "1024"))
 
-async def add_locale_translator(request: Request, call_next):
+
+@lru_cache(maxsize=LOCALE_CACHE_SIZE)
+def resolve_locale(lang: str | None, accept_language: str) -> tuple[str, tuple[Callable, Callable]]:
     """
-    Middleware to add the translator to the request.state with priority URL -> Header
+    Resolve the locale of a request with priority URL -> Header, and its translator.
+    Memoized: clients send a handful of distinct Accept-Language headers over and over.
+
+    Args:
+        lang: The 'lang' query parameter, if any
+        accept_language: The raw Accept-Language header, empty if missing
+    Returns:
+        The locale and its gettext translator and ngettext
     """
     i18n = get_i18n()
 
-    # Check if the locale is specified in the URL
-    query_params = parse_qs(request.url.query)
-    lang = query_params.get("lang", [None])[0]
-
     if lang and i18n.is_supported_locale(lang.lower()):
         locale = lang.lower()
     else:
-        # If not, use the Accept-Language header
-        accept_language = request.headers.get("Accept-Language", "")
-        languages = [lang.split(";")[0].split("-")[0].lower() for lang in accept_language.split(",")]
+        languages = (language.split(";")[0].split("-")[0].strip().lower() for language in accept_language.split(","))
         locale = next(
             (locale for locale in languages if i18n.is_supported_locale(locale)),
             i18n.default_locale,
         )
 
-    # Add the translator to the request state
-    request.state.translator = i18n.get_translator(locale)
-    request.state.locale = locale
+    return locale, i18n.get_translator(locale)
+
+
+def _get_lang_param(query_string: bytes) -> str | None:
+    """Return the 'lang' query parameter, without parsing query strings which cannot hold it"""
+    if b"lang=" not in query_string:
+        return None
+    return parse_qs(query_string.decode("latin-1")).get("lang", [None])[0]
 
-    response = await call_next(request)
-    return response
 
+def _get_header(scope: Scope, name: bytes) -> str:
+    """Return a request header from the ASGI scope, whose header names are lowercase, or an empty string"""
+    for header_name, value in scope["headers"]:
+        if header_name == name:
+            return value.decode("latin-1")
+    return ""
 
-class GlobalExceptionMiddleware(BaseHTTPMiddleware):
+
+class LocaleTranslatorMiddleware:
+    """
+    Pure ASGI middleware adding the locale and its translator to the request.state with priority URL -> Header
     """
-    Middleware to catch and properly handle all unhandled exceptions.
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            locale, translator = resolve_locale(
+                _get_lang_param(scope.get("query_string", b"")), _get_header(scope, b"accept-language")
+            )
+            # request.state is backed by scope["state"]
+            state = scope.setdefault("state", {})
+            state["locale"] = locale
+            state["translator"] = translator
+
+        await self.app(scope, receive, send)
+
+
+class InFlightRequestsMiddleware:
+    """
+    Pure ASGI middleware counting the HTTP requests being served, for the /metrics endpoint
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
+
+class GlobalExceptionMiddleware:
+    """
+    Pure ASGI middleware to catch and properly handle all unhandled exceptions.
     This ensures consistent error responses across the application.
+    Responses are passed through untouched, so streaming responses are not buffered.
     """
 
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            return await call_next(request)
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            # Log the exception with path context
-            if isinstance(e, BaseAppException):
-                # If it's a known exception, just log the message
-                logger.warning(f"{str(e)} (path: {request.url.path})")
-            else:
-                # If it's not a known exception, log the full traceback
-                logger.exception(f"Unknown exception: {e} (path: {request.url.path})")
-
-            # Determine status code
-            status_code = getattr(e, "status_code", 500)
-
-            # Get error message
-            detail = getattr(e, "detail", None) or str(e)
-
-            # Hide internal server errors with a generic message
-            if 500 <= status_code < 600:
-                detail = "An unexpected server error occurred"
-
-            # Create JSON response with error details
-            return JSONResponse(
-                status_code=status_code,
-                content={
-                    "error": {
-                        "status": status_code,
-                        "message": detail,
-                    }
-                },
-            )
+            if response_started:
+                # The response is already on its way (e.g. a failing stream): an error response cannot be sent
+                raise
+            await self.error_response(e, scope["path"])(scope, receive, send)
+
+    @staticmethod
+    def error_response(e: Exception, path: str) -> JSONResponse:
+        # Log the exception with path context
+        if isinstance(e, BaseAppException):
+            # If it's a known exception, just log the message
+            logger.warning(f"{str(e)} (path: {path})")
+        else:
+            # If it's not a known exception, log the full traceback
+            logger.exception(f"Unknown exception: {e} (path: {path})")
+
+        # Determine status code
+        status_code = getattr(e, "status_code", 500)
+
+        # Get error message
+        detail = getattr(e, "detail", None) or str(e)
+
+        # Hide internal server errors with a generic message
+        if 500 <= status_code < 600:
+            detail = "An unexpected server error occurred"
+
+        # Create JSON response with error details
+        return JSONResponse(
+            status_code=status_code,
+            content={
+                "error": {
+                    "status": status_code,
+                    "message": detail,
+                }
+            },
+        )
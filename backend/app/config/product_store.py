@@ -0,0 +1,179 @@
+"""
+Local store of OFF products, built from the OFF Parquet dump by pipelines/extract_egg_products.py.
+
+It holds the products the API can render a knowledge panel for (the egg products and the candidate
+egg products), as the OFF API v3 payloads the knowledge panel service would fetch, indexed by code.
+With it, knowledge panels no longer depend on OFF being reachable, nor on its latency: the live
+API is only requested for the codes which are not in the store, or when the snapshot is too old.
+
+The store is a SQLite database file, opened read-only and shared by the workers of a host.
+Like the barcode index, the pipeline replaces the file atomically and the API loads it again.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from decimal import Decimal
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Optional
+
+from app.config.metrics import Counter, registry
+
+logger = logging.getLogger("app")
+
+
+def _json_default(value):
+    # Numbers of the Parquet file may be read as decimals
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_product_store(
+    path: str | Path, products: Iterable[tuple[str, dict]], created_at: float | None = None
+) -> None:
+    """
+    Write a product store file, atomically.
+
+    Args:
+        path: Path of the store file
+        products: (code, OFF API v3 product) pairs
+        created_at: Date of the snapshot the products come from, as a timestamp (now by default)
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        with connection:
+            connection.execute("CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            connection.execute("CREATE TABLE products (code TEXT PRIMARY KEY, product TEXT NOT NULL) WITHOUT ROWID")
+            connection.execute(
+                "INSERT INTO metadata (key, value) VALUES ('created_at', ?)",
+                (str(created_at if created_at is not None else time.time()),),
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO products (code, product) VALUES (?, ?)",
+                (
+                    (code, json.dumps(product, separators=(",", ":"), default=_json_default))
+                    for code, product in products
+                ),
+            )
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+
+
+PRODUCT_STORE_LOOKUPS = registry.register(
+    Counter("app_product_store_lookups", "Lookups of products in the local product store", labelnames=("result",))
+)
+_HITS = PRODUCT_STORE_LOOKUPS.labels("hit")
+_MISSES = PRODUCT_STORE_LOOKUPS.labels("miss")
+
+
+class ProductStore:
+    """
+    The product store file at a path, loaded again when the file is replaced (see refresh_product_store).
+    Until a valid file is loaded, the store is empty.
+    """
+
+    def __init__(self, path: str | Path | None, max_age_seconds: float = 0) -> None:
+        self.path = Path(path) if path else None
+        # Age of the snapshot after which the live API is preferred, 0 meaning never
+        self.max_age_seconds = max_age_seconds
+        self.created_at = 0.0
+        self._lock = Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._file_id: Optional[tuple[int, int, int]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._connection is not None
+
+    def reload_if_changed(self) -> bool:
+        """Open the store file if it changed since it was last opened. Returns whether it was opened."""
+        if self.path is None:
+            return False
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            logger.warning(f"Product store file not found: {self.path}")
+            return False
+
+        file_id = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return False
+
+        connection = None
+        try:
+            # The file is never modified in place, only replaced: it can be read without locking it
+            connection = sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro&immutable=1", uri=True, check_same_thread=False
+            )
+            row = connection.execute("SELECT value FROM metadata WHERE key = 'created_at'").fetchone()
+            created_at = float(row[0]) if row else 0.0
+        except (sqlite3.Error, ValueError) as e:
+            if connection is not None:
+                connection.close()
+            logger.error(f"Failed to open the product store {self.path}: {e}")
+            return False
+
+        with self._lock:
+            previous, self._connection = self._connection, connection
+            self.created_at, self._file_id = created_at, file_id
+        if previous is not None:
+            previous.close()
+        logger.info(f"Opened the product store {self.path} (snapshot of {time.ctime(created_at)})")
+        return True
+
+    def is_stale(self) -> bool:
+        """Whether the snapshot is too old for its products to be preferred to the live API"""
+        return self.max_age_seconds > 0 and time.time() - self.created_at > self.max_age_seconds
+
+    def get_payload(self, barcode: str) -> Optional[dict]:
+        """Return the OFF API v3 payload of a product, None if it is not in the store"""
+        if self._connection is None:
+            return None
+        with self._lock:
+            try:
+                row = self._connection.execute("SELECT product FROM products WHERE code = ?", (barcode,)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to read product {barcode} from the product store: {e}")
+                return None
+        if row is None:
+            _MISSES.inc()
+            return None
+        _HITS.inc()
+        return {"product": json.loads(row[0])}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = None
+            self._file_id = None
+
+
+async def refresh_product_store(store: ProductStore, interval_seconds: float) -> None:
+    """
+    Periodically open the store file again when it is replaced, e.g. by a new run of the pipeline.
+    Meant to run as a background task for the whole lifetime of the application.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        store.reload_if_changed()
+
+
+# Path of the store file written by pipelines/extract_egg_products.py --product-store; unset disables the store
+PRODUCT_STORE_PATH = os.getenv("PRODUCT_STORE_PATH")
+# Age of the snapshot after which products are fetched from OFF first, the store being their fallback; 0 for never
+PRODUCT_STORE_MAX_AGE_SECONDS = float(os.getenv("PRODUCT_STORE_MAX_AGE_SECONDS", "604800"))
+# How often the store file is checked for a new version, in seconds
+PRODUCT_STORE_REFRESH_SECONDS = float(os.getenv("PRODUCT_STORE_REFRESH_SECONDS", "3600"))
+
+product_store = ProductStore(PRODUCT_STORE_PATH, max_age_seconds=PRODUCT_STORE_MAX_AGE_SECONDS)
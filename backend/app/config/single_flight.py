@@ -0,0 +1,48 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls sharing the same key into a single execution.
+
+    The first caller for a key starts the work, and every caller arriving while it is
+    still running awaits the same result (or exception) instead of starting its own.
+    The key is forgotten as soon as the work completes, so results are never reused
+    across requests: caching is left to the caller.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: dict[Hashable, asyncio.Future[T]] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run func() for the key, or join the execution already in flight for it.
+
+        Args:
+            key: Identifies calls that can share the same result
+            func: Coroutine factory, only called by the first caller
+        Returns:
+            The result of func()
+        """
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+
+        # Shielded so that a cancelled caller does not cancel the work shared with the others
+        return await asyncio.shield(future)
+
+    def in_flight(self) -> int:
+        """Return the number of keys currently being processed."""
+        return len(self._in_flight)
+
+    def _forget(self, key: Hashable, future: asyncio.Future[T]) -> None:
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        # Mark the exception as retrieved, in case every caller was cancelled in the meantime
+        if not future.cancelled():
+            future.exception()
@@ -1,3 +1,6 @@
+from app.enums.open_food_facts.enums import AnimalType, LayingHenBreedingType
+
+
 class BreedingTypesPatternRepository:
     """
     A repository for managing breeding type patterns and related data.
@@ -19,6 +22,15 @@ class BreedingTypesPatternRepository:
     # All breeding types and labels found in OpenFoodFacts products
     BREEDINGS = FREE_RANGE_BREEDINGS.union({"cage", "barn", "cage-free", "rspca", "kat"})
 
+    # Categories tags giving on their own the breeding type of an animal
+    BREEDING_TYPES_BY_CATEGORIES_TAGS = {
+        AnimalType.LAYING_HEN: {
+            LayingHenBreedingType.FREE_RANGE: {"en:free-range-chicken-eggs", "en:organic-eggs"},
+            LayingHenBreedingType.BARN: {"en:barn-chicken-eggs"},
+            LayingHenBreedingType.CAGE: {"en:cage-chicken-eggs"},
+        },
+    }
+
     # Countries where conventional cages are prohibited for laying hens
     COUNTRIES_WHERE_CAGES_ARE_FURNISHED = {
         "en:switzerland",  # conventional cages banned since 1992, phasing out of furnished cages
@@ -241,24 +253,27 @@ def get_free_range_regex() -> str:
         are not matched.
     """
     regex_by_breeding = []
+    # Patterns of the breeding types without exclusion, searched all at once
+    included_without_exclusion = []
 
-    # Loop through each free-range breeding type
-    for breeding in BreedingTypesPatternRepository.FREE_RANGE_BREEDINGS:
+    # Loop through each free-range breeding type, sorted so that the regex is the same in every process
+    for breeding in sorted(BreedingTypesPatternRepository.FREE_RANGE_BREEDINGS):
         # Get the set of included and excluded patterns for the current breeding type
         included = BreedingTypesPatternRepository.BREEDING_PATTERNS_ALL_LANGUAGES.get(breeding, set())
         excluded = BreedingTypesPatternRepository.EXCLUDED_PATTERNS.get(breeding, set())
-        included_regex = "|".join(included)
 
         if not excluded:
-            regex = rf".*\b({included_regex})\b"
+            included_without_exclusion.extend(sorted(included))
         else:
-            excluded_regex = "|".join(excluded)
-            regex = rf"^(?!.*\b({excluded_regex})\b).*?\b({included_regex})\b"
+            excluded_regex = "|".join(sorted(excluded))
+            included_regex = "|".join(sorted(included))
+            regex_by_breeding.append(rf"^(?!.*\b({excluded_regex})\b).*?\b({included_regex})\b")
 
-        regex_by_breeding.append(regex)
+    # A single word-bounded alternation: unlike a ".*" prefix, it is not retried from every position of the text
+    regex_by_breeding.append(r"\b(" + "|".join(included_without_exclusion) + r")\b")
 
     # Combine all individual regex patterns with an OR operator to match any of the free-range breeding types
-    return r"^(" + r")|(".join(regex_by_breeding) + r")"
+    return "|".join(f"(?:{regex})" for regex in regex_by_breeding)
 
 
 def get_barn_regex() -> str:
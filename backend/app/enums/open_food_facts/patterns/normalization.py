@@ -0,0 +1,163 @@
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable
+
+# Maximum number of normalized strings kept by each variant: product names are normalized by several calculators
+NORMALIZATION_CACHE_SIZE = int(os.getenv("NORMALIZATION_CACHE_SIZE", "16384"))
+
+# Characters whose translation is computed at import time, the other ones are computed on first use
+_PRECOMPUTED_CHARACTERS = 0x2000
+
+
+class TranslationTable(dict):
+    """
+    str.translate table mapping each character to its normalized form.
+    The table is precomputed for the most common characters, and completed lazily for the other ones.
+    """
+
+    def __init__(self, translate_character: Callable[[str], str], overrides: dict[str, str] | None = None):
+        self._translate_character = translate_character
+        self._overrides = {ord(char): translation for char, translation in (overrides or {}).items()}
+        super().__init__({code: self._translate_code(code) for code in range(_PRECOMPUTED_CHARACTERS)})
+
+    def _translate_code(self, code: int) -> str:
+        if code in self._overrides:
+            return self._overrides[code]
+        return self._translate_character(chr(code))
+
+    def __missing__(self, code: int) -> str:
+        translation = self._translate_code(code)
+        self[code] = translation
+        return translation
+
+
+def _strip_accents(char: str) -> str:
+    """Removes the accents of a character, which NFD decomposes into nonspacing marks"""
+    return "".join(c for c in unicodedata.normalize("NFD", char) if unicodedata.category(c) != "Mn")
+
+
+# Removes accents and replaces 'œ' with 'oe'
+WORDS_TRANSLATION_TABLE = TranslationTable(_strip_accents, overrides={"œ": "oe"})
+
+# Removes accents, then applies the compatibility decomposition (e.g. 'ﬁ' -> 'fi', '½' -> '1⁄2')
+# and replaces 'œ' with 'oe'
+UNICODE_TRANSLATION_TABLE = TranslationTable(
+    lambda char: unicodedata.normalize("NFKD", _strip_accents(char)), overrides={"œ": "oe"}
+)
+
+PUNCTUATION_OR_DIGITS_REGEX = re.compile(r"[^\w\s]|\d+")
+
+_PERCENTAGE_REGEX = re.compile(r"\d+\s*%")
+_THOUSANDS_REGEX = re.compile(r"\b(\d+)\s+(\d{3})\b")
+_RANGE_REGEX = re.compile(r"\b(\d+)\s*-\s*(\d+)")
+_WEIGHT_OR_VOLUME_REGEX = re.compile(r"\b\d+(?:[.,]\d+)?\s*(?:g|gram[ms]?|oz|ml|lbs?|gr|litres|kg|l)\b")
+_HALF_REGEX = re.compile(r"\b1/2\b")
+_PUNCTUATION_EXCEPT_COUNT_REGEX = re.compile(r"[^\w\s+.,]")
+_ONE_REGEX = re.compile(r"\bone\b")
+_OMEGA_3_REGEX = re.compile(r"\bomega\s*3\b")
+_SIZE_REGEX = re.compile(r"\bsize\s*\d+\b")
+_PUNCTUATION_EXCEPT_APOSTROPHES_REGEX = re.compile(r"[^\w\s'’]")
+_DIGITS_REGEX = re.compile(r"\d+")
+
+
+def _collapse_spaces(s: str) -> str:
+    """Replaces multiple spaces with a single space, and strips leading and trailing spaces"""
+    return " ".join(s.split())
+
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_unicode(s: str) -> str:
+    """
+    Common normalization:
+    - Remove accents
+    - Normalize unicode
+    - Replace œ with oe
+    - Replace multiple spaces with a single space
+    - Strip leading and trailing spaces
+    """
+    return _collapse_spaces(s.translate(UNICODE_TRANSLATION_TABLE))
+
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_words(s: str | None) -> str:
+    """
+    Cleans a string by removing accents, replacing punctuation and digits,
+    converting to lowercase, and replacing 'œ' with 'oe' before regex matching.
+    Used to match breeding types and product types.
+    Args:     s (str | None): The string to clean.
+
+    Returns:  str: The cleaned string.
+    """
+    if not s:
+        return ""
+    return PUNCTUATION_OR_DIGITS_REGEX.sub(" ", s.lower().translate(WORDS_TRANSLATION_TABLE))
+
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_egg_count(s: str) -> str:
+    """
+    Normalizes a string for parsing egg count:
+    - Remove numbers followed by '%'
+    - Merge numbers separated by space in thousands (e.g., '1 200' -> '1200')
+    - Keep only the upper bound in ranges (e.g., '53 - 63' -> '63')
+    - Remove quantities with weight/volume units (g, kg, ml, oz, lbs, etc.)
+    - Replace fractions '1/2' with '.5'
+    - Replace 'one' with '1'
+    - Remove 'omega 3'
+    - Remove size mentions (e.g., 'size 4')
+    - Normalize unicode, accents, and punctuation (keep + . ,)
+    - Reduce multiple spaces to single space
+    """
+    if not s:
+        return ""
+    s = str(s).lower()
+    s = _PERCENTAGE_REGEX.sub("", s)
+    s = _THOUSANDS_REGEX.sub(r"\1\2", s)
+    s = _RANGE_REGEX.sub(r"\2", s)
+    s = _WEIGHT_OR_VOLUME_REGEX.sub("", s)
+    s = _HALF_REGEX.sub(".5", s)
+    s = normalize_unicode(s)
+    s = _PUNCTUATION_EXCEPT_COUNT_REGEX.sub(" ", s)
+    s = _ONE_REGEX.sub("1", s)
+    s = _OMEGA_3_REGEX.sub("", s)
+    s = _SIZE_REGEX.sub("", s)
+    return _collapse_spaces(s)
+
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_egg_caliber(s: str) -> str:
+    """
+    Normalizes a string for parsing egg caliber:
+    - Remove digits
+    - Remove accents
+    - Normalize unicode
+    - Replace œ with oe
+    - Replace punctuation (except apostrophes) with space
+    - Convert to lowercase
+    - Reduce multiple spaces to single space
+    """
+    if not s:
+        return ""
+    s = normalize_unicode(str(s))
+    s = _PUNCTUATION_EXCEPT_APOSTROPHES_REGEX.sub(" ", s)
+    s = _DIGITS_REGEX.sub(" ", s)
+    return _collapse_spaces(s.lower())
+
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_weight(s: str) -> str:
+    """
+    Normalizes a string for parsing weight:
+    - Merge numbers separated by space in thousands (e.g., '1 200' -> '1200')
+    - Remove accents
+    - Normalize unicode
+    - Replace œ with oe
+    - Convert to lowercase
+    - Reduce multiple spaces to single space
+    """
+    if not s:
+        return ""
+    s = _THOUSANDS_REGEX.sub(r"\1\2", str(s))
+    return normalize_unicode(s).lower()
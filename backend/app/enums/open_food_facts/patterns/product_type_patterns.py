@@ -1,5 +1,4 @@
 import re
-import unicodedata
 
 
 class ProductTypePatternRepository:
@@ -322,20 +321,3 @@ class ProductTypePatternRepository:
     EXCLUDED_PATTERNS = re.compile(
         r"\b(" + r"|".join([term.replace(" ", r"\s+") for term in EXCLUDED_WORDS]) + r")\b", re.VERBOSE
     )
-
-    @staticmethod
-    def clean(s: str | None) -> str:
-        """
-        Cleans a string by removing accents, replacing punctuation and digits,
-        converting to lowercase, and replacing 'œ' with 'oe' before regex matching.
-        Args:     s (str | None): The string to clean.
-
-        Returns:  str: The cleaned string.
-        """
-        if not s:
-            return ""
-        s = s.lower().replace("œ", "oe")
-        s = unicodedata.normalize("NFD", s)
-        s = "".join(c for c in s if unicodedata.category(c) != "Mn")
-        s = re.sub(r"[^\w\s]|\d+", " ", s)
-        return s
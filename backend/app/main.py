@@ -1,16 +1,27 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from loguru import logger
 
 from app.api.open_food_facts.routes import router as off_router
+from app.business.open_food_facts.panel_renderer.templates import template_registry
+from app.config.barcode_index import EGG_BARCODE_INDEX_REFRESH_SECONDS, egg_barcode_index, refresh_barcode_index
+from app.config.cache import (
+    CACHE_SWEEP_INTERVAL_SECONDS,
+    knowledge_panel_cache,
+    pain_report_cache,
+    product_data_cache,
+    sweep_expired_entries,
+)
 from app.config.http_client import close_http_client
 from app.config.logging import setup_logging
-from app.config.middlewares import (
-    GlobalExceptionMiddleware,
-    add_locale_translator,
-)
+from app.config.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.config.metrics import registry as metrics_registry
+from app.config.middlewares import GlobalExceptionMiddleware, InFlightRequestsMiddleware, LocaleTranslatorMiddleware
+from app.config.product_store import PRODUCT_STORE_REFRESH_SECONDS, product_store, refresh_product_store
 
 # Setup logging
 setup_logging()
@@ -18,9 +29,34 @@ setup_logging()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Compile the knowledge panel templates before serving the first request
+    template_registry.precompile()
+    # Periodically drop expired entries so the caches do not grow with never-read entries
+    sweepers = [
+        asyncio.create_task(sweep_expired_entries(cache, CACHE_SWEEP_INTERVAL_SECONDS))
+        for cache in (knowledge_panel_cache, product_data_cache, pain_report_cache)
+    ]
+    # Map the egg barcode index, to answer the barcodes of other products without upstream request
+    if egg_barcode_index.path is not None:
+        egg_barcode_index.reload_if_changed()
+        sweepers.append(
+            asyncio.create_task(refresh_barcode_index(egg_barcode_index, EGG_BARCODE_INDEX_REFRESH_SECONDS))
+        )
+    # Open the local product store, to serve the products of the OFF snapshot without upstream request
+    if product_store.path is not None:
+        product_store.reload_if_changed()
+        sweepers.append(asyncio.create_task(refresh_product_store(product_store, PRODUCT_STORE_REFRESH_SECONDS)))
     yield
+    for sweeper in sweepers:
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
+    egg_barcode_index.close()
+    product_store.close()
     # close connections
     await close_http_client()
+    # Write the logs still queued for the background writers
+    await logger.complete()
 
 
 # Create FastAPI app
@@ -32,11 +68,14 @@ app = FastAPI(
 
 
 # Add locale translator middleware
-app.middleware("http")(add_locale_translator)
+app.add_middleware(LocaleTranslatorMiddleware)
 
 # Add global exception middleware
 app.add_middleware(GlobalExceptionMiddleware)
 
+# Count the requests being served
+app.add_middleware(InFlightRequestsMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -54,6 +93,13 @@ async def health_check():
     return {"status": "healthy"}
 
 
+# Metrics endpoint for Prometheus
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """Metrics of the application, in the Prometheus text format. Only computed when scraped."""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 # Include API routes
 app.include_router(off_router, prefix="/off/v1", tags=["Open Food Facts"])
 
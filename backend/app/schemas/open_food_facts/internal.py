@@ -106,3 +106,11 @@ class KnowledgePanelResponse(BaseModel):
 class KnowledgePanelBatchResponse(BaseModel):
     panels: Dict[str, KnowledgePanelResponse] = {}
     errors: Dict[str, str] = {}
+
+
+class KnowledgePanelBatchItem(BaseModel):
+    """One line of the NDJSON batch response: the panel of a product, or its error"""
+
+    barcode: str
+    panel: KnowledgePanelResponse | None = None
+    error: str | None = None
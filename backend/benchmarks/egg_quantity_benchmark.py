@@ -0,0 +1,113 @@
+"""
+Measures how many products per second EggQuantityCalculator handles.
+
+Usage (from the backend directory):
+    python -m benchmarks.egg_quantity_benchmark [--products 20000] [--rounds 5]
+
+"cold" rounds empty the normalization and tokenization memos first, as for a freshly started
+process, "warm" rounds reuse them, as for a process which already served the same texts.
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from app.business.open_food_facts.calculators.egg_quantity_calculator import (
+    EggQuantityCalculator,
+    tokenize_egg_quantity_text,
+)
+from app.enums.open_food_facts.patterns import normalization
+from app.schemas.open_food_facts.external import ProductData
+
+# Pieces of real world quantities and egg product names
+TEXT_PIECES = [
+    "6",
+    "12",
+    "10 + 2",
+    "x10",
+    "1 dozen",
+    "12 large",
+    "12 moyens",
+    "Boîte de 6",
+    "500 g",
+    "1.5 lbs",
+    "53 - 63 g",
+    "omega 3",
+    "œufs frais",
+    "Œufs de poules élevées en plein air",
+    "eggs",
+    "gros",
+    "XL",
+    "très gros",
+    "petits",
+    "Label Rouge",
+    "bio",
+    "12 pcs",
+    "24 oeufs",
+    "Free range",
+    "Medium",
+]
+
+
+def generate_products(count: int, seed: int = 0) -> list[ProductData]:
+    rng = random.Random(seed)
+
+    def text() -> str:
+        return " ".join(rng.choice(TEXT_PIECES) for _ in range(rng.randint(1, 4)))
+
+    return [
+        ProductData(
+            product_name=text(),
+            generic_name=text() if rng.random() < 0.3 else None,
+            quantity=text() if rng.random() < 0.8 else None,
+            product_quantity=rng.choice([None, 0.5, 6, 500]),
+            product_quantity_unit=rng.choice([None, "g", "kg", "pcs"]),
+            categories_tags=rng.choice([["en:eggs"], ["en:eggs", "en:large-eggs"]]),
+            ingredients_tags=rng.choice([[], ["en:6-large-eggs"]]),
+        )
+        for _ in range(count)
+    ]
+
+
+def clear_memos() -> None:
+    tokenize_egg_quantity_text.cache_clear()
+    for normalize in (
+        normalization.normalize_unicode,
+        normalization.normalize_words,
+        normalization.normalize_egg_count,
+        normalization.normalize_egg_caliber,
+        normalization.normalize_weight,
+    ):
+        normalize.cache_clear()
+
+
+def measure(products: list[ProductData], cold: bool) -> float:
+    """Returns the number of products per second"""
+    if cold:
+        clear_memos()
+    calculator = EggQuantityCalculator()
+    # Unparsable quantities are printed, which is not what is measured here
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for product in products:
+            calculator.calculate_egg_quantity(product)
+        elapsed = time.perf_counter() - start
+    return len(products) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000, help="Number of generated products")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of measures, the best one is kept")
+    args = parser.parse_args()
+
+    products = generate_products(args.products)
+    for label, cold in (("cold", True), ("warm", False)):
+        best = max(measure(products, cold) for _ in range(args.rounds))
+        print(f"{label}: {best:,.0f} products/s")
+
+
+if __name__ == "__main__":
+    main()
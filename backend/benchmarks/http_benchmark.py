@@ -0,0 +1,104 @@
+"""
+Measures how many requests per second the application handles on its lightest routes,
+through the whole middleware stack but without any network nor HTTP server.
+
+Usage (from the backend directory):
+    python -m benchmarks.http_benchmark [--requests 20000] [--rounds 5]
+
+"health" requests the health check, "cached panel" requests a knowledge panel which is
+already in the cache, with a usual Accept-Language header.
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.api.open_food_facts.routes import cache_knowledge_panel
+from app.business.open_food_facts.calculators.pain_report_calculator import PainReportCalculator
+from app.business.open_food_facts.knowledge_panel_service import get_knowledge_panel_response
+from app.config.i18n import get_i18n
+from app.main import app
+from app.schemas.open_food_facts.external import ProductData
+
+BARCODE = "3000000000001"
+HEADERS = [
+    (b"host", b"localhost"),
+    (b"accept", b"application/json"),
+    (b"accept-language", b"fr-FR,fr;q=0.9,en-US;q=0.8,en;q=0.7"),
+    (b"user-agent", b"benchmark"),
+]
+
+
+def cache_panel() -> None:
+    product_data = ProductData(
+        product_name="Œufs de poules élevées en plein air",
+        categories_tags=["en:eggs", "en:chicken-eggs", "en:free-range-chicken-eggs"],
+        quantity="12 gros",
+    )
+    pain_report = PainReportCalculator(product_data).get_pain_reports()
+    response = get_knowledge_panel_response(
+        pain_report=pain_report, translator=get_i18n().get_translator("fr"), locale="fr"
+    )
+    cache_knowledge_panel(BARCODE, "fr", response)
+
+
+async def request(path: str) -> int:
+    """Send a GET request to the application, and return the response status"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": HEADERS,
+        "client": ("127.0.0.1", 12345),
+        "server": ("localhost", 8000),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(path: str, count: int) -> float:
+    """Returns the number of requests per second"""
+    start = time.perf_counter()
+    for _ in range(count):
+        status = await request(path)
+        if status != 200:
+            raise RuntimeError(f"GET {path} answered {status}")
+    return count / (time.perf_counter() - start)
+
+
+async def run(count: int, rounds: int) -> None:
+    for label, path in (("health", "/health"), ("cached panel", f"/off/v1/knowledge-panel/{BARCODE}")):
+        best = 0.0
+        for _ in range(rounds):
+            best = max(best, await measure(path, count))
+        print(f"{label}: {best:,.0f} requests/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000, help="Number of requests per measure")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of measures, the best one is kept")
+    args = parser.parse_args()
+
+    cache_panel()
+    asyncio.run(run(args.requests, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
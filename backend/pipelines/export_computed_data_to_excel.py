@@ -1,9 +1,9 @@
 import argparse
-import json
 import os
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+import duckdb
 import numpy as np
 import pandas as pd
 from openpyxl import Workbook
@@ -20,18 +20,38 @@ class Config:
     # data folder name
     DATA_PATH = Path("data")
 
-    # csv where processed product data is stored, several options
-    INPUT_CSV_FILE = DATA_PATH / "processed_products.csv"
-    INPUT_CSV_FILE_FR = DATA_PATH / "processed_products_fr.csv"
-    INPUT_CSV_FILE_POTENTIAL = DATA_PATH / "processed_potential_eggs.csv"
+    # Parquet files where processed product data is stored, several options
+    INPUT_FILE = DATA_PATH / "processed_products.parquet"
+    INPUT_FILE_FR = DATA_PATH / "processed_products_fr.parquet"
+    INPUT_FILE_POTENTIAL = DATA_PATH / "processed_potential_eggs.parquet"
+
+    # Columns of the processed data written to the excel files, the OCR ones are missing from potential eggs
+    INPUT_COLUMNS = [
+        "code",
+        "product_name",
+        "generic_name",
+        "ingredients_tags",
+        "labels_tags",
+        "categories_tags",
+        "images",
+        "breeding",
+        "egg_count",
+        "caliber",
+        "ocr_text",
+        "breeding_type_related",
+        "weight_related",
+        "proba_1",
+        "proba_2",
+        "proba_3",
+    ]
 
     # excel output is formatted products_{dataset}_{subset}.xlsx
     OUTPUT_FILE_PREFIX = "products"
 
     DATASET_MAP = {
-        "france": INPUT_CSV_FILE_FR,
-        "potential": INPUT_CSV_FILE_POTENTIAL,
-        "world": INPUT_CSV_FILE,
+        "france": INPUT_FILE_FR,
+        "potential": INPUT_FILE_POTENTIAL,
+        "world": INPUT_FILE,
     }
 
     DEFAULT_SHEET_NAME = "Feuille1"
@@ -107,22 +127,13 @@ class Config:
 # =============================================================================
 
 
-def safe_json_load(raw: Any) -> Any:
-    """Load json formatted fields from dataframe for multilingual purpose"""
-    if isinstance(raw, str):
-        try:
-            cleaned = raw.replace("'", '"').replace("None", "null")
-            return json.loads(cleaned)
-        except json.JSONDecodeError:
-            return raw
-    return raw
-
-
-def load_product_data(file_path: str) -> pd.DataFrame:
-    """Load csv file from path and return dataframe"""
+def load_product_data(file_path: Path) -> pd.DataFrame:
+    """Load the columns written to the excel files from a Parquet file, nested columns as lists and dicts"""
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Data file not found: {file_path}")
-    df = pd.read_csv(file_path)
+    relation = duckdb.read_parquet(str(file_path))
+    relation = relation.select(*[column for column in Config.INPUT_COLUMNS if column in relation.columns])
+    df = pd.DataFrame(relation.fetchall(), columns=relation.columns)
     if df.empty:
         raise pd.errors.EmptyDataError(f"File is empty: {file_path}")
     print(f"Loaded {len(df)} products from {file_path}")
@@ -138,6 +149,8 @@ def get_value(df: pd.DataFrame, code: str, column: str) -> Optional[str]:
         value = df.loc[mask, column].iloc[0]
     except (KeyError, IndexError):
         return None
+    if isinstance(value, list):
+        return "\n".join(str(item) for item in value if item is not None)
     return str(value) if pd.notna(value) else None
 
 
@@ -168,15 +181,14 @@ def parse_multilingual(field: Any) -> str:
     Parse multilingual fields from OpenFoodFacts format to a single string and gets all languages
     Excludes main to avoid redundancy.
     """
-    data = safe_json_load(field)
-    if isinstance(data, list):
-        return "\n".join(d.get("text", "") for d in data if isinstance(d, dict) and d.get("lang") != "main")
-    return str(data) if data else ""
+    if isinstance(field, list):
+        return "\n".join(d.get("text") or "" for d in field if isinstance(d, dict) and d.get("lang") != "main")
+    return str(field) if field else ""
 
 
 def build_image_urls(code: str, images_raw: Any) -> List[str]:
     """Build image_urls from product code and follow OpenFoodFacts path scheme"""
-    images = safe_json_load(images_raw) or []
+    images = images_raw or []
     code_str = str(code).zfill(13)
     path = f"{code_str[:3]}/{code_str[3:6]}/{code_str[6:9]}/{code_str[9:]}"
     keys = sorted(
@@ -210,8 +222,7 @@ def build_product_row(product: Dict, code: str, df: pd.DataFrame) -> Dict[str, A
 
     ingredients = product.get("ingredients_tags", [])
     labels = product.get("labels_tags", [])
-    categories_raw = safe_json_load(product.get("categories_tags", ""))
-    categories = [c for c in (categories_raw or []) if c]
+    categories = [c for c in (product.get("categories_tags") or []) if c]
     breeding = get_value(df, code, "breeding") or ""
     quantity = get_value(df, code, "egg_count") or ""
     caliber = get_value(df, code, "caliber") or ""
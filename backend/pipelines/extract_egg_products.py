@@ -1,17 +1,18 @@
 import argparse
 import datetime
+import hashlib
 import json
 import re
 import sys
 import time
-import unicodedata
 from pathlib import Path
 
 import duckdb
 import numpy as np
-import pandas as pd
 import requests
 
+from app.config.barcode_index import write_barcode_index
+from app.config.product_store import write_product_store
 from app.enums.open_food_facts.patterns.product_type_patterns import ProductTypePatternRepository
 
 
@@ -24,9 +25,35 @@ class Config:
 
     DATA_PATH = Path("data")
     LOCAL_PARQUET = DATA_PATH / "food.parquet"
-    CSV_PATH = DATA_PATH / "eggs_from_parquet.csv"
-    POTENTIAL_CSV_PATH = DATA_PATH / "potential_eggs_from_parquet.csv"
-    COLS_TO_JSON_PATH = DATA_PATH / "cols_to_json.txt"
+    EGGS_PARQUET_PATH = DATA_PATH / "eggs_from_parquet.parquet"
+    POTENTIAL_PARQUET_PATH = DATA_PATH / "potential_eggs_from_parquet.parquet"
+    # Egg barcode index memory-mapped by the API (see EGG_BARCODE_INDEX_PATH)
+    BARCODE_INDEX_PATH = DATA_PATH / "egg_barcodes.idx"
+    # Share of the barcodes missing from the dump that the API wrongly answers as not eggs
+    BARCODE_INDEX_FALSE_POSITIVE_RATE = 0.001
+    # Local store of the egg products served by the API (see PRODUCT_STORE_PATH)
+    PRODUCT_STORE_PATH = DATA_PATH / "products.sqlite"
+    IMAGE_BASE_URL = "https://images.openfoodfacts.org/images/products/"
+
+    # Fields of the OFF API v3 products read by the API, and available as is in the Parquet file
+    PRODUCT_STORE_COLUMNS = [
+        "categories_tags",
+        "labels_tags",
+        "quantity",
+        "product_quantity_unit",
+        "product_quantity",
+        "allergens_tags",
+        "ingredients_tags",
+        "ingredients",
+        "countries_tags",
+    ]
+
+    # Downloads are streamed in large chunks and written through a large buffer
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+    DOWNLOAD_BUFFER_SIZE = 16 * 1024 * 1024
+    DOWNLOAD_MAX_RETRIES = 5
+    # Connection and read timeouts, in seconds
+    DOWNLOAD_TIMEOUT = (10, 60)
 
     EXPORT_TIME_BASIC = "~1 min 30 sec"
     EXPORT_TIME_POTENTIAL = "~10 min"
@@ -192,186 +219,384 @@ class PatternRepository:
         "tortilla",
     }
 
-    EXCLUDED_PATTERNS = re.compile(
-        r"\b(" + r"|".join([term.replace(" ", r"\s+") for term in EXCLUDED_WORDS]) + r")\b", re.VERBOSE
+    # RE2 pattern (DuckDB) matching the excluded words in a normalized product name.
+    # RE2 \s and \b are ASCII only: the unicode separators kept by the normalization (e.g. non-breaking spaces)
+    # must separate words as Python \s does, and the letters left by strip_accents (e.g. ß, Cyrillic, Greek)
+    # must not be word boundaries, as with Python \b
+    EXCLUDED_PATTERN_SQL = (
+        r"(^|[^\p{L}\p{N}_])("
+        + r"|".join([term.replace(" ", r"[\s\p{Z}]+") for term in EXCLUDED_WORDS])
+        + r")([^\p{L}\p{N}_]|$)"
     )
 
+    # RE2 pattern (DuckDB) of PUNCTUATION_OR_DIGITS_REGEX, with the unicode classes of Python \w, \s and \d
+    PUNCTUATION_OR_DIGITS_SQL = r"[^\p{L}\p{N}_\s\p{Z}]|\p{Nd}+"
 
-def normalize_string(s):
+
+def metadata_path(path: Path) -> Path:
+    """Path of the sidecar JSON file holding the HTTP validators and checksum of a downloaded file"""
+    return path.with_name(path.name + ".meta.json")
+
+
+def read_metadata(path: Path) -> dict:
+    """Read the metadata of a downloaded (or partially downloaded) file, empty if unknown"""
+    try:
+        return json.loads(metadata_path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def write_metadata(path: Path, metadata: dict) -> None:
+    """Write the metadata of a downloaded file atomically, so that an interruption never leaves it corrupted"""
+    tmp_path = metadata_path(path).with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(metadata))
+    tmp_path.replace(metadata_path(path))
+
+
+def expected_sha256(response: requests.Response) -> str | None:
     """
-    Function that normalizes a string
-    :param s: string to normalize
-    :return: normalized string
+    Return the SHA-256 of the file announced by the server, if any.
+    Hugging Face announces it in the X-Linked-Etag header of the redirection to its CDN.
     """
-    if s is None:
-        return ""
-    s = str(s)
-    # removes accents
-    s = s.join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
-    # Unicode normalization
-    s = unicodedata.normalize("NFKD", s)
-    # replace any punctuation with a space
-    s = re.sub(r"[^\w\s]", " ", s)
-    # replace digits with a space
-    s = re.sub(r"\d+", " ", s)
-    # convert uppercase letters to lowercase
-    s = s.lower()
-    # replace œ with oe
-    s = re.sub(r"œ", "oe", s)
-    return s
+    for r in (*response.history, response):
+        linked_etag = r.headers.get("X-Linked-Etag", "").strip('"')
+        if re.fullmatch(r"[0-9a-f]{64}", linked_etag):
+            return linked_etag
+    return None
 
 
-def download_parquet():
-    """
-    Download the Parquet file from the remote source URL to the local path.
+def file_sha256(path: Path) -> str:
+    """Compute the SHA-256 of a file, reading it in large blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(Config.DOWNLOAD_BUFFER_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
 
-    The file is streamed in chunks with a progress bar displayed in the console.
-    If the parent directories do not exist, they are created.
 
-    Effects:
-        Creates a 4 GO local Parquet file in the data directory.
+def print_progress(downloaded: int, total_size: int) -> None:
+    done = int(50 * downloaded / total_size) if total_size else 0
+    percent = (downloaded / total_size * 100) if total_size else 0
+    bar = "=" * done + " " * (50 - done)
+    print(f"\rDownloading: [{bar}] {percent:.2f}%", end="")
+
+
+def stream_to_part_file(url: str, part_path: Path, headers: dict) -> requests.Response | None:
     """
-    Config.LOCAL_PARQUET.parent.mkdir(parents=True, exist_ok=True)
-    with requests.get(Config.SOURCE_PARQUET, stream=True) as r:
+    Send one GET request and append its body to the partial file, resuming it when the server honors the Range.
+    The validators of the response are saved along the partial file first, to resume it after an interruption.
+
+    Returns:
+        The response, or None if the server answered 304 Not Modified.
+    """
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    part_metadata = read_metadata(part_path)
+    # A partial file can only be resumed if it is known to be a prefix of the current version (strong ETag)
+    etag = part_metadata.get("etag") or ""
+    if offset and etag and not etag.startswith("W/"):
+        headers = {**headers, "Range": f"bytes={offset}-", "If-Range": etag}
+    else:
+        offset = 0
+
+    with requests.get(url, headers=headers, stream=True, timeout=Config.DOWNLOAD_TIMEOUT) as r:
+        if r.status_code == 304:
+            return None
+        if r.status_code == 416:
+            # The partial file is not a prefix of the remote file anymore: start again
+            part_path.unlink()
+            metadata_path(part_path).unlink(missing_ok=True)
+            return stream_to_part_file(url, part_path, {k: v for k, v in headers.items() if k != "Range"})
         r.raise_for_status()
-        total_size = int(r.headers.get("Content-Length", 0))
-        chunk_size = 8192
-        downloaded = 0
-        with open(Config.LOCAL_PARQUET, "wb") as f:
-            for chunk in r.iter_content(chunk_size=chunk_size):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    done = int(50 * downloaded / total_size) if total_size else 0
-                    percent = (downloaded / total_size * 100) if total_size else 0
-                    bar = "=" * done + " " * (50 - done)
-                    print(f"\rDownloading: [{bar}] {percent:.2f}%", end="")
-    print(f"\nFile downloaded: {Config.LOCAL_PARQUET}")
-
-
-def detect_columns_to_convert(df):
-    """
-    Identify columns in the DataFrame that contain complex data types
-    such as lists, dictionaries, or numpy arrays which require JSON serialization.
+        if r.status_code != 206:
+            # The server ignored the Range, or the file changed since the partial download
+            offset = 0
+
+        total_size = offset + int(r.headers.get("Content-Length", 0))
+        write_metadata(
+            part_path,
+            {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "size": total_size if r.headers.get("Content-Length") else None,
+                "sha256": expected_sha256(r),
+            },
+        )
+
+        downloaded = offset
+        with open(part_path, "ab" if offset else "wb", buffering=Config.DOWNLOAD_BUFFER_SIZE) as f:
+            for chunk in r.iter_content(chunk_size=Config.DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                downloaded += len(chunk)
+                print_progress(downloaded, total_size)
+        print()
+        return r
+
+
+def download_file(url: str, path: Path, max_retries: int | None = None) -> bool:
+    """
+    Download a file, unless the local copy is the current version, resuming where a previous attempt stopped.
+
+    - The ETag of the local copy is sent in If-None-Match: an unchanged file costs a 304 response.
+    - The file is downloaded to a '.part' file, whose ETag is kept in a sidecar file: after a dropped connection,
+      or a new run of the script, only the missing bytes are requested (Range + If-Range).
+    - The size, and the SHA-256 when the server announces it, are checked before the '.part' file is renamed
+      to its final path: the local copy is either the previous version or a complete new one.
 
     Args:
-        df (pandas.DataFrame): The DataFrame to analyze.
-
+        url: URL of the file
+        path: Local path of the file
+        max_retries: Number of resumptions after network errors (Config.DOWNLOAD_MAX_RETRIES by default)
     Returns:
-        list: List of column names containing complex objects.
+        bool: True if a new version was downloaded, False if the local copy was up-to-date.
+    Raises:
+        ValueError: If the downloaded file does not match the announced size or checksum.
+    """
+    max_retries = Config.DOWNLOAD_MAX_RETRIES if max_retries is None else max_retries
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = path.with_name(path.name + ".part")
+
+    headers = {}
+    if path.exists() and (etag := read_metadata(path).get("etag")):
+        headers["If-None-Match"] = etag
+
+    for attempt in range(max_retries + 1):
+        try:
+            response = stream_to_part_file(url, part_path, headers)
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == max_retries:
+                raise
+            delay = min(2**attempt, 60)
+            print(f"\nDownload interrupted ({type(e).__name__}), resuming in {delay} s...")
+            time.sleep(delay)
+
+    if response is None:
+        return False
+
+    metadata = read_metadata(part_path)
+    size = part_path.stat().st_size
+    sha256 = file_sha256(part_path)
+    if (metadata.get("size") is not None and size != metadata["size"]) or (
+        metadata.get("sha256") and sha256 != metadata["sha256"]
+    ):
+        part_path.unlink()
+        metadata_path(part_path).unlink(missing_ok=True)
+        raise ValueError(f"Downloaded file is corrupted ({size} bytes, sha256 {sha256}), it was deleted")
+
+    part_path.replace(path)
+    write_metadata(path, {**metadata, "size": size, "sha256": sha256})
+    metadata_path(part_path).unlink(missing_ok=True)
+    return True
+
+
+def is_remote_file_unchanged(url: str, path: Path) -> bool | None:
+    """
+    Compare the ETag of the remote file with the one of the local copy, with a HEAD request.
+    Returns:
+        bool | None: Whether the local copy is the current version, None if it cannot be told.
     """
-    cols_to_convert = []
-    for col in df.columns:
-        sample = df[col].dropna().head(20)
-        if sample.apply(lambda x: isinstance(x, (list, dict, np.ndarray))).any():
-            cols_to_convert.append(col)
-    return cols_to_convert
+    etag = read_metadata(path).get("etag")
+    if not path.exists() or not etag:
+        return None
+    try:
+        r = requests.head(url, allow_redirects=True, timeout=Config.DOWNLOAD_TIMEOUT)
+        r.raise_for_status()
+    except requests.RequestException:
+        return None
+    return r.headers.get("ETag") == etag
 
 
-def ndarray_to_json(arr):
+def download_parquet():
     """
-    Serialize complex objects (lists, dicts, numpy arrays) returned by duckdb to JSON strings.
-    This ensures that columns containing non-scalar values can be safely exported to CSV.
-
-    Args:
-        arr: A single element potentially of type list, dict, numpy.ndarray, or scalar.
+    Download the Parquet file from the remote source URL to the local path (see download_file).
 
-    Returns:
-        str or original: JSON string if input is list, dict or numpy.ndarray, else the original value.
+    Effects:
+        Creates or updates a 4 GO local Parquet file in the data directory, and its metadata file.
     """
-    if isinstance(arr, (list, dict)):
-        return json.dumps(arr)
-    elif isinstance(arr, np.ndarray):
-        return json.dumps(arr.tolist())
+    if download_file(Config.SOURCE_PARQUET, Config.LOCAL_PARQUET):
+        print(f"File downloaded: {Config.LOCAL_PARQUET}")
     else:
-        return arr
+        print(f"Local Parquet file is up-to-date: {Config.LOCAL_PARQUET}")
 
 
-def create_filtered_df() -> pd.DataFrame:
+def export_eggs(output_path: Path) -> None:
     """
-    Perform a DuckDB SQL query to load and filter the Parquet dataset.
+    Perform a DuckDB SQL query to load, filter and export the Parquet dataset, without loading it in memory.
     Filters products to those containing 'en:eggs' in their categories,
-    Only columns listed in SELECTED_COLUMNS are selected (usefull for further data analysis)
+    Only columns listed in SELECTED_COLUMNS are selected (usefull for further data analysis),
+    with their nested types (lists of tags, multilingual names, images, ingredients).
 
-    Returns:
-        pandas.DataFrame: Filtered DataFrame with hen egg products.
+    Args:
+        output_path (Path): Path of the Parquet file to write.
+
+    Effects:
+        Creates or overwrites the '../data/eggs_from_parquet.parquet' Parquet file.
     """
-    query = f"""
-    SELECT {",".join(Config.SELECTED_COLUMNS)}
-    FROM '{Config.LOCAL_PARQUET}'
-    WHERE array_contains(categories_tags, '{Config.EGG_CATEGORY}')
+    sql = f"""COPY (
+        SELECT {",".join(Config.SELECTED_COLUMNS)}
+        FROM parquet_scan('{Config.LOCAL_PARQUET}')
+        WHERE array_contains(categories_tags, '{Config.EGG_CATEGORY}')
+    ) TO '{output_path}' (FORMAT parquet, COMPRESSION zstd)
     """
-    print("Starting combined DuckDB query to select and filter data...")
+
+    Config.DATA_PATH.mkdir(parents=True, exist_ok=True)
     start_time = time.time()
-    df = duckdb.execute(query).df()
-    print(f"Query executed in {time.time() - start_time:.2f} seconds, rows fetched: {len(df)}")
-    return df
+    print(f"Starting DuckDB query to select, filter and export data at {time.strftime('%H:%M:%S')}...")
+    rows = duckdb.execute(sql).fetchone()[0]
+    print(f"Query executed in {time.time() - start_time:.2f} seconds, rows exported: {rows}")
+    print(f"Export completed: {output_path}")
 
 
-def create_df_of_potential_eggs() -> pd.DataFrame:
+def normalize_words_sql(column: str) -> str:
     """
-    Perform a DuckDB SQL query to load and filter the Parquet dataset.
-    Filters products to those NOT containing 'en:eggs' in their categories,
-    but that could be eggs : 'egg' pattern in their name and no exxcluded categories
-    Only columns listed in SELECTED_COLUMNS are selected (usefull for further data analysis)
+    SQL expression normalizing a column of strings as normalize_words does for a single string:
+    converts to lowercase, replaces œ with oe, removes accents and replaces punctuation and digits with a space
+    """
+    punctuation_or_digits = PatternRepository.PUNCTUATION_OR_DIGITS_SQL
+    return f"regexp_replace(strip_accents(replace(lower({column}), 'œ', 'oe')), '{punctuation_or_digits}', ' ', 'g')"
 
-    Returns:
-        pandas.DataFrame: Filtered DataFrame with hen egg products.
+
+def export_potential_eggs(output_path: Path) -> None:
     """
+    Perform a DuckDB SQL query to load, filter and export the Parquet dataset, without loading it in memory.
+    Filters products to those NOT containing 'en:eggs' in their categories,
+    but that could be eggs : 'egg' pattern in their name and no excluded words in their normalized name.
+    Only columns listed in SELECTED_COLUMNS are selected (usefull for further data analysis),
+    with the main product name in the lang and text columns.
+
+    Args:
+        output_path (Path): Path of the Parquet file to write.
 
-    # exécuter la requête DuckDB
+    Effects:
+        Creates or overwrites the '../data/potential_eggs_from_parquet.parquet' Parquet file.
+    """
     con = duckdb.connect()
+    # Let DuckDB stream the rows to the Parquet file in any order, with a memory use bounded by the row groups
+    con.execute("SET preserve_insertion_order = false")
 
-    sql = f"""SELECT {",".join("f." + col for col in Config.SELECTED_COLUMNS)}, u.unnest.lang, u.unnest.text
-    FROM parquet_scan('{Config.LOCAL_PARQUET}') AS f
-    LEFT JOIN UNNEST(f.product_name) AS u ON TRUE
-    WHERE (f.categories_tags IS NULL OR NOT array_contains(categories_tags, '{Config.EGG_CATEGORY}'))
-    AND u.unnest.lang = 'main'
-    AND REGEXP_MATCHES(u.unnest.text, '{PatternRepository.EGG_PATTERN_SQL}', 'i');
+    sql = f"""COPY (
+        SELECT {",".join("f." + col for col in Config.SELECTED_COLUMNS)}, u.unnest.lang, u.unnest.text
+        FROM parquet_scan('{Config.LOCAL_PARQUET}') AS f
+        LEFT JOIN UNNEST(f.product_name) AS u ON TRUE
+        WHERE (f.categories_tags IS NULL OR NOT array_contains(categories_tags, '{Config.EGG_CATEGORY}'))
+        AND u.unnest.lang = 'main'
+        AND REGEXP_MATCHES(u.unnest.text, '{PatternRepository.EGG_PATTERN_SQL}', 'i')
+        AND NOT REGEXP_MATCHES({normalize_words_sql("u.unnest.text")}, '{PatternRepository.EXCLUDED_PATTERN_SQL}')
+    ) TO '{output_path}' (FORMAT parquet, COMPRESSION zstd)
     """
 
+    Config.DATA_PATH.mkdir(parents=True, exist_ok=True)
     start_time = time.time()
-    print(f"Starting combined DuckDB query to select and filter data at {time.strftime('%H:%M:%S')}...")
-    df = con.execute(sql).fetchdf()
-    print(f"Query executed in {time.time() - start_time:.2f} seconds, rows fetched: {len(df)}")
-    print(f"Number of columns returned by duckdb: {len(df.columns)}")
+    print(f"Starting DuckDB query to select, filter and export data at {time.strftime('%H:%M:%S')}...")
+    rows = con.execute(sql).fetchone()[0]
+    print(f"Query executed in {time.time() - start_time:.2f} seconds, rows exported: {rows}")
+    print(f"Export completed: {output_path}")
 
-    df = df[
-        ~df["text"].apply(lambda x: normalize_string(x)).str.contains(PatternRepository.EXCLUDED_PATTERNS, na=False)
-    ]
-    print(f"Number of rows after removing excluded patterns: {len(df)}")
 
-    return df
+def may_be_egg_sql() -> str:
+    """
+    SQL condition on a Parquet row which is true for the products of the 'en:eggs' category, and for the products
+    whose main name looks like an egg product (without the excluded patterns filter, to never miss an egg).
+    """
+    return f"""COALESCE(
+        array_contains(categories_tags, '{Config.EGG_CATEGORY}')
+        OR len(list_filter(product_name, n -> n.lang = 'main'
+            AND REGEXP_MATCHES(n.text, '{PatternRepository.EGG_PATTERN_SQL}', 'i'))) > 0, FALSE)"""
 
 
-def export_df_as_csv(df, output_path: Path):
+def create_barcode_index() -> None:
     """
-    Convert complex columns to JSON strings and export the DataFrame to CSV.
-    Saves the list of JSON-converted columns in a text file for reference and new python imports
-
-    Args:
-        df (pandas.DataFrame): The DataFrame to export.
+    Build the egg barcode index used by the API to answer the barcodes of other products without upstream request:
+    the exact list of the egg barcodes, and a Bloom filter over the barcodes of every other product.
+    Products whose main name looks like an egg product are kept with the eggs, even when they are not
+    categorized as 'en:eggs' yet.
 
     Effects:
-        Creates or overwrites '../data/eggs_from_parquet.csv' CSV file.
-        Creates or overwrites '../data/cols_to_json.txt' JSON metadata file.
+        Creates or overwrites '../data/egg_barcodes.idx' index file.
+    """
+    sql = f"""SELECT code, {may_be_egg_sql()} AS may_be_egg
+    FROM parquet_scan('{Config.LOCAL_PARQUET}')
+    WHERE code IS NOT NULL
     """
-    cols_to_convert = detect_columns_to_convert(df) + ["ingredients"]
-    # TODO : search why ingredients is not detected
-
-    cols_to_convert = list(set(cols_to_convert))
-    print(f"Columns to convert to JSON: {cols_to_convert}")
 
-    for col in cols_to_convert:
-        df[col] = df[col].apply(ndarray_to_json)
+    start_time = time.time()
+    print(f"Starting DuckDB query to classify barcodes at {time.strftime('%H:%M:%S')}...")
+    codes = duckdb.execute(sql).fetchnumpy()
+    may_be_egg = np.asarray(codes["may_be_egg"], dtype=bool)
+    egg_barcodes, other_barcodes = codes["code"][may_be_egg], codes["code"][~may_be_egg]
+    print(f"Query executed in {time.time() - start_time:.2f} seconds, {len(egg_barcodes)} egg barcodes")
 
     Config.DATA_PATH.mkdir(parents=True, exist_ok=True)
+    write_barcode_index(
+        Config.BARCODE_INDEX_PATH,
+        egg_barcodes=egg_barcodes,
+        other_barcodes=other_barcodes,
+        false_positive_rate=Config.BARCODE_INDEX_FALSE_POSITIVE_RATE,
+    )
+    print(f"Barcode index written in {time.time() - start_time:.2f} seconds: {Config.BARCODE_INDEX_PATH}")
 
-    with open(Config.COLS_TO_JSON_PATH, "w") as f:
-        json.dump(cols_to_convert, f)
 
-    df.to_csv(output_path, index=False)
-    print(f"Export completed: {output_path}")
+def front_image_url(code: str, images: list | None) -> str | None:
+    """
+    Build the URL of the front image of a product, from the images of the Parquet file,
+    following the OpenFoodFacts path scheme. The selected front image of the main language is preferred.
+    """
+    code_str = str(code).zfill(13)
+    path = f"{code_str[:3]}/{code_str[3:6]}/{code_str[6:9]}/{code_str[9:]}" if len(code_str) == 13 else code_str
+    images = [image for image in images or [] if isinstance(image, dict) and image.get("key")]
+
+    fronts = [image for image in images if str(image["key"]).startswith("front_") and image.get("rev")]
+    if fronts:
+        front = min(fronts, key=lambda image: image["key"])
+        return f"{Config.IMAGE_BASE_URL}{path}/{front['key']}.{front['rev']}.400.jpg"
+
+    uploaded = sorted((str(image["key"]) for image in images if str(image["key"]).isdigit()), key=int)
+    return f"{Config.IMAGE_BASE_URL}{path}/{uploaded[0]}.400.jpg" if uploaded else None
+
+
+def product_payload(row: dict) -> dict:
+    """
+    Convert a Parquet row to the OFF API v3 product the API would fetch: the multilingual names
+    become product_name (main language) and product_name_<lang> fields.
+    """
+    product = {column: row[column] for column in Config.PRODUCT_STORE_COLUMNS if row.get(column) is not None}
+    for field in ("product_name", "generic_name"):
+        for name in row.get(field) or []:
+            if name.get("text"):
+                product[field if name.get("lang") == "main" else f"{field}_{name['lang']}"] = name["text"]
+    if image_url := front_image_url(row["code"], row.get("images")):
+        product["image_url"] = image_url
+    return product
+
+
+def create_product_store() -> None:
+    """
+    Build the local product store of the API: the OFF API v3 products of the egg products and the candidate egg
+    products (see may_be_egg_sql), so that their knowledge panels can be rendered without OFF.
+
+    Effects:
+        Creates or overwrites '../data/products.sqlite' SQLite file.
+    """
+    columns = ["code", "product_name", "generic_name", "images", *Config.PRODUCT_STORE_COLUMNS]
+    sql = f"""SELECT {",".join(columns)}
+    FROM parquet_scan('{Config.LOCAL_PARQUET}')
+    WHERE code IS NOT NULL AND {may_be_egg_sql()}
+    """
+
+    start_time = time.time()
+    print(f"Starting DuckDB query to select the products to store at {time.strftime('%H:%M:%S')}...")
+    cursor = duckdb.execute(sql)
+
+    def iter_products():
+        while rows := cursor.fetchmany(10_000):
+            for values in rows:
+                row = dict(zip(columns, values, strict=True))
+                yield row["code"], product_payload(row)
+
+    Config.DATA_PATH.mkdir(parents=True, exist_ok=True)
+    # The snapshot is as recent as the downloaded Parquet file
+    write_product_store(Config.PRODUCT_STORE_PATH, iter_products(), created_at=Config.LOCAL_PARQUET.stat().st_mtime)
+    print(f"Product store written in {time.time() - start_time:.2f} seconds: {Config.PRODUCT_STORE_PATH}")
 
 
 def remove_parquet_file():
@@ -380,6 +605,7 @@ def remove_parquet_file():
     """
     if Config.LOCAL_PARQUET.exists():
         Config.LOCAL_PARQUET.unlink()
+        metadata_path(Config.LOCAL_PARQUET).unlink(missing_ok=True)
         print(f"File deleted: {Config.LOCAL_PARQUET}")
     else:
         print("No Parquet file to delete.")
@@ -402,13 +628,17 @@ def parse_args() -> argparse.Namespace:
     Parse command-line arguments.
     Returns:
         argparse.Namespace: Parsed arguments including flags for downloading parquet file,
-        removing it, perofrming the CSV extraction, and selecting the potential eggs export mode.
+        removing it, perofrming the extraction, selecting the potential eggs export mode
+        and building the egg barcode index and product store.
     """
     parser = argparse.ArgumentParser(description="Extract and filter egg products from the OpenFoodFacts database.")
     parser.add_argument("--download", action="store_true")
     parser.add_argument("--remove", action="store_true")
-    parser.add_argument("--csv-export", action="store_true")
+    # --csv-export is kept for the scripts written when the extraction was a CSV file
+    parser.add_argument("--export", "--csv-export", dest="export", action="store_true")
     parser.add_argument("--potential", action="store_true")
+    parser.add_argument("--barcode-index", action="store_true")
+    parser.add_argument("--product-store", action="store_true")
     return parser.parse_args()
 
 
@@ -416,9 +646,10 @@ def ensure_parquet_exists(force_download: bool) -> None:
     """
     Ensure that the local Parquet file exists and is up-to-date.
     Args:
-        force_download (bool): If True, always download the Parquet file without asking.
+        force_download (bool): If True, download the Parquet file without asking (nothing is downloaded
+            when the local file is up-to-date).
     Behavior:
-        - Downloads the Parquet file if missing or outdated.
+        - Downloads the Parquet file if missing or outdated, comparing its ETag with the remote one.
         - Asks the user before downloading unless forced.
         - Exits the program if the user refuses and the file is missing.
     """
@@ -436,11 +667,13 @@ def ensure_parquet_exists(force_download: bool) -> None:
             sys.exit("Parquet file required. Exiting.")
         return
 
-    # TODO : find a way to check the date of creation of the parquet file
     mod_time = file_modification_time(parquet_path)
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    unchanged = is_remote_file_unchanged(Config.SOURCE_PARQUET, parquet_path)
+    if unchanged is None:
+        # The version of the local file is unknown (e.g. no metadata file): guess from its modification time
+        unchanged = mod_time.startswith(datetime.datetime.now().strftime("%Y-%m-%d"))
 
-    if mod_time.startswith(today):
+    if unchanged:
         print(f"Local Parquet file is up-to-date (last modified: {mod_time}).")
         return
 
@@ -455,7 +688,7 @@ def ensure_parquet_exists(force_download: bool) -> None:
 
 def ask_export_decision(default: bool, export_time: str) -> bool:
     """
-    Decide whether a CSV extraction should be performed.
+    Decide whether a Parquet extraction should be performed.
     Args:
         default (bool): If True, export without asking.
         export_time (str): Estimated export duration text.
@@ -464,28 +697,26 @@ def ask_export_decision(default: bool, export_time: str) -> bool:
     """
     if default:
         return True
-    answer = input(f"Create a new filtered CSV export from the Parquet file? ({export_time}) (y/n): ").strip().lower()
+    answer = input(f"Create a new filtered export from the Parquet file? ({export_time}) (y/n): ").strip().lower()
     return answer == "y"
 
 
 def perform_extraction(potential: bool, export_time: str) -> None:
     """
-    Process and export the appropriate CSV file.
+    Process and export the appropriate file.
     Args:
         potential (bool): If True, export potential egg products instead of filtered ones.
         export_time (str): Estimated export duration text.
     Behavior:
-        - Generates the corresponding DataFrame.
-        - Writes the DataFrame to its configured CSV path.
+        - Potential egg products are exported by DuckDB to their configured Parquet path.
+        - Filtered egg products are exported by DuckDB to their configured Parquet path.
     """
-    print(f"Exporting csv ({export_time}) starting at {time.strftime('%H:%M:%S')}...")
+    print(f"Exporting Parquet ({export_time}) starting at {time.strftime('%H:%M:%S')}...")
 
     if potential:
-        df = create_df_of_potential_eggs()
-        export_df_as_csv(df, Config.POTENTIAL_CSV_PATH)
+        export_potential_eggs(Config.POTENTIAL_PARQUET_PATH)
     else:
-        df = create_filtered_df()
-        export_df_as_csv(df, Config.CSV_PATH)
+        export_eggs(Config.EGGS_PARQUET_PATH)
 
 
 def handle_parquet_removal(force_remove: bool) -> None:
@@ -513,7 +744,8 @@ def main():
     Main entry point.
     Coordinates the process:
         - Ensure the Parquet file exists or download it.
-        - Decide whether to export the CSV (filtered or potential eggs).
+        - Decide whether to export the egg products (filtered or potential eggs).
+        - Optionally build the egg barcode index and the product store of the API.
         - Optionally remove the local Parquet file.
     """
     args = parse_args()
@@ -522,10 +754,16 @@ def main():
 
     ensure_parquet_exists(args.download)
 
-    if ask_export_decision(args.csv_export, export_time):
+    if ask_export_decision(args.export, export_time):
         perform_extraction(args.potential, export_time)
     else:
-        print("Skipping CSV export.")
+        print("Skipping export.")
+
+    if args.barcode_index:
+        create_barcode_index()
+
+    if args.product_store:
+        create_product_store()
 
     handle_parquet_removal(args.remove)
 
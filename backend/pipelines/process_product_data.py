@@ -3,11 +3,14 @@ import json
 from pathlib import Path
 from typing import Tuple
 
+import duckdb
 import pandas as pd
 import plotly.express as px
 
 from app.business.open_food_facts.calculators import pain_report_calculator
+from app.business.open_food_facts.calculators.unit_pain_loader import PAIN_TABLE
 from app.config.exceptions import EggButNotFreshEgg, ResourceNotFoundException
+from app.enums.open_food_facts.enums import EggCaliber, LayingHenBreedingType
 from app.schemas.open_food_facts.external import ProductData
 from app.schemas.open_food_facts.internal import AnimalType
 
@@ -22,14 +25,13 @@ class Paths:
     ANALYSIS = ROOT / "analysis"
     DATA = Path("data")
 
-    EGGS_CSV = DATA / "eggs_from_parquet.csv"
-    POTENTIAL_EGGS_CSV = DATA / "potential_eggs_from_parquet.csv"
+    EGGS_PARQUET = DATA / "eggs_from_parquet.parquet"
+    POTENTIAL_EGGS_PARQUET = DATA / "potential_eggs_from_parquet.parquet"
 
-    PROCESSED_EGGS = DATA / "processed_products.csv"
-    PROCESSED_EGGS_FR = DATA / "processed_products_fr.csv"
-    PROCESSED_POTENTIAL_EGGS = DATA / "processed_potential_eggs.csv"
+    PROCESSED_EGGS = DATA / "processed_products.parquet"
+    PROCESSED_EGGS_FR = DATA / "processed_products_fr.parquet"
+    PROCESSED_POTENTIAL_EGGS = DATA / "processed_potential_eggs.parquet"
 
-    COLS_TO_JSON = DATA / "cols_to_json.txt"
     OCR_JSONL_FILE = (
         ANALYSIS / "neural_category_predictions/data/dfoeufs_with_predictions_with_ground_truth_with_groq_spans.jsonl"
     )
@@ -44,6 +46,8 @@ class Config:
     SUNBURST_HEIGHT = 500
     SUNBURST_MARGIN = dict(t=40, l=10, r=10, b=10)
     SUNBURST_TEXT_SIZE = 12
+    # Columns of the processed data read to display the charts
+    CHART_COLUMNS = ["breeding", "caliber", "french", "french_string", "egg_count_string"]
 
 
 class EggConsts:
@@ -70,26 +74,41 @@ class OcrKeys:
 # ----------------------------
 # Utility functions
 # ----------------------------
-def safe_json_loads(s):
-    """Safely parse a JSON string."""
-    if isinstance(s, str):
-        s_strip = s.strip()
-        if s_strip.startswith(("[", "{")):
-            try:
-                return json.loads(s_strip)
-            except json.JSONDecodeError:
-                pass
-    return s
-
-
-def parse_json_columns(df: pd.DataFrame) -> pd.DataFrame:
-    """Parse all columns in the DataFrame that contain JSON strings."""
-    with open(Paths.COLS_TO_JSON, "r") as f:
-        cols_to_json = json.load(f)
-    for col in cols_to_json:
-        if col in df.columns:
-            df[col] = df[col].apply(safe_json_loads)
-    return df
+def read_parquet_df(path: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Read a Parquet file into a DataFrame with DuckDB, nested columns as lists and dicts.
+    Only the given columns are read, when they are in the file.
+    """
+    relation = duckdb.read_parquet(str(path))
+    if columns is not None:
+        relation = relation.select(*[column for column in columns if column in relation.columns])
+    return pd.DataFrame(relation.fetchall(), columns=relation.columns)
+
+
+def parquet_column_types(path: Path) -> dict[str, str]:
+    """Return the DuckDB types of the columns of a Parquet file."""
+    relation = duckdb.read_parquet(str(path))
+    return dict(zip(relation.columns, (str(column_type) for column_type in relation.types), strict=True))
+
+
+def write_parquet_df(df: pd.DataFrame, path: Path, column_types: dict[str, str] | None = None) -> None:
+    """
+    Write a DataFrame to a Parquet file with DuckDB, lists and dicts as nested columns.
+    The types of the object columns are inferred from their values, unless they are given in column_types
+    (e.g. the types of the columns read from the eggs Parquet file, which may have no value in a subset).
+    """
+    casts = [
+        f'CAST("{column}" AS {column_type}) AS "{column}"'
+        for column, column_type in (column_types or {}).items()
+        if column in df.columns
+    ]
+    connection = duckdb.connect()
+    # Infer the types of the other object columns from all their values rather than from a sample
+    connection.execute(f"SET pandas_analyze_sample = {max(len(df), 1)}")
+    connection.register("processed", df)
+    select = f"SELECT * REPLACE ({', '.join(casts)}) FROM processed" if casts else "SELECT * FROM processed"
+    connection.execute(f"COPY ({select}) TO '{path}' (FORMAT parquet, COMPRESSION zstd)")
+    connection.close()
 
 
 def extract_text(row_dict: dict, field: str) -> str:
@@ -116,15 +135,13 @@ def row_to_product_data(row) -> ProductData:
 
 
 def load_eggs_df(input_file: Path) -> pd.DataFrame:
-    """Load eggs CSV and parse JSON columns."""
+    """Load eggs Parquet file, nested columns as lists and dicts."""
     try:
-        df = pd.read_csv(input_file)
+        return read_parquet_df(input_file)
     except Exception as e:
         print(f"Error loading eggs from {input_file}: {e}")
         exit(1)
 
-    return parse_json_columns(df)
-
 
 def create_dataframe_from_jsonl(file_path: Path) -> pd.DataFrame:
     """Convert OCR JSONL file to DataFrame using nested keys."""
@@ -213,6 +230,28 @@ def compute_egg_metrics(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def compute_pain_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add a seconds in pain column per pain type and intensity, computed with one vectorized lookup in the pain table
+    for all the products with a single breeding type and an egg count. Other products get empty values.
+    """
+    calibers = {caliber.value for caliber in EggCaliber}
+    computable = df["breeding"].isin([breeding_type.value for breeding_type in LayingHenBreedingType]) & (
+        df["egg_count"] > 0
+    )
+    rows = df[computable]
+    # Pain levels of each product, in the order of PAIN_TABLE.pain_levels
+    seconds_in_pain = PAIN_TABLE.batch_seconds_in_pain(
+        [LayingHenBreedingType(breeding) for breeding in rows["breeding"]],
+        [EggCaliber(caliber) if caliber in calibers else EggCaliber.AVERAGE for caliber in rows["caliber"]],
+        rows["egg_count"].tolist(),
+    )
+    for index, (pain_type, pain_intensity) in enumerate(PAIN_TABLE.pain_levels):
+        column = f"{pain_type.value}_{pain_intensity.value}_seconds"
+        df[column] = pd.Series(seconds_in_pain[:, index], index=rows.index, dtype="Int64")
+    return df
+
+
 def add_french_column_pipeline(df: pd.DataFrame) -> pd.DataFrame:
     """Add 'french' boolean column if not present."""
     if "french" not in df.columns:
@@ -225,12 +264,13 @@ def add_french_column_pipeline(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def save_processed_data(df: pd.DataFrame, dataset: str) -> None:
-    """Save processed DataFrame to CSV and French subset if applicable."""
-    processed_file, _ = get_file_paths(dataset)
-    df.to_csv(processed_file, index=False)
+    """Save processed DataFrame to Parquet and French subset if applicable, with the column types of the input file."""
+    processed_file, input_file = get_file_paths(dataset)
+    column_types = parquet_column_types(input_file)
+    write_parquet_df(df, processed_file, column_types)
     print(f"Saved processed data to {processed_file}")
     if dataset != "potential":
-        df[df["french"]].to_csv(Paths.PROCESSED_EGGS_FR, index=False)
+        write_parquet_df(df[df["french"]], Paths.PROCESSED_EGGS_FR, column_types)
         print(f"Saved French subset to {Paths.PROCESSED_EGGS_FR}")
 
 
@@ -240,6 +280,7 @@ def full_processing_pipeline(input_file: Path, dataset: str) -> pd.DataFrame:
     if dataset != "potential":
         df = enrich_with_ocr_pipeline(df)
     df = compute_egg_metrics(df)
+    df = compute_pain_metrics(df)
     df = prepare_egg_display_columns(add_french_column_pipeline(df))
     save_processed_data(df, dataset)
     return df
@@ -294,13 +335,13 @@ def manage_chart_display(df: pd.DataFrame, dataset: str, include_caliber: bool,
 # Command line & main
 # ----------------------------
 def get_file_paths(dataset: str) -> tuple[Path, Path]:
-    """Return processed file and input CSV paths based on dataset."""
+    """Return processed file and input file paths based on dataset."""
     if dataset == "world":
-        return Paths.PROCESSED_EGGS, Paths.EGGS_CSV
+        return Paths.PROCESSED_EGGS, Paths.EGGS_PARQUET
     elif dataset == "france":
-        return Paths.PROCESSED_EGGS_FR, Paths.EGGS_CSV
+        return Paths.PROCESSED_EGGS_FR, Paths.EGGS_PARQUET
     elif dataset == "potential":
-        return Paths.PROCESSED_POTENTIAL_EGGS, Paths.POTENTIAL_EGGS_CSV
+        return Paths.PROCESSED_POTENTIAL_EGGS, Paths.POTENTIAL_EGGS_PARQUET
     else:
         raise ValueError(f"Unknown dataset: {dataset}")
 
@@ -318,11 +359,10 @@ def parse_arguments() -> argparse.Namespace:
 
 
 def load_processed_data(processed_file: Path) -> pd.DataFrame:
-    """Load already processed CSV and parse JSON columns."""
+    """Load the columns of already processed Parquet file which are displayed in the charts."""
     if not processed_file.exists():
         raise FileNotFoundError(f"Processed file {processed_file} not found. Run without --no-process first.")
-    df = pd.read_csv(processed_file)
-    df = parse_json_columns(df)
+    df = read_parquet_df(processed_file, Config.CHART_COLUMNS)
     print(f"Loaded processed data with {len(df)} rows from {processed_file}")
     return df
 
@@ -1,9 +1,23 @@
+import asyncio
+import gzip
+import json
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
+import httpx
 import pytest
 from httpx import AsyncClient
 
-from app.config.cache import knowledge_panel_cache
+from app.api.open_food_facts.routes import accepts_gzip, refresh_knowledge_panel
+from app.business.open_food_facts.knowledge_panel_service import refresh_pain_reports
+from app.config.cache import (
+    KNOWLEDGE_PANEL_STALE_TTL_SECONDS,
+    KNOWLEDGE_PANEL_TTL_SECONDS,
+    EncodedResponse,
+    knowledge_panel_cache,
+    pain_report_cache,
+)
+from app.config.http_client import CircuitOpenError
+from app.config.i18n import I18N
 from app.schemas.open_food_facts.external import ProductData
 
 
@@ -100,13 +114,15 @@ async def test_knowledge_panel_cache_different_locales(async_client: AsyncClient
         assert response_en.status_code == 200
         calls_after_en = mock_get.call_count
 
-        # Request with French locale (same barcode) - should trigger new API call
+        # Request with French locale (same barcode) - rendered from the cached product data,
+        # without any new API call
         response_fr = await async_client.get("/off/v1/knowledge-panel/123456789", headers={"Accept-Language": "fr"})
         assert response_fr.status_code == 200
         calls_after_fr = mock_get.call_count
+        assert calls_after_fr == calls_after_en
 
-        # Verify both requests triggered API calls (different cache entries)
-        assert calls_after_fr > calls_after_en
+        # Verify each locale got its own rendering (different cache entries)
+        assert response_fr.json() != response_en.json()
 
         # Third request with English locale - should be cache hit
         response_en_cached = await async_client.get(
@@ -295,6 +311,47 @@ async def test_knowledge_panels_batch_deduplicates_repeated_barcode(
     assert mock_get.call_count == 1
 
 
+@pytest.mark.asyncio
+async def test_knowledge_panels_batch_streams_ndjson_with_cached_panels_first(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    """With Accept: application/x-ndjson, each panel or error is a line, cached panels coming first"""
+    success_response = MagicMock()
+    success_response.json = MagicMock(return_value={"product": sample_product_data})
+    error_response = MagicMock()
+    error_response.json = MagicMock(return_value={})
+
+    async def mock_get(url, *args, **kwargs):
+        if "999999999" in url:
+            return error_response
+        if "222222222" in url:
+            # The slowest product is streamed last
+            await asyncio.sleep(0.05)
+        return success_response
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        side_effect=mock_get,
+    ):
+        await async_client.get("/off/v1/knowledge-panel/333333333")
+
+        response = await async_client.get(
+            "/off/v1/knowledge-panel/?code=222222222,999999999,333333333",
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["barcode"] for item in items] == ["333333333", "999999999", "222222222"]
+    assert "panels" in items[0]["panel"]
+    assert "error" in items[1] and "panel" not in items[1]
+    assert "panels" in items[2]["panel"]
+    # Streamed panels are cached like the others
+    assert knowledge_panel_cache.get("knowledge_panel:222222222:en") is not None
+
+
 @pytest.mark.asyncio
 async def test_knowledge_panel_head_request_returns_no_body(
     async_client: AsyncClient, sample_product_data: ProductData
@@ -342,6 +399,107 @@ async def test_knowledge_panel_head_request_returns_no_body_on_cache_hit(
     assert response.content == b""
 
 
+@pytest.mark.asyncio
+async def test_stale_knowledge_panel_is_served_then_refreshed_in_background(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    """Once its TTL is over, a cached panel is still served right away while being refreshed"""
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with (
+        patch("app.config.cache.time.time", return_value=1_000.0),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            return_value=mock_response,
+        ),
+    ):
+        fresh = await async_client.get("/off/v1/knowledge-panel/123456789")
+
+    with (
+        patch("app.config.cache.time.time", return_value=1_000.0 + KNOWLEDGE_PANEL_TTL_SECONDS + 1),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            return_value=mock_response,
+        ) as mock_get,
+    ):
+        stale = await async_client.get("/off/v1/knowledge-panel/123456789")
+
+        assert stale.status_code == 200
+        assert stale.json() == fresh.json()
+        # The background refresh fetched the product again and cached a fresh panel
+        assert mock_get.call_count == 1
+        assert knowledge_panel_cache.get_with_staleness("knowledge_panel:123456789:en") == (
+            knowledge_panel_cache.get("knowledge_panel:123456789:en"),
+            False,
+        )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_stale_hits_share_one_refresh(async_client: AsyncClient, sample_product_data: ProductData):
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    async def slow_get(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return mock_response
+
+    with patch("app.config.cache.time.time", return_value=1_000.0):
+        with patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            return_value=mock_response,
+        ):
+            await async_client.get("/off/v1/knowledge-panel/123456789")
+
+    with (
+        patch("app.config.cache.time.time", return_value=1_000.0 + KNOWLEDGE_PANEL_TTL_SECONDS + 1),
+        patch("app.business.open_food_facts.knowledge_panel_service.get_with_retry", side_effect=slow_get),
+        patch("app.api.open_food_facts.routes.refresh_pain_reports", side_effect=refresh_pain_reports) as mock_refresh,
+    ):
+        responses = await asyncio.gather(*(async_client.get("/off/v1/knowledge-panel/123456789") for _ in range(3)))
+        # Once refreshed, the panel is not refreshed again by a late background task
+        await refresh_knowledge_panel("123456789", "en", I18N().get_translator(locale="en"))
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert mock_refresh.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_knowledge_panel_is_kept_when_the_refresh_fails(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with (
+        patch("app.config.cache.time.time", return_value=1_000.0),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            return_value=mock_response,
+        ),
+    ):
+        await async_client.get("/off/v1/knowledge-panel/123456789")
+
+    with (
+        patch("app.config.cache.time.time", return_value=1_000.0 + KNOWLEDGE_PANEL_TTL_SECONDS + 1),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            side_effect=httpx.ConnectError("OFF is down"),
+        ),
+    ):
+        response = await async_client.get("/off/v1/knowledge-panel/123456789")
+
+        assert response.status_code == 200
+        cached = knowledge_panel_cache.get_with_staleness("knowledge_panel:123456789:en")
+        assert cached is not None
+        assert cached[1] is True
+
+
 @pytest.mark.asyncio
 async def test_knowledge_panels_batch_with_empty_code_param_returns_empty_result(async_client: AsyncClient):
     """Test that an empty 'code' query param yields empty panels/errors instead of erroring out"""
@@ -397,3 +555,255 @@ async def test_knowledge_panel_falls_back_to_default_locale_when_unsupported(
         response = await async_client.get("/off/v1/knowledge-panel/123456789", headers={"Accept-Language": "de-DE"})
 
     assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_knowledge_panel_is_cached_and_served_as_encoded_bytes(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    """A cache hit serves the exact bytes encoded on the cache miss, in both endpoints"""
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        return_value=mock_response,
+    ):
+        miss = await async_client.get("/off/v1/knowledge-panel/123456789")
+        hit = await async_client.get("/off/v1/knowledge-panel/123456789")
+        batch = await async_client.get("/off/v1/knowledge-panel/?code=123456789,999999999")
+
+    cached = knowledge_panel_cache.get("knowledge_panel:123456789:en")
+    assert isinstance(cached, EncodedResponse)
+    assert miss.content == hit.content == cached.body
+    assert hit.headers["content-type"] == "application/json"
+    assert "null" not in hit.text
+    assert batch.json()["panels"]["123456789"] == hit.json()
+    assert batch.content.startswith(b'{"panels":{"123456789":' + cached.body + b",")
+
+
+@pytest.mark.asyncio
+async def test_knowledge_panel_is_served_gzipped_when_pre_compressed(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with (
+        patch("app.api.open_food_facts.routes.KNOWLEDGE_PANEL_GZIP_LEVEL", 6),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            return_value=mock_response,
+        ),
+    ):
+        plain = await async_client.get("/off/v1/knowledge-panel/123456789", headers={"Accept-Encoding": "identity"})
+        gzipped = await async_client.get("/off/v1/knowledge-panel/123456789", headers={"Accept-Encoding": "gzip"})
+
+    cached = knowledge_panel_cache.get("knowledge_panel:123456789:en")
+    assert cached is not None
+    assert "content-encoding" not in plain.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["vary"] == "Accept-Language, Accept-Encoding"
+    # Each content encoding has its own strong ETag
+    assert gzipped.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    # httpx decodes the body transparently
+    assert gzipped.content == plain.content == gzip.decompress(cached.gzip_body)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("gzip", True),
+        ("deflate, GZIP;q=0.5", True),
+        ("x-gzip", True),
+        ("*", True),
+        ("br;q=1.0, *;q=0.1", True),
+        (None, False),
+        ("", False),
+        ("identity", False),
+        ("gzip;q=0", False),
+        ("gzip; q=0.000, deflate", False),
+        ("identity;x-gzip", False),
+        ("*, gzip;q=0", False),
+        ("gzip;q=invalid", False),
+    ],
+)
+def test_accepts_gzip_honours_the_quality_values(accept_encoding: str | None, expected: bool):
+    assert accepts_gzip(accept_encoding) is expected
+
+
+@pytest.mark.asyncio
+async def test_knowledge_panel_has_http_caching_headers(async_client: AsyncClient, sample_product_data: ProductData):
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        return_value=mock_response,
+    ):
+        miss = await async_client.get("/off/v1/knowledge-panel/123456789")
+        hit = await async_client.get("/off/v1/knowledge-panel/123456789")
+
+    cached = knowledge_panel_cache.get("knowledge_panel:123456789:en")
+    assert cached is not None
+    assert miss.headers["etag"] == hit.headers["etag"] == cached.etag
+    assert hit.headers["cache-control"] == (
+        f"public, max-age={KNOWLEDGE_PANEL_TTL_SECONDS}, stale-while-revalidate={KNOWLEDGE_PANEL_STALE_TTL_SECONDS}"
+    )
+
+
+@pytest.mark.asyncio
+async def test_knowledge_panel_varies_on_the_language(async_client: AsyncClient, sample_product_data: ProductData):
+    """Panels are rendered in the language of the request: shared caches must not serve them to other languages"""
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        return_value=mock_response,
+    ):
+        head_miss = await async_client.head("/off/v1/knowledge-panel/123456789", headers={"Accept-Language": "fr"})
+        miss = await async_client.get("/off/v1/knowledge-panel/123456789", headers={"Accept-Language": "fr"})
+        head_hit = await async_client.head("/off/v1/knowledge-panel/123456789", headers={"Accept-Language": "fr"})
+        not_modified = await async_client.get(
+            "/off/v1/knowledge-panel/123456789",
+            headers={"Accept-Language": "fr", "If-None-Match": miss.headers["etag"]},
+        )
+
+    assert not_modified.status_code == 304
+    for response in (head_miss, miss, head_hit, not_modified):
+        assert response.headers["vary"] == "Accept-Language"
+
+
+@pytest.mark.parametrize(
+    "if_none_match,expected_status",
+    [
+        ("{etag}", 304),
+        ("W/{etag}", 304),
+        ('"other", {etag}', 304),
+        ("*", 304),
+        ('"other"', 200),
+    ],
+)
+@pytest.mark.asyncio
+async def test_knowledge_panel_conditional_get(
+    async_client: AsyncClient, sample_product_data: ProductData, if_none_match: str, expected_status: int
+):
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        return_value=mock_response,
+    ):
+        first = await async_client.get("/off/v1/knowledge-panel/123456789")
+        response = await async_client.get(
+            "/off/v1/knowledge-panel/123456789",
+            headers={"If-None-Match": if_none_match.format(etag=first.headers["etag"])},
+        )
+
+    assert response.status_code == expected_status
+    assert response.headers["etag"] == first.headers["etag"]
+    if expected_status == 304:
+        assert response.content == b""
+    else:
+        assert response.content == first.content
+
+
+@pytest.mark.asyncio
+async def test_stale_knowledge_panel_must_be_revalidated_by_http_caches(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        return_value=mock_response,
+    ):
+        with patch("app.config.cache.time.time", return_value=1_000.0):
+            await async_client.get("/off/v1/knowledge-panel/123456789")
+        with patch("app.config.cache.time.time", return_value=1_000.0 + KNOWLEDGE_PANEL_TTL_SECONDS + 1):
+            stale = await async_client.get("/off/v1/knowledge-panel/123456789")
+
+    assert stale.headers["cache-control"].startswith("public, max-age=0,")
+
+
+@pytest.mark.asyncio
+async def test_knowledge_panel_head_request_on_cache_miss_does_not_render_the_panel(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with (
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            return_value=mock_response,
+        ),
+        patch("app.api.open_food_facts.routes.get_knowledge_panel_response") as mock_render,
+    ):
+        response = await async_client.head("/off/v1/knowledge-panel/123456789")
+
+    assert response.status_code == 200
+    mock_render.assert_not_called()
+    assert knowledge_panel_cache.get("knowledge_panel:123456789:en") is None
+    assert pain_report_cache.get("pain_report:123456789:en") is None
+
+
+@pytest.mark.asyncio
+async def test_knowledge_panel_head_request_on_cache_miss_for_unsupported_product(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    not_an_egg = sample_product_data.model_copy(update={"categories_tags": ["en:biscuits"]})
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": not_an_egg})
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        return_value=mock_response,
+    ):
+        response = await async_client.head("/off/v1/knowledge-panel/123456789")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_knowledge_panel_is_unavailable_while_the_off_circuit_breaker_is_open(async_client: AsyncClient):
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        side_effect=CircuitOpenError("world.openfoodfacts.org"),
+    ):
+        response = await async_client.get("/off/v1/knowledge-panel/123456789")
+
+    assert response.status_code == 503
+    assert knowledge_panel_cache.get("knowledge_panel:123456789:en") is None
+
+
+@pytest.mark.asyncio
+async def test_knowledge_panel_head_request_on_cache_hit_has_the_get_headers(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        return_value=mock_response,
+    ):
+        get = await async_client.get("/off/v1/knowledge-panel/123456789")
+        head = await async_client.head("/off/v1/knowledge-panel/123456789")
+
+    assert head.content == b""
+    assert head.headers["etag"] == get.headers["etag"]
+    assert head.headers["content-length"] == str(len(get.content))
@@ -3,11 +3,15 @@ import re
 import pytest
 
 from app.business.open_food_facts.calculators.breeding_type_calculator import (
+    BREEDING_PATTERNS_REPOSITORY,
     BreedingTypeCalculator,
     get_barn_regex,
     get_cage_regex,
     get_free_range_regex,
 )
+from app.enums.open_food_facts.enums import AnimalType, LayingHenBreedingType
+from app.enums.open_food_facts.patterns.normalization import normalize_words
+from app.schemas.open_food_facts.internal import ProductType
 
 
 @pytest.mark.parametrize(
@@ -21,7 +25,7 @@ from app.business.open_food_facts.calculators.breeding_type_calculator import (
 )
 def test_free_range_regex(tag, should_match):
     pattern = get_free_range_regex()
-    assert bool(re.search(pattern, BreedingTypeCalculator._clean(tag))) == should_match
+    assert bool(re.search(pattern, normalize_words(tag))) == should_match
 
 
 @pytest.mark.parametrize(
@@ -35,7 +39,7 @@ def test_free_range_regex(tag, should_match):
 )
 def test_barn_regex(tag, should_match):
     pattern = get_barn_regex()
-    assert bool(re.search(pattern, BreedingTypeCalculator._clean(tag))) == should_match
+    assert bool(re.search(pattern, normalize_words(tag))) == should_match
 
 
 @pytest.mark.parametrize(
@@ -50,4 +54,48 @@ def test_barn_regex(tag, should_match):
 )
 def test_cage_regex(tag, should_match):
     pattern = get_cage_regex()
-    assert bool(re.search(pattern, BreedingTypeCalculator._clean(tag))) == should_match
+    assert bool(re.search(pattern, normalize_words(tag))) == should_match
+
+
+@pytest.mark.parametrize(
+    "tag,expected",
+    [
+        ("œufs-plein-air-non-bios", {LayingHenBreedingType.FREE_RANGE}),
+        ("barn-chicken-eggs-not-organic", {LayingHenBreedingType.BARN}),
+        ("cage-free-chicken-eggs", set()),
+        ("eggs-from-caged-hens", {LayingHenBreedingType.CAGE}),
+        ("oeufs bio de poules élevées au sol", {LayingHenBreedingType.FREE_RANGE, LayingHenBreedingType.BARN}),
+        ("ces oeufs ne proviennent pas de poules éléveées en CAGE", set()),
+        ("oeufs de poules élevées en cage, plein air", {LayingHenBreedingType.FREE_RANGE, LayingHenBreedingType.CAGE}),
+        ("oeufs solidaires", set()),
+        ("Freilandeier", {LayingHenBreedingType.FREE_RANGE}),
+        ("Bodenhaltung", {LayingHenBreedingType.BARN}),
+        ("Käfighaltung", {LayingHenBreedingType.CAGE}),
+        ("uova da galline allevate a terra", {LayingHenBreedingType.BARN}),
+        ("huevos de gallinas camperas", {LayingHenBreedingType.FREE_RANGE}),
+        ("huevos de gallinas criadas en jaula", {LayingHenBreedingType.CAGE}),
+    ],
+)
+def test_matcher_reports_the_breeding_types_of_multilingual_tags(tag, expected):
+    matcher = BREEDING_PATTERNS_REPOSITORY.get_matcher(AnimalType.LAYING_HEN)
+
+    assert matcher.match(normalize_words(tag)) == expected
+
+
+def test_matcher_reports_every_breeding_type_hit_in_pattern_order():
+    matcher = BREEDING_PATTERNS_REPOSITORY.get_matcher(AnimalType.LAYING_HEN)
+
+    assert matcher.match_all(["oeufs de poules élevées en cage", "oeufs plein air"]) == [
+        LayingHenBreedingType.FREE_RANGE,
+        LayingHenBreedingType.CAGE,
+    ]
+    assert matcher.match_all(["oeufs frais"]) == []
+
+
+def test_calculators_share_the_compiled_patterns(sample_product_data):
+    product_type = ProductType(is_mixed=False, animal_types={AnimalType.LAYING_HEN})
+
+    first = BreedingTypeCalculator(sample_product_data, product_type)
+    second = BreedingTypeCalculator(sample_product_data, product_type)
+
+    assert first.patterns_repository is second.patterns_repository is BREEDING_PATTERNS_REPOSITORY
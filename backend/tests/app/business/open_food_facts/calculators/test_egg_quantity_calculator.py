@@ -1,6 +1,10 @@
 import pytest
 
-from app.business.open_food_facts.calculators.egg_quantity_calculator import EggCaliber, EggQuantityCalculator
+from app.business.open_food_facts.calculators.egg_quantity_calculator import (
+    EggCaliber,
+    EggQuantityCalculator,
+    tokenize_egg_quantity_text,
+)
 from app.enums.open_food_facts.enums import EggQuantity
 
 
@@ -45,3 +49,26 @@ from app.enums.open_food_facts.enums import EggQuantity
 def test_calculate_egg_quantity(product_fixture, expected_quantity, request):
     product = request.getfixturevalue(product_fixture)
     assert EggQuantityCalculator().calculate_egg_quantity(product) == expected_quantity
+
+
+@pytest.mark.parametrize(
+    "text, token, expected",
+    [
+        ("Boîte de 6 gros œufs", "caliber", EggCaliber.LARGE),
+        ("one dozen", "dozens", 1),
+        ("5 dozen", "dozens", 5),
+        ("10+2 eggs", "addition", 12),
+        ("x10", "isolated_number", 10),
+        ("6", "number_only", 6.0),
+        ("1.5 dozen", "numeric_unit", (1.5, ["dozen"])),
+        ("Boîte de 6", "small_number", 6),
+        ("1 200 G", "weight", (1200.0, "g")),
+        ("some weird string", "weight", None),
+    ],
+)
+def test_egg_quantity_text_tokens(text, token, expected):
+    assert getattr(tokenize_egg_quantity_text(text), token) == expected
+
+
+def test_egg_quantity_text_is_tokenized_once():
+    assert tokenize_egg_quantity_text("12 large") is tokenize_egg_quantity_text("12 large")
@@ -1,8 +1,19 @@
 import pytest
 
-from app.business.open_food_facts.calculators.pain_report_calculator import PainReportCalculator
+from app.business.open_food_facts.calculators.pain_report_calculator import (
+    PainReportCalculator,
+    compute_pain_reports,
+)
+from app.business.open_food_facts.calculators.unit_pain_loader import PAIN_TABLE
 from app.config.exceptions import MissingBreedingType
-from app.enums.open_food_facts.enums import AnimalType, EggQuantity, LayingHenBreedingType, PainIntensity, PainType
+from app.enums.open_food_facts.enums import (
+    AnimalType,
+    EggCaliber,
+    EggQuantity,
+    LayingHenBreedingType,
+    PainIntensity,
+    PainType,
+)
 from app.schemas.open_food_facts.external import ProductData
 from app.schemas.open_food_facts.internal import BreedingTypeAndQuantity
 
@@ -41,8 +52,8 @@ def test_get_breeding_types(sample_product_data: ProductData):
     assert result[AnimalType.LAYING_HEN] == [LayingHenBreedingType.FURNISHED_CAGE]
 
 
-def test_generate_pain_levels_for_type(sample_product_data: ProductData):
-    """Test generating pain levels for a specific animal, breeding type, and pain type"""
+def test_get_pain_table_lookup(sample_product_data: ProductData):
+    """Test getting what to look up in the pain table for a specific animal and breeding type"""
 
     calculator = PainReportCalculator(sample_product_data)
 
@@ -50,10 +61,57 @@ def test_generate_pain_levels_for_type(sample_product_data: ProductData):
 
     breeding_type = BreedingTypeAndQuantity(breeding_type=LayingHenBreedingType.FURNISHED_CAGE, quantity=quantity)
 
-    # Test generating physical pain levels
-    physical_pain_levels = calculator._generate_pain_levels_for_pain_type(
-        AnimalType.LAYING_HEN, breeding_type, PainType.PHYSICAL
-    )
+    lookup = calculator._get_pain_table_lookup(AnimalType.LAYING_HEN, breeding_type)
+
+    assert lookup == (LayingHenBreedingType.FURNISHED_CAGE, EggCaliber.AVERAGE, 4)
+
+
+def test_get_pain_table_lookup_without_quantity(sample_product_data: ProductData):
+    """Test that an average egg is looked up when the quantity is unknown"""
+
+    calculator = PainReportCalculator(sample_product_data)
+    breeding_type = BreedingTypeAndQuantity(breeding_type=LayingHenBreedingType.BARN, quantity=None)
+
+    lookup = calculator._get_pain_table_lookup(AnimalType.LAYING_HEN, breeding_type)
+
+    assert lookup == (LayingHenBreedingType.BARN, EggCaliber.AVERAGE, 1)
+
+
+def test_get_pain_table_lookup_not_laying_hen(sample_product_data: ProductData):
+    """Test that nothing is looked up for animals without pain data"""
+
+    calculator = PainReportCalculator(sample_product_data)
+    breeding_type = BreedingTypeAndQuantity(breeding_type=LayingHenBreedingType.BARN, quantity=None)
+
+    assert calculator._get_pain_table_lookup(AnimalType.BROILER_CHICKEN, breeding_type) is None
+
+
+def test_get_pain_table_lookup_missing_breeding_type(
+    sample_product_data: ProductData, missing_breeding_type: BreedingTypeAndQuantity
+):
+    """Test getting what to look up for a specific animal with missing breeding type and quantity"""
+
+    sample_product_data.product_quantity = None
+
+    calculator = PainReportCalculator(sample_product_data)
+
+    # Verify that the absence of quantity triggers an exception
+    with pytest.raises(MissingBreedingType):
+        calculator._get_pain_table_lookup(AnimalType.LAYING_HEN, missing_breeding_type)
+
+
+def test_get_pain_reports_pain_levels(sample_product_data: ProductData):
+    """Test generating pain levels of all pain types for the scenario of a product"""
+
+    calculator = PainReportCalculator(sample_product_data)
+
+    animal_pain_report = calculator.get_pain_reports().scenarios[0].animal_pain_reports[0]
+    pain_levels = animal_pain_report.pain_levels
+
+    assert len(pain_levels) == 8  # One for each pain type and intensity
+
+    # Test generated physical pain levels
+    physical_pain_levels = [level for level in pain_levels if level.pain_type == PainType.PHYSICAL]
 
     assert len(physical_pain_levels) == 4  # One for each intensity
     for level in physical_pain_levels:
@@ -61,10 +119,8 @@ def test_generate_pain_levels_for_type(sample_product_data: ProductData):
         assert isinstance(level.pain_intensity, PainIntensity)
         assert isinstance(level.seconds_in_pain, int)
 
-    # Test generating psychological pain levels
-    psychological_pain_levels = calculator._generate_pain_levels_for_pain_type(
-        AnimalType.LAYING_HEN, breeding_type, PainType.PSYCHOLOGICAL
-    )
+    # Test generated psychological pain levels
+    psychological_pain_levels = [level for level in pain_levels if level.pain_type == PainType.PSYCHOLOGICAL]
 
     assert len(psychological_pain_levels) == 4  # One for each intensity
     for level in psychological_pain_levels:
@@ -72,19 +128,28 @@ def test_generate_pain_levels_for_type(sample_product_data: ProductData):
         assert isinstance(level.pain_intensity, PainIntensity)
         assert isinstance(level.seconds_in_pain, int)
 
+    # The batch lookup gives the same time in pain as the lookup of a single scenario
+    lookup = calculator._get_pain_table_lookup(AnimalType.LAYING_HEN, animal_pain_report.breeding_type_and_quantity)
+    assert lookup is not None
+    assert [level.seconds_in_pain for level in pain_levels] == PAIN_TABLE.seconds_in_pain(*lookup)
 
-def test_generate_pain_levels_for_type_missing_quantity(
-    sample_product_data: ProductData, missing_breeding_type: BreedingTypeAndQuantity
-):
-    """Test generating pain levels for a specific animal with breeding type and missing quantity"""
 
-    sample_product_data.product_quantity = None
+def test_compute_pain_reports(sample_product_data: ProductData):
+    """Test generating the pain reports of many products at once"""
 
-    calculator = PainReportCalculator(sample_product_data)
+    calculators = [PainReportCalculator(sample_product_data)]
+    sample_product_data = sample_product_data.model_copy(update={"product_quantity": None})
+    calculators.append(PainReportCalculator(sample_product_data))
+    sample_product_data = sample_product_data.model_copy(
+        update={"categories_tags": [*(sample_product_data.categories_tags or []), "en:barn-chicken-eggs"]}
+    )
+    calculators.append(PainReportCalculator(sample_product_data))
 
-    # Verify that the absence of quantity triggers an exception
-    with pytest.raises(MissingBreedingType):
-        calculator._generate_pain_levels_for_pain_type(AnimalType.LAYING_HEN, missing_breeding_type, PainType.PHYSICAL)
+    pain_reports = compute_pain_reports(calculators)
+
+    assert pain_reports == [calculator.get_pain_reports() for calculator in calculators]
+    assert len(pain_reports[2].scenarios) == 2
+    assert compute_pain_reports([]) == []
 
 
 def test_get_pain_reports(sample_product_data: ProductData):
@@ -0,0 +1,54 @@
+import pytest
+
+from app.business.open_food_facts.calculators.tag_index import TAG_INDEX, ResolvedTags, resolve_categories_tags
+from app.enums.open_food_facts.enums import AnimalType, EggCaliber, LayingHenBreedingType
+
+
+def test_tag_index_merges_the_information_of_every_repository():
+    assert TAG_INDEX["en:eggs"].animal_types == {AnimalType.LAYING_HEN}
+    assert TAG_INDEX["en:chickens"].animal_types == {AnimalType.BROILER_CHICKEN}
+    assert TAG_INDEX["en:organic-eggs"].breeding_types == {(AnimalType.LAYING_HEN, LayingHenBreedingType.FREE_RANGE)}
+    assert TAG_INDEX["en:free-range-large-eggs"].caliber == EggCaliber.LARGE
+    assert TAG_INDEX["en:boiled-eggs"].excluded
+    assert TAG_INDEX["en:fresh-eggs"].fresh_chicken_egg
+
+
+def test_resolve_no_tags():
+    assert resolve_categories_tags(None) == ResolvedTags(breeding_types={AnimalType.LAYING_HEN: []})
+
+
+def test_resolve_categories_tags():
+    resolved = resolve_categories_tags(
+        [
+            "en:farming-products",
+            "en:eggs",
+            "en:chicken-eggs",
+            "en:cage-chicken-eggs",
+            "en:free-range-chicken-eggs",
+            "en:large-eggs",
+            "en:small-eggs",
+        ]
+    )
+
+    assert resolved.animal_types == {AnimalType.LAYING_HEN}
+    # Breeding types keep the order of the repository, whatever the order of the tags
+    assert resolved.breeding_types == {
+        AnimalType.LAYING_HEN: [LayingHenBreedingType.FREE_RANGE, LayingHenBreedingType.CAGE]
+    }
+    # The smallest caliber wins
+    assert resolved.caliber == EggCaliber.SMALL
+    assert not resolved.has_excluded_tag
+    assert not resolved.only_fresh_chicken_egg_tags
+
+
+@pytest.mark.parametrize(
+    "categories_tags,expected",
+    [
+        ([], True),
+        (["en:fresh-eggs", "en:chicken-eggs"], True),
+        (["en:fresh-eggs", "en:eggs"], False),
+        (["en:fresh-eggs", "en:unknown"], False),
+    ],
+)
+def test_resolve_only_fresh_chicken_egg_tags(categories_tags, expected):
+    assert resolve_categories_tags(categories_tags).only_fresh_chicken_egg_tags == expected
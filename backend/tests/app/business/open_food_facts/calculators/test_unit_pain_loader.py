@@ -1,6 +1,14 @@
 import io
+import itertools
 
-from app.business.open_food_facts.calculators.unit_pain_loader import UnitPainLoader
+import pytest
+
+from app.business.open_food_facts.calculators.unit_pain_loader import (
+    PAIN_PER_EGG_IN_SECONDS,
+    PAIN_TABLE,
+    PainTable,
+    UnitPainLoader,
+)
 from app.enums.open_food_facts.enums import AnimalType, EggCaliber, LayingHenBreedingType, PainIntensity, PainType
 
 
@@ -28,3 +36,61 @@ laying_hen;barn;physical;hurtful;small;12.5
         ]
         == 12.5
     )
+
+
+def test_pain_table_is_dense():
+    csv_content = """animal_type;breeding_type;pain_type;pain_intensity;caliber;pain_per_egg_in_seconds
+laying_hen;barn;physical;hurtful;small;12.5
+laying_hen;barn;psychological;annoying;small;3
+"""
+    table = PainTable(UnitPainLoader(io.StringIO(csv_content)).load()[AnimalType.LAYING_HEN])
+
+    assert len(table.values) == len(LayingHenBreedingType) * len(PainType) * len(PainIntensity) * len(EggCaliber)
+    assert table.pain_levels[2] == (PainType.PHYSICAL, PainIntensity.HURTFUL)
+    assert table.seconds_in_pain(LayingHenBreedingType.BARN, EggCaliber.SMALL, 2) == [0, 0, 25, 0, 0, 0, 0, 6]
+    # Missing combinations are worth 0 seconds
+    assert table.seconds_in_pain(LayingHenBreedingType.BARN, EggCaliber.LARGE, 2) == [0] * 8
+    assert table.seconds_in_pain(LayingHenBreedingType.CAGE, EggCaliber.SMALL, 2) == [0] * 8
+
+
+def test_pain_table_version_changes_with_the_pain_data():
+    csv_content = """animal_type;breeding_type;pain_type;pain_intensity;caliber;pain_per_egg_in_seconds
+laying_hen;barn;physical;hurtful;small;{seconds}
+"""
+
+    def version(seconds: float) -> str:
+        loaded = UnitPainLoader(io.StringIO(csv_content.format(seconds=seconds))).load()
+        return PainTable(loaded[AnimalType.LAYING_HEN]).version
+
+    assert version(12.5) == version(12.5)
+    assert version(12.5) != version(13)
+
+
+def test_pain_table_matches_pain_data():
+    for breeding_type, pain_per_egg in PAIN_PER_EGG_IN_SECONDS[AnimalType.LAYING_HEN].items():
+        seconds_in_pain = PAIN_TABLE.seconds_in_pain(breeding_type, EggCaliber.LARGE, 6)
+        for (pain_type, pain_intensity), seconds in zip(PAIN_TABLE.pain_levels, seconds_in_pain, strict=True):
+            assert seconds == int(pain_per_egg[pain_type][pain_intensity][EggCaliber.LARGE] * 6)
+
+
+def test_batch_seconds_in_pain_matches_seconds_in_pain():
+    lookups = list(itertools.product(LayingHenBreedingType, EggCaliber, [0, 1, 6, 12, 1000]))
+
+    batch = PAIN_TABLE.batch_seconds_in_pain(
+        [breeding_type for breeding_type, _, _ in lookups],
+        [caliber for _, caliber, _ in lookups],
+        [count for _, _, count in lookups],
+    )
+
+    assert batch.shape == (len(lookups), len(PAIN_TABLE.pain_levels))
+    for lookup, seconds_in_pain in zip(lookups, batch.tolist(), strict=True):
+        assert seconds_in_pain == PAIN_TABLE.seconds_in_pain(*lookup)
+
+
+def test_batch_seconds_in_pain_of_nothing():
+    assert PAIN_TABLE.batch_seconds_in_pain([], [], []).shape == (0, len(PAIN_TABLE.pain_levels))
+
+
+def test_batch_seconds_in_pain_with_different_lengths():
+    with pytest.raises(ValueError):
+        PAIN_TABLE.batch_seconds_in_pain([LayingHenBreedingType.BARN], [EggCaliber.SMALL], [1, 2])
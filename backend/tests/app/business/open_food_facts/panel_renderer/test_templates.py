@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+
+import pytest
+from jinja2 import TemplateNotFound
+
+from app.business.open_food_facts.panel_renderer.templates import TEMPLATES_DIR, TemplateRegistry
+
+
+@pytest.fixture
+def templates_dir(tmp_path: Path) -> Path:
+    for locale, greeting in [("en", "Hello"), ("fr", "Bonjour")]:
+        (tmp_path / "templates" / locale).mkdir(parents=True)
+        (tmp_path / "templates" / locale / "greeting.html").write_text(f"{greeting} {{{{ name }}}}")
+    return tmp_path / "templates"
+
+
+def test_each_locale_has_its_own_templates(templates_dir: Path):
+    registry = TemplateRegistry(templates_dir)
+
+    assert registry.get_template("en", "greeting.html").render(name="<b>") == "Hello &lt;b&gt;"
+    assert registry.get_template("fr", "greeting.html").render(name="Alice") == "Bonjour Alice"
+
+
+def test_environments_and_compiled_templates_are_reused(templates_dir: Path):
+    registry = TemplateRegistry(templates_dir)
+
+    assert registry.get_environment("en") is registry.get_environment("en")
+    assert registry.get_template("en", "greeting.html") is registry.get_template("en", "greeting.html")
+
+
+def test_precompile_compiles_the_templates_of_every_locale(templates_dir: Path):
+    registry = TemplateRegistry(templates_dir)
+
+    assert registry.precompile() == 2
+    assert set(registry._environments) == {"en", "fr"}
+
+
+def test_precompile_compiles_every_knowledge_panel_template():
+    registry = TemplateRegistry(TEMPLATES_DIR)
+
+    assert registry.precompile() == len(list(TEMPLATES_DIR.glob("*/*.html")))
+
+
+def test_changed_template_is_only_reloaded_with_auto_reload(templates_dir: Path):
+    static_registry = TemplateRegistry(templates_dir)
+    reloading_registry = TemplateRegistry(templates_dir, auto_reload=True)
+    static_registry.precompile()
+    reloading_registry.precompile()
+
+    template_path = templates_dir / "en" / "greeting.html"
+    template_path.write_text("Hi {{ name }}")
+    # Make sure the modification time changes, whatever the file system resolution
+    mtime = template_path.stat().st_mtime + 10
+    os.utime(template_path, (mtime, mtime))
+
+    assert static_registry.get_template("en", "greeting.html").render(name="Alice") == "Hello Alice"
+    assert reloading_registry.get_template("en", "greeting.html").render(name="Alice") == "Hi Alice"
+
+
+def test_compiled_templates_are_kept_in_the_bytecode_cache_dir(templates_dir: Path, tmp_path: Path):
+    cache_dir = tmp_path / "bytecode"
+    cache_dir.mkdir()
+
+    TemplateRegistry(templates_dir, bytecode_cache_dir=str(cache_dir)).precompile()
+
+    assert len(list(cache_dir.iterdir())) == 2
+
+
+def test_unknown_template_raises_template_not_found(templates_dir: Path):
+    with pytest.raises(TemplateNotFound):
+        TemplateRegistry(templates_dir).get_template("de", "greeting.html")
@@ -1,20 +1,32 @@
 import asyncio
-from typing import Callable
+import math
+import re
+from typing import Callable, Iterator
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import httpx
 import pytest
 
+from app.business.open_food_facts.calculators.pain_report_calculator import PainReportCalculator, compute_pain_reports
 from app.business.open_food_facts.knowledge_panel_service import (
+    SEARCH_A_LICIOUS_URL,
+    check_knowledge_panel_exists,
     get_data_from_off_search_a_licious,
     get_data_from_off_v3,
     get_generator,
     get_knowledge_panel_response,
     get_pain_reports,
     get_pain_reports_batch,
+    get_product_data,
+    get_products_data_from_off_search_a_licious,
+    refresh_pain_reports,
 )
-from app.config.exceptions import ResourceNotFoundException
+from app.config.barcode_index import ReloadableBarcodeIndex, write_barcode_index
+from app.config.cache import PRODUCT_NOT_FOUND_TTL_SECONDS, pain_report_cache, product_data_cache
+from app.config.exceptions import ExternalServiceException, ResourceNotFoundException
+from app.config.http_client import CircuitOpenError
 from app.config.i18n import I18N
+from app.config.product_store import ProductStore, write_product_store
 from app.enums.open_food_facts.enums import AnimalType
 from app.schemas.open_food_facts.external import ProductData
 from app.schemas.open_food_facts.internal import PainReport, ProductType
@@ -239,6 +251,29 @@ async def test_get_pain_reports_batch_runs_concurrently(sample_product_data: Pro
     assert call_order.index("start-second") < call_order.index("end-first")
 
 
+@pytest.mark.asyncio
+async def test_get_pain_reports_batch_computes_all_products_at_once(sample_product_data: ProductData):
+    """The pain levels of all the products of a batch are looked up in a single pain table operation"""
+    with (
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3",
+            new_callable=AsyncMock,
+            return_value=sample_product_data,
+        ),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.compute_pain_reports",
+            side_effect=compute_pain_reports,
+        ) as compute,
+    ):
+        results = await get_pain_reports_batch(barcodes=["first", "second", "third"], locale="en")
+
+    compute.assert_called_once()
+    assert len(compute.call_args.args[0]) == 3
+    assert results["first"] == results["third"] == PainReportCalculator(sample_product_data).get_pain_reports()
+    # The computed pain reports are cached
+    assert await get_pain_reports(barcode="second", locale="en") == results["second"]
+
+
 # --- get_generator ---
 
 
@@ -269,3 +304,618 @@ def test_get_generator_raises_for_unsupported_product_type(pain_report: PainRepo
 
     with pytest.raises(ResourceNotFoundException, match="Unsupported product type"):
         get_generator(pain_report, product_type, locale="en", translator=translator)
+
+
+# --- request coalescing ---
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_for_the_same_barcode_fetch_off_once(sample_product_data: ProductData):
+    """Concurrent requests for the same product, in any locale, must share a single OFF fetch"""
+
+    async def slow_get(url: str, **kwargs):
+        await asyncio.sleep(0.01)
+        response = MagicMock()
+        response.json = MagicMock(return_value={"product": sample_product_data.model_dump(mode="json")})
+        return response
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        side_effect=slow_get,
+    ) as mock_get:
+        results = await asyncio.gather(
+            get_pain_reports(barcode="123456789", locale="en"),
+            get_pain_reports(barcode="123456789", locale="en"),
+            get_pain_reports(barcode="123456789", locale="fr"),
+            get_pain_reports_batch(barcodes=["123456789"], locale="fr"),
+        )
+
+    assert mock_get.call_count == 1
+    assert all(isinstance(result, PainReport) for result in results[:3])
+    assert isinstance(results[3]["123456789"], PainReport)
+
+
+@pytest.mark.asyncio
+async def test_shared_off_payload_is_not_mutated_by_locale_specific_processing():
+    """The product name of one locale must not leak into the payload shared with another locale"""
+    payload = {"product": {"product_name": "Eggs", "product_name_fr": "Oeufs", "categories_tags": ["en:eggs"]}}
+
+    async def slow_get(url: str, **kwargs):
+        await asyncio.sleep(0.01)
+        response = MagicMock()
+        response.json = MagicMock(return_value=payload)
+        return response
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        side_effect=slow_get,
+    ):
+        product_fr, product_en = await asyncio.gather(
+            get_data_from_off_v3("123456789", locale="fr"), get_data_from_off_v3("123456789", locale="en")
+        )
+
+    assert product_fr.product_name == "Oeufs"
+    assert product_en.product_name == "Eggs"
+    assert payload["product"]["product_name"] == "Eggs"
+
+
+# --- product data and pain report caches ---
+
+
+@pytest.fixture
+def off_not_found_response() -> MagicMock:
+    response = MagicMock()
+    response.json = MagicMock(return_value={"status": 0, "status_verbose": "product not found"})
+    return response
+
+
+@pytest.mark.asyncio
+async def test_product_data_is_fetched_once_for_every_locale():
+    """The OFF payload is cached by barcode: another locale only re-renders the localized product name"""
+    payload = {
+        "product": {
+            "product_name": "Eggs",
+            "product_name_fr": "Oeufs",
+            "categories_tags": ["en:eggs"],
+            "unused_field": "dropped from the cache",
+        }
+    }
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value=payload)
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        return_value=mock_response,
+    ) as mock_get:
+        product_fr = await get_data_from_off_v3("123456789", locale="fr")
+        product_en = await get_data_from_off_v3("123456789", locale="en")
+
+    assert mock_get.call_count == 1
+    assert product_fr.product_name == "Oeufs"
+    assert product_en.product_name == "Eggs"
+    cached_payload = product_data_cache.get("off_v3_payload:123456789")
+    assert "unused_field" not in cached_payload["product"]
+
+
+@pytest.mark.asyncio
+async def test_product_not_found_is_cached_for_a_short_time(off_not_found_response: MagicMock):
+    with (
+        patch("app.config.cache.time.time", return_value=1000.0),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            return_value=off_not_found_response,
+        ) as mock_get,
+    ):
+        for _ in range(2):
+            with pytest.raises(ResourceNotFoundException):
+                await get_data_from_off_v3("000000000", locale="en")
+
+    assert mock_get.call_count == 1
+
+    with (
+        patch("app.config.cache.time.time", return_value=1000.0 + PRODUCT_NOT_FOUND_TTL_SECONDS + 1),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            return_value=off_not_found_response,
+        ) as mock_get,
+    ):
+        with pytest.raises(ResourceNotFoundException):
+            await get_data_from_off_v3("000000000", locale="en")
+
+    assert mock_get.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_off_404_is_cached_as_not_found():
+    request = httpx.Request("GET", "https://world.openfoodfacts.org/api/v3/product/000000000.json")
+    not_found = httpx.Response(404, request=request, json={"status": "failure"})
+
+    with (
+        patch("app.config.http_client.client.get", new_callable=AsyncMock, return_value=not_found) as mock_get,
+        patch("app.config.http_client.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+    ):
+        for _ in range(2):
+            with pytest.raises(ResourceNotFoundException, match="No hits returned by OFF API"):
+                await get_data_from_off_v3("000000000", locale="en")
+
+    # The 404 is not retried, and the negative result is cached right away
+    assert mock_get.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error",
+    [
+        CircuitOpenError("world.openfoodfacts.org"),
+        ExternalServiceException("world.openfoodfacts.org is rate limiting requests", status_code=503),
+    ],
+)
+async def test_unavailable_off_api_is_a_service_error_which_is_not_cached(error: Exception):
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        side_effect=error,
+    ) as mock_get:
+        for _ in range(2):
+            with pytest.raises(ExternalServiceException, match="OFF API is unavailable") as exc_info:
+                await get_pain_reports(barcode="123456789", locale="en")
+            assert exc_info.value.status_code == 503
+
+    assert mock_get.call_count == 2
+    assert pain_report_cache.get("pain_report:123456789:en") is None
+    assert product_data_cache.get("off_v3_payload:123456789") is None
+
+
+@pytest.mark.asyncio
+async def test_unsupported_product_is_cached_for_a_short_time(sample_product_data: ProductData):
+    not_an_egg = sample_product_data.model_copy(update={"categories_tags": ["en:biscuits"]})
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3",
+        new_callable=AsyncMock,
+        return_value=not_an_egg,
+    ) as mock_get_data:
+        for _ in range(2):
+            with pytest.raises(ResourceNotFoundException, match="No animal types found"):
+                await get_pain_reports(barcode="123456789", locale="en")
+
+    assert mock_get_data.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_pain_reports_bypasses_the_caches(sample_product_data: ProductData):
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3",
+        new_callable=AsyncMock,
+        return_value=sample_product_data,
+    ) as mock_get_data:
+        await get_pain_reports(barcode="123456789", locale="en")
+        refreshed = await refresh_pain_reports(barcode="123456789", locale="en")
+
+    assert mock_get_data.call_count == 2
+    assert pain_report_cache.get("pain_report:123456789:en") == refreshed
+
+
+@pytest.mark.asyncio
+async def test_pain_report_is_served_from_cache(sample_product_data: ProductData):
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3",
+        new_callable=AsyncMock,
+        return_value=sample_product_data,
+    ) as mock_get_data:
+        first = await get_pain_reports(barcode="123456789", locale="en")
+        second = await get_pain_reports(barcode="123456789", locale="en")
+
+    assert mock_get_data.call_count == 1
+    assert second == first
+    assert pain_report_cache.get("pain_report:123456789:en") == first
+
+
+@pytest.mark.parametrize("product_fixture", ["sample_product_data", "liquid_eggs_product"])
+@pytest.mark.asyncio
+async def test_check_knowledge_panel_exists_does_not_compute_the_pain_report(
+    product_fixture: str, request: pytest.FixtureRequest
+):
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3",
+        new_callable=AsyncMock,
+        return_value=request.getfixturevalue(product_fixture),
+    ):
+        await check_knowledge_panel_exists(barcode="123456789", locale="en")
+
+    assert pain_report_cache.get("pain_report:123456789:en") is None
+
+
+@pytest.mark.asyncio
+async def test_check_knowledge_panel_exists_raises_for_unsupported_product(sample_product_data: ProductData):
+    not_an_egg = sample_product_data.model_copy(update={"categories_tags": ["en:biscuits"]})
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3",
+        new_callable=AsyncMock,
+        return_value=not_an_egg,
+    ):
+        with pytest.raises(ResourceNotFoundException, match="No animal types found"):
+            await check_knowledge_panel_exists(barcode="123456789", locale="en")
+
+
+@pytest.mark.asyncio
+async def test_check_knowledge_panel_exists_uses_the_cached_pain_report(pain_report: PainReport):
+    pain_report_cache.set("pain_report:123456789:en", pain_report)
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3", new_callable=AsyncMock
+    ) as mock_get_data:
+        await check_knowledge_panel_exists(barcode="123456789", locale="en")
+
+    mock_get_data.assert_not_called()
+
+
+# --- hedged requests ---
+
+
+@pytest.mark.asyncio
+async def test_get_product_data_does_not_hedge_when_disabled(sample_product_data: ProductData):
+    with (
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3",
+            new_callable=AsyncMock,
+            return_value=sample_product_data,
+        ),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_search_a_licious",
+            new_callable=AsyncMock,
+        ) as mock_search,
+    ):
+        assert await get_product_data("123456789", locale="en") == sample_product_data
+
+    mock_search.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_slow_off_v3_request_is_hedged_with_search_a_licious(sample_product_data: ProductData):
+    hedged_product = sample_product_data.model_copy(update={"product_name": "From search-a-licious"})
+    off_v3_cancelled = asyncio.Event()
+
+    async def slow_off_v3(barcode, locale):
+        try:
+            await asyncio.sleep(10)
+        finally:
+            off_v3_cancelled.set()
+
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.HEDGED_REQUESTS_ENABLED", True),
+        patch("app.business.open_food_facts.knowledge_panel_service.hedge_delay", return_value=0.01),
+        patch("app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3", side_effect=slow_off_v3),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_search_a_licious",
+            new_callable=AsyncMock,
+            return_value=hedged_product,
+        ),
+    ):
+        result = await get_product_data("123456789", locale="en")
+        await asyncio.wait_for(off_v3_cancelled.wait(), timeout=1)
+
+    assert result == hedged_product
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_failure_falls_back_on_the_off_v3_response(sample_product_data: ProductData):
+    async def slow_off_v3(barcode, locale):
+        await asyncio.sleep(0.05)
+        return sample_product_data
+
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.HEDGED_REQUESTS_ENABLED", True),
+        patch("app.business.open_food_facts.knowledge_panel_service.hedge_delay", return_value=0.01),
+        patch("app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3", side_effect=slow_off_v3),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_search_a_licious",
+            new_callable=AsyncMock,
+            side_effect=ResourceNotFoundException("No hits returned by OFF API: 123456789"),
+        ),
+    ):
+        assert await get_product_data("123456789", locale="en") == sample_product_data
+
+
+@pytest.mark.asyncio
+async def test_fast_off_v3_request_is_not_hedged(sample_product_data: ProductData):
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.HEDGED_REQUESTS_ENABLED", True),
+        patch("app.business.open_food_facts.knowledge_panel_service.hedge_delay", return_value=1.0),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3",
+            new_callable=AsyncMock,
+            return_value=sample_product_data,
+        ),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_search_a_licious",
+            new_callable=AsyncMock,
+        ) as mock_search,
+    ):
+        assert await get_product_data("123456789", locale="en") == sample_product_data
+
+    mock_search.assert_not_called()
+
+
+# --- bulk search for batches ---
+
+
+class FakeOpenFoodFacts:
+    """
+    Local stand-in for the OFF APIs: search-a-licious answers OR queries on product codes,
+    page by page, and OFF API v3 answers single product requests.
+    """
+
+    def __init__(self, indexed_products: dict[str, dict], v3_products: dict[str, dict]):
+        self.indexed_products = indexed_products
+        self.v3_products = v3_products
+        self.search_requests: list[dict] = []
+        self.v3_requests: list[str] = []
+
+    async def get(self, url: str, params: dict | None = None, **kwargs) -> httpx.Response:
+        request = httpx.Request("GET", url)
+
+        if url == SEARCH_A_LICIOUS_URL:
+            assert params is not None
+            self.search_requests.append(params)
+            codes = re.findall(r"code:(\d+)", params["q"])
+            hits = [{"code": code, **self.indexed_products[code]} for code in codes if code in self.indexed_products]
+            page, page_size = int(params.get("page", 1)), int(params.get("page_size", 10))
+            return httpx.Response(
+                200,
+                request=request,
+                json={
+                    "hits": hits[(page - 1) * page_size : page * page_size],
+                    "count": len(hits),
+                    "page": page,
+                    "page_size": page_size,
+                    "page_count": max(1, math.ceil(len(hits) / page_size)),
+                },
+            )
+
+        barcode = url.rsplit("/", 1)[-1].removesuffix(".json")
+        self.v3_requests.append(barcode)
+        if barcode not in self.v3_products:
+            return httpx.Response(404, request=request, json={"status": "failure"})
+        return httpx.Response(200, request=request, json={"product": self.v3_products[barcode]})
+
+
+@pytest.fixture
+def product_payload(sample_product_data: ProductData) -> dict:
+    return sample_product_data.model_dump(mode="json", exclude_none=True)
+
+
+@pytest.mark.asyncio
+async def test_batch_fetches_its_products_in_one_search_and_falls_back_to_v3(product_payload: dict):
+    fake_off = FakeOpenFoodFacts(
+        indexed_products={"111": product_payload, "222": {**product_payload, "product_name_fr": "Oeufs"}},
+        v3_products={"333": product_payload},
+    )
+
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.OFF_BULK_SEARCH_ENABLED", True),
+        patch("app.config.http_client.client.get", side_effect=fake_off.get),
+    ):
+        results = await get_pain_reports_batch(barcodes=["111", "222", "333", "444"], locale="fr")
+
+    assert len(fake_off.search_requests) == 1
+    assert fake_off.search_requests[0]["q"] == "code:111 OR code:222 OR code:333 OR code:444"
+    # Only the codes missing from the search index are fetched from OFF API v3
+    assert set(fake_off.v3_requests) == {"333", "444"}
+    assert isinstance(results["111"], PainReport)
+    assert isinstance(results["222"], PainReport)
+    assert results["222"].product_name == "Oeufs"
+    assert isinstance(results["333"], PainReport)
+    assert isinstance(results["444"], ResourceNotFoundException)
+
+
+@pytest.mark.asyncio
+async def test_bulk_search_follows_pages_and_splits_codes_into_queries(product_payload: dict):
+    barcodes = [str(code) for code in range(100, 105)]
+    fake_off = FakeOpenFoodFacts(indexed_products={code: product_payload for code in barcodes}, v3_products={})
+
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.OFF_BULK_SEARCH_CODES_PER_QUERY", 3),
+        patch("app.business.open_food_facts.knowledge_panel_service.OFF_BULK_SEARCH_PAGE_SIZE", 2),
+        patch("app.config.http_client.client.get", side_effect=fake_off.get),
+    ):
+        products = await get_products_data_from_off_search_a_licious(barcodes, locale="en")
+
+    assert sorted(products) == barcodes
+    # 2 queries (3 + 2 codes), the first one over 2 pages
+    assert sorted((request["q"].count("code:"), request["page"]) for request in fake_off.search_requests) == [
+        (2, "1"),
+        (3, "1"),
+        (3, "2"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_bulk_search_queries_run_concurrently(product_payload: dict):
+    barcodes = [str(code) for code in range(100, 106)]
+    fake_off = FakeOpenFoodFacts(indexed_products={code: product_payload for code in barcodes}, v3_products={})
+    in_flight, max_in_flight = 0, 0
+
+    async def get(url: str, **kwargs) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return await fake_off.get(url, **kwargs)
+
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.OFF_BULK_SEARCH_CODES_PER_QUERY", 2),
+        patch("app.config.http_client.client.get", side_effect=get),
+    ):
+        products = await get_products_data_from_off_search_a_licious(barcodes, locale="en")
+
+    assert sorted(products) == barcodes
+    # The 3 queries overlap, within the concurrency limit of the host
+    assert max_in_flight > 1
+
+
+@pytest.mark.asyncio
+async def test_batch_falls_back_to_v3_when_the_bulk_search_fails(product_payload: dict):
+    fake_off = FakeOpenFoodFacts(indexed_products={}, v3_products={"111": product_payload, "222": product_payload})
+
+    async def get(url: str, **kwargs) -> httpx.Response:
+        if url == SEARCH_A_LICIOUS_URL:
+            raise httpx.ConnectError("search-a-licious is down")
+        return await fake_off.get(url, **kwargs)
+
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.OFF_BULK_SEARCH_ENABLED", True),
+        patch("app.config.http_client.client.get", side_effect=get),
+        patch("app.config.http_client.asyncio.sleep", new_callable=AsyncMock),
+    ):
+        results = await get_pain_reports_batch(barcodes=["111", "222"], locale="en")
+
+    assert sorted(fake_off.v3_requests) == ["111", "222"]
+    assert all(isinstance(result, PainReport) for result in results.values())
+
+
+@pytest.mark.asyncio
+async def test_batch_does_not_search_for_cached_products(product_payload: dict):
+    fake_off = FakeOpenFoodFacts(indexed_products={}, v3_products={"111": product_payload, "222": product_payload})
+
+    with patch("app.config.http_client.client.get", side_effect=fake_off.get):
+        await get_pain_reports_batch(barcodes=["111"], locale="en")
+
+        with patch("app.business.open_food_facts.knowledge_panel_service.OFF_BULK_SEARCH_ENABLED", True):
+            await get_pain_reports_batch(barcodes=["111", "222"], locale="en")
+
+    # "222" is the only product left to fetch: a single product is not worth a search
+    assert fake_off.search_requests == []
+    assert fake_off.v3_requests == ["111", "222"]
+
+
+# --- egg barcode index ---
+
+
+@pytest.fixture
+def egg_barcode_index(tmp_path) -> Iterator[ReloadableBarcodeIndex]:
+    path = tmp_path / "egg_barcodes.idx"
+    write_barcode_index(path, egg_barcodes=["111"], other_barcodes=["222", "333"])
+    index = ReloadableBarcodeIndex(path)
+    index.reload_if_changed()
+    with patch("app.business.open_food_facts.knowledge_panel_service.egg_barcode_index", index):
+        yield index
+    index.close()
+
+
+@pytest.mark.asyncio
+async def test_products_which_are_not_eggs_are_answered_without_upstream_request(
+    egg_barcode_index: ReloadableBarcodeIndex,
+):
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3", new_callable=AsyncMock
+    ) as mock_get_data:
+        with pytest.raises(ResourceNotFoundException, match="No animal types found"):
+            await get_pain_reports(barcode="222", locale="en")
+        with pytest.raises(ResourceNotFoundException, match="No animal types found"):
+            await check_knowledge_panel_exists(barcode="333", locale="en")
+
+    mock_get_data.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_eggs_and_unknown_products_are_fetched_despite_the_barcode_index(
+    egg_barcode_index: ReloadableBarcodeIndex, sample_product_data: ProductData
+):
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_data_from_off_v3",
+        new_callable=AsyncMock,
+        return_value=sample_product_data,
+    ) as mock_get_data:
+        await get_pain_reports(barcode="111", locale="en")
+        await get_pain_reports(barcode="444", locale="en")
+
+    assert mock_get_data.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_does_not_search_for_products_which_are_not_eggs(
+    egg_barcode_index: ReloadableBarcodeIndex, product_payload: dict
+):
+    fake_off = FakeOpenFoodFacts(indexed_products={"111": product_payload, "444": product_payload}, v3_products={})
+
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.OFF_BULK_SEARCH_ENABLED", True),
+        patch("app.config.http_client.client.get", side_effect=fake_off.get),
+    ):
+        results = await get_pain_reports_batch(barcodes=["111", "222", "444"], locale="en")
+
+    assert fake_off.search_requests[0]["q"] == "code:111 OR code:444"
+    assert fake_off.v3_requests == []
+    assert isinstance(results["222"], ResourceNotFoundException)
+
+
+# --- local product store ---
+
+
+@pytest.fixture
+def stored_product_payload(tmp_path, product_payload: dict) -> Iterator[dict]:
+    path = tmp_path / "products.sqlite"
+    write_product_store(path, [("111", {**product_payload, "product_name_fr": "Oeufs"})])
+    store = ProductStore(path)
+    store.reload_if_changed()
+    with patch("app.business.open_food_facts.knowledge_panel_service.product_store", store):
+        yield product_payload
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_stored_products_are_not_fetched_from_off(stored_product_payload: dict):
+    fake_off = FakeOpenFoodFacts(indexed_products={}, v3_products={"222": stored_product_payload})
+
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.OFF_BULK_SEARCH_ENABLED", True),
+        patch("app.config.http_client.client.get", side_effect=fake_off.get),
+    ):
+        results = await get_pain_reports_batch(barcodes=["111", "222"], locale="fr")
+
+    # "222" is the only product left to fetch: a single product is not worth a search
+    assert fake_off.search_requests == []
+    assert fake_off.v3_requests == ["222"]
+    assert isinstance(results["111"], PainReport)
+    assert results["111"].product_name == "Oeufs"
+    assert isinstance(results["222"], PainReport)
+
+
+@pytest.mark.asyncio
+async def test_stale_stored_products_are_fetched_from_off_first(stored_product_payload: dict):
+    fake_off = FakeOpenFoodFacts(indexed_products={}, v3_products={"111": stored_product_payload})
+
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.product_store.max_age_seconds", 60),
+        patch("app.business.open_food_facts.knowledge_panel_service.product_store.created_at", 0),
+        patch("app.config.http_client.client.get", side_effect=fake_off.get),
+    ):
+        result = await get_pain_reports(barcode="111", locale="fr")
+
+    assert fake_off.v3_requests == ["111"]
+    assert result.product_name == stored_product_payload["product_name"]
+
+
+@pytest.mark.asyncio
+async def test_stale_stored_products_are_used_when_off_fails(stored_product_payload: dict):
+    with (
+        patch("app.business.open_food_facts.knowledge_panel_service.product_store.max_age_seconds", 60),
+        patch("app.business.open_food_facts.knowledge_panel_service.product_store.created_at", 0),
+        patch(
+            "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+            new_callable=AsyncMock,
+            side_effect=httpx.ConnectError("OFF is down"),
+        ),
+    ):
+        result = await get_pain_reports(barcode="111", locale="fr")
+
+    assert result.product_name == "Oeufs"
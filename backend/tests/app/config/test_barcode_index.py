@@ -0,0 +1,123 @@
+import os
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.config.barcode_index import (
+    BarcodeIndex,
+    ReloadableBarcodeIndex,
+    barcode_to_int,
+    refresh_barcode_index,
+    write_barcode_index,
+)
+
+EGG_BARCODES = ["3000000000001", "0061719011930", "3000000000099"]
+OTHER_BARCODES = [str(3_100_000_000_000 + i) for i in range(5000)]
+
+
+@pytest.fixture
+def index_path(tmp_path: Path) -> Path:
+    path = tmp_path / "egg_barcodes.idx"
+    write_barcode_index(path, egg_barcodes=EGG_BARCODES, other_barcodes=OTHER_BARCODES + ["not-a-barcode"])
+    return path
+
+
+@pytest.mark.parametrize(
+    "barcode,expected",
+    [("3000000000001", 3000000000001), ("0061719011930", 61719011930), ("12a4", None), ("٣٤", None), ("1" * 20, None)],
+)
+def test_barcode_to_int(barcode: str, expected: int | None):
+    assert barcode_to_int(barcode) == expected
+
+
+def test_index_answers_other_products_as_not_eggs(index_path: Path):
+    index = BarcodeIndex(index_path)
+
+    assert index.egg_count == len(EGG_BARCODES)
+    assert all(index.is_definitely_not_egg(barcode) for barcode in OTHER_BARCODES)
+    assert not any(index.is_definitely_not_egg(barcode) for barcode in EGG_BARCODES)
+    # Leading zeros are not significant
+    assert not index.is_definitely_not_egg("61719011930")
+    # Barcodes which cannot be indexed are unknown
+    assert not index.is_definitely_not_egg("not-a-barcode")
+    index.close()
+
+
+def test_unknown_barcodes_are_rarely_answered_as_not_eggs(index_path: Path):
+    index = BarcodeIndex(index_path)
+
+    false_positives = sum(index.is_definitely_not_egg(str(5_000_000_000_000 + i)) for i in range(20_000))
+
+    # The default false positive rate is 0.1%
+    assert false_positives < 60
+    index.close()
+
+
+def test_invalid_index_files_are_rejected(tmp_path: Path, index_path: Path):
+    not_an_index = tmp_path / "not_an_index"
+    not_an_index.write_bytes(b"x" * 64)
+    truncated = tmp_path / "truncated"
+    truncated.write_bytes(index_path.read_bytes()[:-1])
+
+    with pytest.raises(ValueError, match="not a barcode index"):
+        BarcodeIndex(not_an_index)
+    with pytest.raises(ValueError, match="truncated"):
+        BarcodeIndex(truncated)
+
+
+def test_reloadable_index_loads_the_file_again_when_it_is_replaced(index_path: Path):
+    index = ReloadableBarcodeIndex(index_path)
+    assert not index.is_definitely_not_egg(OTHER_BARCODES[0])
+
+    assert index.reload_if_changed()
+    assert not index.reload_if_changed()
+    assert index.is_definitely_not_egg(OTHER_BARCODES[0])
+
+    write_barcode_index(index_path, egg_barcodes=[OTHER_BARCODES[0]], other_barcodes=EGG_BARCODES)
+    # Make sure the modification time differs on file systems with a coarse resolution
+    os.utime(index_path, ns=(0, 0))
+
+    assert index.reload_if_changed()
+    assert not index.is_definitely_not_egg(OTHER_BARCODES[0])
+    assert index.is_definitely_not_egg(EGG_BARCODES[0])
+    index.close()
+
+
+def test_reloadable_index_keeps_the_loaded_file_when_the_new_one_is_invalid(index_path: Path):
+    index = ReloadableBarcodeIndex(index_path)
+    index.reload_if_changed()
+
+    # Like the pipeline, replace the file instead of overwriting the memory-mapped one
+    corrupted = index_path.with_name("corrupted")
+    corrupted.write_bytes(b"corrupted")
+    os.replace(corrupted, index_path)
+
+    assert not index.reload_if_changed()
+    assert index.is_definitely_not_egg(OTHER_BARCODES[0])
+    index.close()
+
+
+def test_reloadable_index_without_file(tmp_path: Path):
+    for index in (ReloadableBarcodeIndex(None), ReloadableBarcodeIndex(tmp_path / "missing.idx")):
+        assert not index.reload_if_changed()
+        assert not index.loaded
+        assert not index.is_definitely_not_egg(OTHER_BARCODES[0])
+
+
+@pytest.mark.asyncio
+async def test_refresh_barcode_index_reloads_periodically(index_path: Path):
+    index = ReloadableBarcodeIndex(index_path)
+
+    with (
+        patch(
+            "app.config.barcode_index.asyncio.sleep",
+            new_callable=AsyncMock,
+            side_effect=[None, None, StopAsyncIteration],
+        ),
+        patch.object(index, "reload_if_changed") as mock_reload,
+    ):
+        with pytest.raises(StopAsyncIteration):
+            await refresh_barcode_index(index, interval_seconds=60)
+
+    assert mock_reload.call_count == 2
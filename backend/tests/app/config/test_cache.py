@@ -1,8 +1,24 @@
-from unittest.mock import patch
+import asyncio
+import gzip
+import sqlite3
+import time
+import zlib
+from unittest.mock import Mock, patch
 
 import pytest
 
-from app.config.cache import CacheEntry, SimpleCache
+from app.config.cache import (
+    CacheEntry,
+    EncodedResponse,
+    EncodedResponseCodec,
+    PydanticCodec,
+    SimpleCache,
+    SqliteCacheBackend,
+    compute_etag,
+    estimate_size,
+    sweep_expired_entries,
+)
+from app.schemas.open_food_facts.internal import KnowledgePanelResponse, ProductInfo
 
 
 @pytest.fixture
@@ -85,3 +101,273 @@ def test_cleanup_expired_with_no_expired_entries_returns_zero(cache: SimpleCache
     cache.set("key", "value", ttl_seconds=1000)
 
     assert cache.cleanup_expired() == 0
+
+
+def test_least_recently_used_entry_is_evicted_when_max_entries_is_reached():
+    cache = SimpleCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.get("a")  # "a" becomes the most recently used entry
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats().evictions == 1
+
+
+def test_entries_are_evicted_to_stay_within_the_byte_budget():
+    cache = SimpleCache(max_bytes=10)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    cache.set("c", b"123")
+
+    assert cache.get("a") is None
+    assert cache.get("b") == b"12345"
+    assert cache.get("c") == b"123"
+    assert cache.stats().size_bytes == 8
+
+
+def test_value_larger_than_the_byte_budget_is_not_stored():
+    cache = SimpleCache(max_bytes=10)
+    cache.set("small", b"123")
+
+    cache.set("huge", b"x" * 11)
+
+    assert cache.get("huge") is None
+    assert cache.get("small") == b"123"
+
+
+def test_overwriting_a_key_keeps_the_size_accounting_consistent():
+    cache = SimpleCache(max_bytes=100)
+    cache.set("key", b"x" * 40)
+    cache.set("key", b"x" * 10)
+
+    assert cache.stats().size_bytes == 10
+    assert len(cache) == 1
+
+
+def test_stats_count_hits_misses_and_expirations(cache: SimpleCache):
+    with patch("app.config.cache.time.time", return_value=1_000.0):
+        cache.set("key", "value", ttl_seconds=10)
+        cache.get("key")
+        cache.get("missing")
+
+    with patch("app.config.cache.time.time", return_value=1_011.0):
+        cache.get("key")
+
+    stats = cache.stats()
+    assert stats.hits == 1
+    assert stats.misses == 2
+    assert stats.expirations == 1
+    assert stats.entries == 0
+
+
+def test_stale_entry_is_only_served_by_get_with_staleness(cache: SimpleCache):
+    with patch("app.config.cache.time.time", return_value=1_000.0):
+        cache.set("key", "value", ttl_seconds=10, stale_ttl_seconds=100)
+        assert cache.get_with_staleness("key") == ("value", False)
+
+    with patch("app.config.cache.time.time", return_value=1_050.0):
+        assert cache.get("key") is None
+        assert cache.get_with_staleness("key") == ("value", True)
+
+    with patch("app.config.cache.time.time", return_value=1_111.0):
+        assert cache.get_with_staleness("key") is None
+
+    stats = cache.stats()
+    assert stats.stale_hits == 1
+    assert stats.expirations == 1
+
+
+def test_cleanup_expired_keeps_stale_entries(cache: SimpleCache):
+    with patch("app.config.cache.time.time", return_value=1_000.0):
+        cache.set("stale", "value", ttl_seconds=10, stale_ttl_seconds=100)
+        cache.set("expired", "value", ttl_seconds=10)
+
+    with patch("app.config.cache.time.time", return_value=1_050.0):
+        assert cache.cleanup_expired() == 1
+
+    assert "stale" in cache._cache
+    assert "expired" not in cache._cache
+
+
+@pytest.mark.asyncio
+async def test_sweeper_periodically_removes_expired_entries(cache: SimpleCache):
+    with patch("app.config.cache.time.time", return_value=1_000.0):
+        cache.set("key", "value", ttl_seconds=5)
+
+    with patch("app.config.cache.time.time", return_value=1_010.0):
+        sweeper = asyncio.create_task(sweep_expired_entries(cache, interval_seconds=0.001))
+        await asyncio.sleep(0.01)
+        sweeper.cancel()
+
+    assert "key" not in cache._cache
+
+
+# --- Shared backend ---
+
+
+@pytest.fixture
+def sqlite_path(tmp_path) -> str:
+    return str(tmp_path / "cache.sqlite3")
+
+
+def _shared_cache(path: str) -> SimpleCache:
+    return SimpleCache(backend=SqliteCacheBackend(path), codec=PydanticCodec(KnowledgePanelResponse))
+
+
+@pytest.fixture
+def panel() -> KnowledgePanelResponse:
+    return KnowledgePanelResponse(panels={}, product=ProductInfo(image_url=None, name="Fake product name"))
+
+
+def test_value_set_by_one_replica_is_served_to_another(sqlite_path: str, panel: KnowledgePanelResponse):
+    replica_1 = _shared_cache(sqlite_path)
+    replica_2 = _shared_cache(sqlite_path)
+
+    replica_1.set("key", panel, ttl_seconds=60)
+
+    assert replica_2.get("key") == panel
+    # The value is now held in the local L1 of the second replica
+    assert "key" in replica_2._cache
+
+
+def test_backend_entry_keeps_its_remaining_ttl_in_the_local_copy(sqlite_path: str, panel: KnowledgePanelResponse):
+    replica_1 = _shared_cache(sqlite_path)
+    replica_2 = _shared_cache(sqlite_path)
+
+    with patch("app.config.cache.time.time", return_value=1_000.0):
+        replica_1.set("key", panel, ttl_seconds=100)
+
+    with patch("app.config.cache.time.time", return_value=1_060.0):
+        replica_2.get("key")
+
+    assert replica_2._cache["key"].ttl_seconds == 40
+
+
+def test_expired_backend_entry_is_a_miss(sqlite_path: str, panel: KnowledgePanelResponse):
+    replica_1 = _shared_cache(sqlite_path)
+    replica_2 = _shared_cache(sqlite_path)
+
+    with patch("app.config.cache.time.time", return_value=1_000.0):
+        replica_1.set("key", panel, ttl_seconds=10)
+
+    with patch("app.config.cache.time.time", return_value=1_011.0):
+        assert replica_2.get("key") is None
+        assert replica_1.cleanup_expired() == 1
+
+    assert replica_1.backend is not None
+    assert replica_1.backend.get("key") is None
+
+
+def test_delete_removes_the_key_from_the_shared_backend(sqlite_path: str, panel: KnowledgePanelResponse):
+    replica_1 = _shared_cache(sqlite_path)
+    replica_2 = _shared_cache(sqlite_path)
+    replica_1.set("key", panel)
+
+    assert replica_2.delete("key") is True
+    assert replica_1.backend is not None
+    assert replica_1.backend.get("key") is None
+
+
+def test_backend_stores_a_compact_encoding_rather_than_a_repr(sqlite_path: str, panel: KnowledgePanelResponse):
+    cache = _shared_cache(sqlite_path)
+    cache.set("key", panel)
+
+    assert cache.backend is not None
+    stored = cache.backend.get("key")
+    assert stored is not None
+    assert zlib.decompress(stored[0]) == panel.model_dump_json().encode("utf-8")
+
+
+def test_backend_errors_are_treated_as_misses(panel: KnowledgePanelResponse):
+    backend = Mock()
+    backend.get.side_effect = sqlite3.OperationalError("database is locked")
+    backend.set.side_effect = sqlite3.OperationalError("database is locked")
+    cache = SimpleCache(backend=backend, codec=PydanticCodec(KnowledgePanelResponse))
+
+    cache.set("key", panel)
+    cache.delete("key")
+
+    assert cache.get("key") is None
+
+
+def test_backend_clear_errors_are_logged_and_ignored():
+    backend = Mock()
+    backend.clear.side_effect = sqlite3.OperationalError("disk I/O error")
+    cache = SimpleCache(backend=backend, codec=PydanticCodec(KnowledgePanelResponse))
+    cache.set("key", KnowledgePanelResponse(panels={}, product=ProductInfo(image_url=None, name="name")))
+
+    cache.clear()
+
+    assert len(cache) == 0
+
+
+def test_sqlite_backend_gives_up_quickly_when_another_replica_holds_the_lock(
+    sqlite_path: str, panel: KnowledgePanelResponse
+):
+    cache = _shared_cache(sqlite_path)
+    cache.set("key", panel, ttl_seconds=60)
+    other_replica = sqlite3.connect(sqlite_path, isolation_level=None)
+    other_replica.execute("BEGIN IMMEDIATE")
+
+    started_at = time.perf_counter()
+    with patch("app.config.cache.logger.warning") as mock_warning:
+        cache.set("other_key", panel, ttl_seconds=60)
+        assert cache.backend is not None
+        assert cache.backend.delete("key") is False
+        assert cache.backend.cleanup_expired() == 0
+    elapsed = time.perf_counter() - started_at
+    other_replica.rollback()
+    other_replica.close()
+
+    # Skipped writes are not errors
+    mock_warning.assert_not_called()
+    assert elapsed < 0.5
+    # Readers are not blocked by the writer
+    assert cache.backend.get("key") is not None
+    assert cache.backend.get("other_key") is None
+
+
+def test_backend_requires_a_codec(sqlite_path: str):
+    with pytest.raises(ValueError, match="codec"):
+        SimpleCache(backend=SqliteCacheBackend(sqlite_path))
+
+
+# --- Encoded responses ---
+
+
+def test_encoded_response_skips_none_fields(panel: KnowledgePanelResponse):
+    encoded = EncodedResponse.from_model(panel)
+
+    assert encoded.body == b'{"panels":{},"product":{"name":"Fake product name"}}'
+    assert encoded.gzip_body is None
+
+
+def test_encoded_response_keeps_a_gzipped_copy_when_enabled(panel: KnowledgePanelResponse):
+    encoded = EncodedResponse.from_model(panel, gzip_level=6)
+
+    assert encoded.gzip_body is not None
+    assert gzip.decompress(encoded.gzip_body) == encoded.body
+    assert estimate_size(encoded) == len(encoded.body) + len(encoded.gzip_body)
+
+
+def test_encoded_response_etag_depends_on_the_body_and_the_version(panel: KnowledgePanelResponse):
+    encoded = EncodedResponse.from_model(panel, version="1")
+
+    assert encoded.etag == compute_etag(encoded.body, "1")
+    assert encoded.etag.startswith('"') and encoded.etag.endswith('"')
+    assert encoded.etag != EncodedResponse.from_model(panel, version="2").etag
+    assert encoded.etag != compute_etag(encoded.body + b" ", "1")
+
+
+def test_encoded_responses_are_shared_through_the_backend(sqlite_path: str, panel: KnowledgePanelResponse):
+    replica_1 = SimpleCache(backend=SqliteCacheBackend(sqlite_path), codec=EncodedResponseCodec())
+    replica_2 = SimpleCache(backend=SqliteCacheBackend(sqlite_path), codec=EncodedResponseCodec(gzip_level=6))
+
+    replica_1.set("key", EncodedResponse.from_model(panel, version="1"))
+
+    # Each replica pre-compresses the body with its own settings, the ETag is kept
+    assert replica_2.get("key") == EncodedResponse.from_model(panel, gzip_level=6, version="1")
@@ -1,9 +1,28 @@
+import asyncio
 from unittest.mock import AsyncMock, patch
 
 import httpx
 import pytest
 
-from app.config.http_client import get_with_retry
+from app.config.exceptions import ExternalServiceException
+from app.config.http_client import (
+    CIRCUIT_BREAKER_MIN_REQUESTS,
+    DEFAULT_CONCURRENCY_LIMITS,
+    HEDGE_DEFAULT_DELAY_SECONDS,
+    HOST_CONCURRENCY_LIMITS,
+    RETRY_AFTER_MAX_SECONDS,
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    ConcurrencyLimits,
+    get_circuit_breaker,
+    get_limiter,
+    get_with_retry,
+    hedge_delay,
+)
+from app.config.metrics import UPSTREAM_RESPONSES
+
+LIMITS = ConcurrencyLimits(min_limit=1, initial_limit=4, max_limit=8, latency_threshold_seconds=1.0)
 
 
 def _make_response(status_code: int = 200) -> httpx.Response:
@@ -93,29 +112,319 @@ async def test_http_status_error_is_retried_like_a_transient_error():
 
 
 @pytest.mark.asyncio
-async def test_concurrent_requests_are_capped_by_the_semaphore():
+@pytest.mark.parametrize("status_code", [400, 403, 404, 410])
+async def test_client_errors_are_not_retried(status_code: int):
+    with (
+        patch(
+            "app.config.http_client.client.get", new_callable=AsyncMock, return_value=_make_response(status_code)
+        ) as mock_get,
+        patch("app.config.http_client.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+    ):
+        with pytest.raises(httpx.HTTPStatusError):
+            await get_with_retry("https://example.com", retries=3)
+
+    assert mock_get.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_capped_by_the_limiter():
     """
-    The shared semaphore limits in-flight requests to 3. This test issues 6 concurrent
+    The limiter of a host starts with its initial limit. This test issues 6 concurrent
     calls and checks that the observed number of simultaneously "in-progress" calls
-    never exceeds that cap.
+    never exceeds that limit.
     """
-    import asyncio
-
     in_flight = 0
     max_in_flight = 0
-    lock = asyncio.Lock()
 
     async def fake_get(url, **kwargs):
         nonlocal in_flight, max_in_flight
-        async with lock:
-            in_flight += 1
-            max_in_flight = max(max_in_flight, in_flight)
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
         await asyncio.sleep(0.01)
-        async with lock:
-            in_flight -= 1
+        in_flight -= 1
         return _make_response()
 
     with patch("app.config.http_client.client.get", new_callable=AsyncMock, side_effect=fake_get):
         await asyncio.gather(*[get_with_retry("https://example.com") for _ in range(6)])
 
-    assert max_in_flight <= 3
+    assert max_in_flight == DEFAULT_CONCURRENCY_LIMITS.initial_limit
+
+
+@pytest.mark.asyncio
+async def test_each_upstream_host_has_its_own_limiter():
+    assert get_limiter("world.openfoodfacts.org").limits == HOST_CONCURRENCY_LIMITS["world.openfoodfacts.org"]
+    assert get_limiter("search.openfoodfacts.org").limits == HOST_CONCURRENCY_LIMITS["search.openfoodfacts.org"]
+    assert get_limiter("example.com").limits == DEFAULT_CONCURRENCY_LIMITS
+    assert get_limiter("example.com") is get_limiter("example.com")
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_additively_on_fast_successes():
+    limiter = AdaptiveConcurrencyLimiter(LIMITS)
+
+    for _ in range(4):
+        async with limiter.slot():
+            pass
+
+    # +1/limit per success: about +1 once a full window of 4 requests succeeded
+    assert 4.9 < limiter.limit < 5.0
+
+
+@pytest.mark.asyncio
+async def test_limit_never_grows_beyond_the_max_limit():
+    limiter = AdaptiveConcurrencyLimiter(LIMITS)
+
+    for _ in range(100):
+        async with limiter.slot():
+            pass
+
+    assert limiter.limit == LIMITS.max_limit
+
+
+@pytest.mark.asyncio
+async def test_limit_is_halved_when_the_upstream_is_overloaded():
+    limiter = AdaptiveConcurrencyLimiter(LIMITS)
+
+    async with limiter.slot() as slot:
+        slot.overloaded = True
+    assert limiter.limit == 2
+
+    for _ in range(3):
+        async with limiter.slot() as slot:
+            slot.overloaded = True
+    assert limiter.limit == LIMITS.min_limit
+
+
+@pytest.mark.asyncio
+async def test_slow_responses_reduce_the_limit():
+    limiter = AdaptiveConcurrencyLimiter(LIMITS)
+
+    with patch("app.config.http_client.time.monotonic", side_effect=[0.0, LIMITS.latency_threshold_seconds + 1]):
+        async with limiter.slot():
+            pass
+
+    assert limiter.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_responses_reduce_the_limit_of_their_host():
+    with (
+        patch("app.config.http_client.client.get", new_callable=AsyncMock, return_value=_make_response(429)),
+        patch("app.config.http_client.asyncio.sleep", new_callable=AsyncMock),
+    ):
+        with pytest.raises(httpx.HTTPStatusError):
+            await get_with_retry("https://example.com", retries=1)
+
+    assert get_limiter("example.com").limit < DEFAULT_CONCURRENCY_LIMITS.initial_limit
+
+
+@pytest.mark.asyncio
+async def test_retry_sleep_does_not_hold_a_concurrency_slot():
+    slots_held_while_sleeping = []
+
+    async def fake_sleep(delay):
+        slots_held_while_sleeping.append(get_limiter("example.com").in_flight)
+
+    with (
+        patch("app.config.http_client.client.get", new_callable=AsyncMock) as mock_get,
+        patch("app.config.http_client.asyncio.sleep", side_effect=fake_sleep),
+    ):
+        mock_get.side_effect = [httpx.ReadTimeout("timeout"), _make_response()]
+        await get_with_retry("https://example.com", retries=2)
+
+    assert slots_held_while_sleeping == [0]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_header_of_a_429_is_honoured():
+    rate_limited = httpx.Response(
+        429, request=httpx.Request("GET", "https://example.com"), headers={"Retry-After": "7"}
+    )
+
+    with (
+        patch("app.config.http_client.client.get", new_callable=AsyncMock) as mock_get,
+        patch("app.config.http_client.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+    ):
+        mock_get.side_effect = [rate_limited, _make_response()]
+        await get_with_retry("https://example.com", retries=2, base_delay=1.0)
+
+    mock_sleep.assert_called_once_with(7.0)
+
+
+@pytest.mark.asyncio
+async def test_retry_after_header_above_the_maximum_fails_fast():
+    rate_limited = httpx.Response(
+        429,
+        request=httpx.Request("GET", "https://example.com"),
+        headers={"Retry-After": str(RETRY_AFTER_MAX_SECONDS + 1)},
+    )
+
+    with (
+        patch("app.config.http_client.client.get", new_callable=AsyncMock) as mock_get,
+        patch("app.config.http_client.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+    ):
+        mock_get.side_effect = [rate_limited, _make_response()]
+        with pytest.raises(ExternalServiceException) as exc_info:
+            await get_with_retry("https://example.com", retries=2)
+
+    assert exc_info.value.status_code == 503
+    assert mock_get.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_hands_its_slot_over_to_the_next_one():
+    limiter = AdaptiveConcurrencyLimiter(ConcurrencyLimits(1, 1, 1, 10.0))
+    release = asyncio.Event()
+    order = []
+
+    async def request(name: str):
+        async with limiter.slot():
+            order.append(name)
+            await release.wait()
+
+    first = asyncio.create_task(request("first"))
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(request("cancelled"))
+    third = asyncio.create_task(request("third"))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    release.set()
+    await asyncio.gather(first, third)
+
+    assert order == ["first", "third"]
+    assert limiter.in_flight == 0
+
+
+# --- Circuit breaker ---
+
+
+def _open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.min_requests):
+        assert breaker.allow_request()
+        breaker.record(False)
+
+
+def test_circuit_breaker_opens_when_the_failure_rate_exceeds_the_threshold():
+    breaker = CircuitBreaker(failure_rate_threshold=0.5, window_size=10, min_requests=4)
+
+    for success in [True, False, False]:
+        breaker.record(success)
+    # Not enough requests yet to judge the upstream health
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_circuit_breaker_ignores_requests_without_outcome():
+    breaker = CircuitBreaker(min_requests=2)
+
+    for _ in range(5):
+        breaker.record(None)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_lets_a_single_probe_through_once_open_seconds_are_over():
+    breaker = CircuitBreaker(min_requests=2, open_seconds=30)
+    with patch("app.config.http_client.time.monotonic", return_value=100.0):
+        _open_breaker(breaker)
+
+    with patch("app.config.http_client.time.monotonic", return_value=131.0):
+        assert breaker.allow_request()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow_request()
+
+        breaker.record(True)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_circuit_breaker_opens_again_when_the_probe_fails():
+    breaker = CircuitBreaker(min_requests=2, open_seconds=30)
+    with patch("app.config.http_client.time.monotonic", return_value=100.0):
+        _open_breaker(breaker)
+
+    with patch("app.config.http_client.time.monotonic", return_value=131.0):
+        assert breaker.allow_request()
+        breaker.record(False)
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast_without_retrying():
+    _open_breaker(get_circuit_breaker("example.com"))
+
+    with (
+        patch("app.config.http_client.client.get", new_callable=AsyncMock) as mock_get,
+        patch("app.config.http_client.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+    ):
+        with pytest.raises(CircuitOpenError):
+            await get_with_retry("https://example.com", retries=3)
+
+    mock_get.assert_not_called()
+    mock_sleep.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_failing_upstream_opens_its_circuit_only():
+    with (
+        patch("app.config.http_client.client.get", new_callable=AsyncMock) as mock_get,
+        patch("app.config.http_client.asyncio.sleep", new_callable=AsyncMock),
+    ):
+        mock_get.side_effect = httpx.ConnectError("down")
+        for _ in range(CIRCUIT_BREAKER_MIN_REQUESTS):
+            with pytest.raises(httpx.ConnectError):
+                await get_with_retry("https://example.com", retries=1)
+
+    assert get_circuit_breaker("example.com").state == CircuitBreaker.OPEN
+    assert get_circuit_breaker("example.org").state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_not_found_responses_do_not_open_the_circuit():
+    with patch("app.config.http_client.client.get", new_callable=AsyncMock, return_value=_make_response(404)):
+        for _ in range(CIRCUIT_BREAKER_MIN_REQUESTS):
+            with pytest.raises(httpx.HTTPStatusError):
+                await get_with_retry("https://example.com", retries=1)
+
+    assert get_circuit_breaker("example.com").state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_upstream_responses_are_counted_by_status():
+    statuses = ("200", "503", "error")
+    before = {status: UPSTREAM_RESPONSES.labels("example.com", status).value for status in statuses}
+
+    with (
+        patch("app.config.http_client.client.get", new_callable=AsyncMock) as mock_get,
+        patch("app.config.http_client.asyncio.sleep", new_callable=AsyncMock),
+    ):
+        mock_get.side_effect = [httpx.ConnectError("down"), _make_response(503), _make_response(200)]
+        await get_with_retry("https://example.com", retries=3)
+
+    assert {status: UPSTREAM_RESPONSES.labels("example.com", status).value - before[status] for status in statuses} == {
+        "200": 1,
+        "503": 1,
+        "error": 1,
+    }
+
+
+# --- Hedging delay ---
+
+
+@pytest.mark.asyncio
+async def test_hedge_delay_is_the_p95_of_the_recent_latencies():
+    assert hedge_delay("example.com") == HEDGE_DEFAULT_DELAY_SECONDS
+
+    limiter = get_limiter("example.com")
+    for latency in range(1, 101):
+        limiter._latencies.append(latency / 100)
+
+    assert hedge_delay("example.com") == 0.96
@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from loguru import logger
+
+from app.config.logging import LogSampler, StageTimer, setup_logging
+
+
+@pytest.mark.parametrize("rate,expected_logs", [(1, 10), (0.5, 5), (0.25, 3), (0, 0)])
+def test_log_sampler_lets_through_a_share_of_the_logs(rate: float, expected_logs: int):
+    sampler = LogSampler(rate)
+
+    assert sum(sampler.should_log("route") for _ in range(10)) == expected_logs
+
+
+def test_log_sampler_counts_each_route_separately():
+    sampler = LogSampler(0.5)
+
+    assert sampler.should_log("route_1")
+    assert sampler.should_log("route_2")
+    assert not sampler.should_log("route_1")
+
+
+def test_log_sampler_rates_by_route():
+    sampler = LogSampler.from_config(0.01, "knowledge_panel=1, knowledge_panels_batch=0")
+
+    assert sampler.rates_by_route == {"knowledge_panel": 1.0, "knowledge_panels_batch": 0.0}
+    assert all(sampler.should_log("knowledge_panel") for _ in range(3))
+    assert not sampler.should_log("knowledge_panels_batch")
+    assert sampler.should_log("other")
+    assert not sampler.should_log("other")
+
+
+def test_stage_timer_records_each_stage():
+    with patch("app.config.logging.time.perf_counter", side_effect=[1.0, 1.5, 1.75]):
+        timer = StageTimer()
+        timer.lap("fetch")
+        timer.lap("render")
+
+    assert timer.timings_ms == {"fetch": 500.0, "render": 250.0}
+    assert timer.total_ms == 750.0
+
+
+@pytest.fixture
+def json_log_file(tmp_path: Path):
+    setup_logging(log_format="json", enqueue=False, log_dir=tmp_path)
+    yield tmp_path / "app.log"
+    setup_logging()
+
+
+def test_json_logs_hold_the_bound_fields(json_log_file: Path):
+    logger.bind(barcode="123456789", timings_ms={"render": 1.5}).info("Rendered")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Failed")
+    # Wait for the background writer of the file sink
+    logger.complete()
+
+    first, second = [json.loads(line) for line in json_log_file.read_text().splitlines()]
+    assert first["message"] == "Rendered"
+    assert first["level"] == "INFO"
+    assert first["barcode"] == "123456789"
+    assert first["timings_ms"] == {"render": 1.5}
+    assert "ValueError: boom" in second["exception"]
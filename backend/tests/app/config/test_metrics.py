@@ -0,0 +1,118 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from app.config.metrics import Counter, Gauge, Histogram, MetricsRegistry
+from app.schemas.open_food_facts.external import ProductData
+
+
+@pytest.fixture
+def registry() -> MetricsRegistry:
+    return MetricsRegistry()
+
+
+def test_counter_and_gauge_exposition(registry: MetricsRegistry):
+    counter = registry.register(Counter("upstream_responses", "Responses", labelnames=("host", "status")))
+    gauge = registry.register(Gauge("in_flight", "In flight")).labels()
+
+    counter.labels("example.com", "200").inc()
+    counter.labels("example.com", "200").inc(2)
+    counter.labels('exa"mple', "500").inc()
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+
+    assert registry.render().splitlines() == [
+        "# HELP upstream_responses Responses",
+        "# TYPE upstream_responses counter",
+        'upstream_responses_total{host="example.com",status="200"} 3',
+        'upstream_responses_total{host="exa\\"mple",status="500"} 1',
+        "# HELP in_flight In flight",
+        "# TYPE in_flight gauge",
+        "in_flight 1",
+    ]
+
+
+def test_histogram_buckets_are_cumulative(registry: MetricsRegistry):
+    histogram = registry.register(Histogram("stage_seconds", "Stages", labelnames=("stage",), buckets=(0.1, 1.0)))
+
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.labels("fetch").observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'stage_seconds_bucket{stage="fetch",le="0.1"} 2',
+        'stage_seconds_bucket{stage="fetch",le="1"} 3',
+        'stage_seconds_bucket{stage="fetch",le="+Inf"} 4',
+        'stage_seconds_sum{stage="fetch"} 2.65',
+        'stage_seconds_count{stage="fetch"} 4',
+    ]
+
+
+def test_histogram_times_a_block(registry: MetricsRegistry):
+    histogram = registry.register(Histogram("stage_seconds", "Stages", buckets=(1.0,)))
+
+    with patch("app.config.metrics.time.perf_counter", side_effect=[10.0, 10.25]):
+        with histogram.labels().time():
+            pass
+
+    assert histogram.labels().sum == 0.25
+
+
+def test_labels_must_match_the_label_names(registry: MetricsRegistry):
+    counter = registry.register(Counter("responses", "Responses", labelnames=("host",)))
+
+    with pytest.raises(ValueError, match="expects the labels"):
+        counter.labels("example.com", "200")
+
+
+def test_metric_names_are_unique(registry: MetricsRegistry):
+    registry.register(Counter("responses", "Responses"))
+
+    with pytest.raises(ValueError, match="already registered"):
+        registry.register(Gauge("responses", "Responses"))
+
+
+def test_collectors_are_called_at_scrape_time(registry: MetricsRegistry):
+    collector = MagicMock(return_value=[("entries", "gauge", "Entries", [("entries", {"cache": "panels"}, 3)])])
+    registry.register_collector(collector)
+    collector.assert_not_called()
+
+    assert registry.render().splitlines()[-1] == 'entries{cache="panels"} 3'
+
+
+def _sample_value(exposition: str, sample: str) -> float:
+    for line in exposition.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_the_stages_and_caches(
+    async_client: AsyncClient, sample_product_data: ProductData
+):
+    mock_response = MagicMock()
+    mock_response.json = MagicMock(return_value={"product": sample_product_data})
+    before = (await async_client.get("/metrics")).text
+
+    with patch(
+        "app.business.open_food_facts.knowledge_panel_service.get_with_retry",
+        new_callable=AsyncMock,
+        return_value=mock_response,
+    ):
+        await async_client.get("/off/v1/knowledge-panel/123456789")
+        await async_client.get("/off/v1/knowledge-panel/123456789")
+
+    response = await async_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    after = response.text
+    # The second request is a cache hit, which goes through none of the stages
+    for stage in ("off_fetch", "validation", "calculator_breeding_types", "calculator_quantities", "render"):
+        sample = f'app_stage_duration_seconds_count{{stage="{stage}"}}'
+        assert _sample_value(after, sample) == _sample_value(before, sample) + 1
+    assert _sample_value(after, 'app_cache_hits_total{cache="knowledge_panel"}') >= 1
+    assert _sample_value(after, 'app_cache_entries{cache="knowledge_panel"}') == 1
+    assert _sample_value(after, "app_http_requests_in_flight") == 1
@@ -1,10 +1,11 @@
 import pytest
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from fastapi.testclient import TestClient
 from starlette.requests import Request
 
 from app.config.exceptions import BaseAppException, ResourceNotFoundException
-from app.config.middlewares import GlobalExceptionMiddleware, add_locale_translator
+from app.config.middlewares import GlobalExceptionMiddleware, LocaleTranslatorMiddleware, resolve_locale
 
 # --- GlobalExceptionMiddleware ---
 
@@ -29,6 +30,22 @@ def _build_exception_test_app() -> FastAPI:
     async def ok():
         return {"status": "ok"}
 
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            yield b"first\n"
+            yield b"second\n"
+
+        return StreamingResponse(chunks())
+
+    @app.get("/boom-while-streaming")
+    async def boom_while_streaming():
+        async def chunks():
+            yield b"first\n"
+            raise ValueError("stream exploded")
+
+        return StreamingResponse(chunks())
+
     return app
 
 
@@ -71,16 +88,28 @@ def test_happy_path_is_unaffected_by_the_middleware(exception_client: TestClient
     assert response.json() == {"status": "ok"}
 
 
-# --- add_locale_translator ---
+def test_streaming_response_goes_through_the_middleware(exception_client: TestClient):
+    with exception_client.stream("GET", "/stream") as response:
+        assert list(response.iter_lines()) == ["first", "second"]
+
+
+def test_exception_after_the_response_started_is_not_turned_into_an_error_response(exception_client: TestClient):
+    """Once the status line is sent, the only option left is to let the server abort the response"""
+    with pytest.raises(ValueError, match="stream exploded"):
+        exception_client.get("/boom-while-streaming")
+
+
+# --- LocaleTranslatorMiddleware ---
 
 
 def _build_locale_test_app() -> FastAPI:
     app = FastAPI()
-    app.middleware("http")(add_locale_translator)
+    app.add_middleware(LocaleTranslatorMiddleware)
 
     @app.get("/locale")
     async def get_locale(request: Request):
-        return {"locale": request.state.locale}
+        gettext, _ = request.state.translator
+        return {"locale": request.state.locale, "laying_hen": gettext("Laying hen")}
 
     return app
 
@@ -122,3 +151,25 @@ def test_url_lang_param_is_case_insensitive(locale_client: TestClient):
     response = locale_client.get("/locale?lang=FR")
 
     assert response.json()["locale"] == "fr"
+
+
+def test_url_lang_param_is_found_among_other_params(locale_client: TestClient):
+    response = locale_client.get("/locale?code=123&lang=fr&other=1")
+
+    assert response.json()["locale"] == "fr"
+
+
+def test_translator_of_the_locale_is_added_to_the_request_state(locale_client: TestClient):
+    assert locale_client.get("/locale?lang=fr").json()["laying_hen"] == "Poule pondeuse"
+    assert locale_client.get("/locale?lang=en").json()["laying_hen"] == "Laying hen"
+
+
+def test_resolved_locale_is_memoized():
+    resolve_locale.cache_clear()
+
+    first = resolve_locale(None, "fr-FR,fr;q=0.9,en;q=0.8")
+    second = resolve_locale(None, "fr-FR,fr;q=0.9,en;q=0.8")
+
+    assert first[0] == "fr"
+    assert second is first
+    assert resolve_locale.cache_info().hits == 1
@@ -0,0 +1,104 @@
+import os
+import time
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.config.product_store import ProductStore, refresh_product_store, write_product_store
+
+EGG_PRODUCT = {"product_name": "Oeufs frais", "product_name_en": "Fresh eggs", "categories_tags": ["en:eggs"]}
+
+
+@pytest.fixture
+def store_path(tmp_path: Path) -> Path:
+    path = tmp_path / "products.sqlite"
+    write_product_store(path, [("3000000000001", EGG_PRODUCT)], created_at=1_700_000_000)
+    return path
+
+
+def test_store_returns_the_payload_of_its_products(store_path: Path):
+    store = ProductStore(store_path)
+    assert store.get_payload("3000000000001") is None
+
+    assert store.reload_if_changed()
+
+    assert store.created_at == 1_700_000_000
+    assert store.get_payload("3000000000001") == {"product": EGG_PRODUCT}
+    assert store.get_payload("3000000000002") is None
+    store.close()
+    assert not store.loaded
+
+
+def test_store_serializes_decimals(tmp_path: Path):
+    write_product_store(tmp_path / "products.sqlite", [("1", {"ingredients": [{"percent_estimate": Decimal("12.5")}]})])
+    store = ProductStore(tmp_path / "products.sqlite")
+    store.reload_if_changed()
+
+    assert store.get_payload("1") == {"product": {"ingredients": [{"percent_estimate": 12.5}]}}
+    store.close()
+
+
+@pytest.mark.parametrize("max_age_seconds,age_seconds,expected", [(0, 10**9, False), (60, 30, False), (60, 90, True)])
+def test_store_is_stale_when_the_snapshot_is_too_old(
+    tmp_path: Path, max_age_seconds: float, age_seconds: float, expected: bool
+):
+    write_product_store(tmp_path / "products.sqlite", [], created_at=time.time() - age_seconds)
+    store = ProductStore(tmp_path / "products.sqlite", max_age_seconds=max_age_seconds)
+    store.reload_if_changed()
+
+    assert store.is_stale() is expected
+    store.close()
+
+
+def test_store_is_opened_again_when_the_file_is_replaced(store_path: Path):
+    store = ProductStore(store_path)
+    store.reload_if_changed()
+    assert not store.reload_if_changed()
+
+    write_product_store(store_path, [("3000000000002", EGG_PRODUCT)])
+    # Make sure the modification time differs on file systems with a coarse resolution
+    os.utime(store_path, ns=(0, 0))
+
+    assert store.reload_if_changed()
+    assert store.get_payload("3000000000001") is None
+    assert store.get_payload("3000000000002") == {"product": EGG_PRODUCT}
+    store.close()
+
+
+def test_store_keeps_the_opened_file_when_the_new_one_is_invalid(store_path: Path):
+    store = ProductStore(store_path)
+    store.reload_if_changed()
+
+    invalid = store_path.with_name("invalid")
+    invalid.write_bytes(b"not a database")
+    os.replace(invalid, store_path)
+
+    assert not store.reload_if_changed()
+    assert store.get_payload("3000000000001") == {"product": EGG_PRODUCT}
+    store.close()
+
+
+def test_store_without_file(tmp_path: Path):
+    for store in (ProductStore(None), ProductStore(tmp_path / "missing.sqlite")):
+        assert not store.reload_if_changed()
+        assert store.get_payload("3000000000001") is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_product_store_reloads_periodically(store_path: Path):
+    store = ProductStore(store_path)
+
+    with (
+        patch(
+            "app.config.product_store.asyncio.sleep",
+            new_callable=AsyncMock,
+            side_effect=[None, None, StopAsyncIteration],
+        ),
+        patch.object(store, "reload_if_changed") as mock_reload,
+    ):
+        with pytest.raises(StopAsyncIteration):
+            await refresh_product_store(store, interval_seconds=60)
+
+    assert mock_reload.call_count == 2
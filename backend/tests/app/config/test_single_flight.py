@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.config.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_with_the_same_key_share_a_single_execution():
+    single_flight: SingleFlight[int] = SingleFlight()
+    calls = 0
+
+    async def work() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 42
+
+    results = await asyncio.gather(*[single_flight.do("key", work) for _ in range(5)])
+
+    assert results == [42] * 5
+    assert calls == 1
+    assert single_flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_different_keys_are_executed_separately():
+    single_flight: SingleFlight[str] = SingleFlight()
+
+    async def work(value: str) -> str:
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(single_flight.do("a", lambda: work("a")), single_flight.do("b", lambda: work("b")))
+
+    assert results == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_exception_is_propagated_to_every_waiting_caller():
+    single_flight: SingleFlight[int] = SingleFlight()
+
+    async def failing_work() -> int:
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failure")
+
+    results = await asyncio.gather(*[single_flight.do("key", failing_work) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert single_flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_key_is_forgotten_once_the_work_completes():
+    """Results are not cached: a call made after completion runs the work again."""
+    single_flight: SingleFlight[int] = SingleFlight()
+    calls = 0
+
+    async def work() -> int:
+        nonlocal calls
+        calls += 1
+        return calls
+
+    assert await single_flight.do("key", work) == 1
+    assert await single_flight.do("key", work) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_shared_work():
+    single_flight: SingleFlight[int] = SingleFlight()
+
+    async def work() -> int:
+        await asyncio.sleep(0.01)
+        return 42
+
+    first = asyncio.create_task(single_flight.do("key", work))
+    second = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == 42
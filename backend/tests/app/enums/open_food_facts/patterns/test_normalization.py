@@ -0,0 +1,57 @@
+import pytest
+
+from app.enums.open_food_facts.patterns.normalization import (
+    UNICODE_TRANSLATION_TABLE,
+    normalize_egg_caliber,
+    normalize_egg_count,
+    normalize_unicode,
+    normalize_weight,
+    normalize_words,
+)
+
+
+@pytest.mark.parametrize(
+    "s,expected",
+    [
+        (None, ""),
+        ("", ""),
+        ("Œufs élevés AU SOL*", "oeufs eleves au sol "),
+        ("12 œufs plein-air", "  oeufs plein air"),
+    ],
+)
+def test_normalize_words(s, expected):
+    assert normalize_words(s) == expected
+
+
+def test_normalize_unicode():
+    assert normalize_unicode("  Œufs  ﬁns ½  élevés ") == "Œufs fins 1⁄2 eleves"
+
+
+@pytest.mark.parametrize(
+    "s,expected",
+    [
+        ("", ""),
+        ("Boîte de 1 200 œufs", "boite de 1200 oeufs"),
+        ("53 - 63 g, 6%", ","),
+        ("one dozen omega 3 eggs, size 4", "1 dozen eggs,"),
+        ("x10 œufs (500 g)", "x10 oeufs"),
+    ],
+)
+def test_normalize_egg_count(s, expected):
+    assert normalize_egg_count(s) == expected
+
+
+def test_normalize_egg_caliber():
+    assert normalize_egg_caliber("Gros œufs, L' 63g+") == "gros oeufs l' g"
+
+
+def test_normalize_weight():
+    assert normalize_weight("1 200 G d'œufs") == "1200 g d'oeufs"
+
+
+def test_translation_table_is_completed_on_first_use():
+    code = ord("ﬀ")
+    assert code not in UNICODE_TRANSLATION_TABLE
+
+    assert "ﬀ".translate(UNICODE_TRANSLATION_TABLE) == "ff"
+    assert UNICODE_TRANSLATION_TABLE[code] == "ff"
@@ -1,4 +1,5 @@
 from typing import AsyncGenerator, List
+from unittest.mock import patch
 
 import pytest
 import pytest_asyncio
@@ -6,6 +7,8 @@ from httpx import ASGITransport, AsyncClient
 from pydantic import HttpUrl
 from starlette.testclient import TestClient
 
+from app.config import http_client
+from app.config.cache import knowledge_panel_cache, pain_report_cache, product_data_cache
 from app.enums.open_food_facts.enums import (
     AnimalType,
     EggQuantity,
@@ -25,6 +28,27 @@ from app.schemas.open_food_facts.internal import (
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Fixture that empties the product data and pain report caches before each test,
+    so that a product fetched by a previous test is never served from cache.
+    """
+    knowledge_panel_cache.clear()
+    product_data_cache.clear()
+    pain_report_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_upstream_state():
+    """
+    Fixture that gives each test fresh concurrency limiters and circuit breakers,
+    as they adapt to the requests (and failures) of the previous tests.
+    """
+    with patch.dict(http_client._limiters, clear=True), patch.dict(http_client._breakers, clear=True):
+        yield
+
+
 @pytest_asyncio.fixture
 async def async_client() -> AsyncGenerator[AsyncClient, None]:
     """
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The pipelines are scripts run from their folder, not a package: make them importable as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "pipelines"))
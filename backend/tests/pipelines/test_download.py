@@ -0,0 +1,234 @@
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+import requests
+from extract_egg_products import download_file, is_remote_file_unchanged, metadata_path, read_metadata
+
+CONTENT = bytes(range(256)) * 64
+
+
+@dataclass
+class RemoteFile:
+    """The file served by the test server, and how the server misbehaves"""
+
+    content: bytes = CONTENT
+    etag: str = '"v1"'
+    announce_sha256: str | None = None
+    # Number of next GET responses whose connection is closed after half of the body
+    truncate: int = 0
+    # Number of next Range requests answered with a 416 or with the whole file (200)
+    range_not_satisfiable: int = 0
+    ignore_range: int = 0
+    # Send the body chunked, with a Content-Length which does not match it
+    wrong_content_length: bool = False
+    requests: list[tuple[str, dict]] = field(default_factory=list)
+
+
+def _handler(remote: RemoteFile) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_headers(self, status: int, length: int, extra: dict | None = None) -> None:
+            self.send_response(status)
+            self.send_header("ETag", remote.etag)
+            if remote.announce_sha256:
+                self.send_header("X-Linked-Etag", f'"{remote.announce_sha256}"')
+            self.send_header("Content-Length", str(length))
+            for name, value in (extra or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+
+        def do_HEAD(self):
+            remote.requests.append(("HEAD", dict(self.headers)))
+            self._send_headers(200, len(remote.content))
+
+        def do_GET(self):
+            remote.requests.append(("GET", dict(self.headers)))
+            if self.headers.get("If-None-Match") == remote.etag:
+                self._send_headers(304, 0)
+                return
+
+            body, status, extra = remote.content, 200, {}
+            range_header = self.headers.get("Range")
+            if range_header and self.headers.get("If-Range") == remote.etag:
+                if remote.range_not_satisfiable:
+                    remote.range_not_satisfiable -= 1
+                    self._send_headers(416, 0)
+                    return
+                if remote.ignore_range:
+                    remote.ignore_range -= 1
+                else:
+                    start = int(range_header.removeprefix("bytes=").rstrip("-"))
+                    body, status = remote.content[start:], 206
+                    extra = {"Content-Range": f"bytes {start}-{len(remote.content) - 1}/{len(remote.content)}"}
+
+            if remote.wrong_content_length:
+                self._send_headers(status, len(body) + 10, {**extra, "Transfer-Encoding": "chunked"})
+                self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n0\r\n\r\n")
+                return
+
+            self._send_headers(status, len(body), extra)
+            if remote.truncate:
+                remote.truncate -= 1
+                self.wfile.write(body[: len(body) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+    return Handler
+
+
+@pytest.fixture
+def remote() -> RemoteFile:
+    return RemoteFile()
+
+
+@pytest.fixture
+def url(remote: RemoteFile) -> Iterator[str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(remote))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/food.parquet"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def small_chunks_and_no_sleep(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Chunks smaller than the truncated body, so that the resumed offset is exactly what was received
+    monkeypatch.setattr("extract_egg_products.Config.DOWNLOAD_CHUNK_SIZE", 1024)
+    monkeypatch.setattr("extract_egg_products.time.sleep", lambda seconds: None)
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> Path:
+    return tmp_path / "food.parquet"
+
+
+def _part_path(path: Path) -> Path:
+    return path.with_name(path.name + ".part")
+
+
+def test_unchanged_file_is_not_downloaded_again(url: str, path: Path, remote: RemoteFile):
+    assert download_file(url, path)
+    assert path.read_bytes() == CONTENT
+    assert read_metadata(path)["etag"] == remote.etag
+
+    assert not download_file(url, path)
+    assert remote.requests[-1][1]["If-None-Match"] == remote.etag
+    assert path.read_bytes() == CONTENT
+
+
+def test_changed_file_is_downloaded_again(url: str, path: Path, remote: RemoteFile):
+    download_file(url, path)
+    remote.content, remote.etag = CONTENT[::-1], '"v2"'
+
+    assert download_file(url, path)
+    assert path.read_bytes() == CONTENT[::-1]
+
+
+def test_truncated_download_is_resumed_with_a_range(url: str, path: Path, remote: RemoteFile):
+    remote.truncate = 1
+
+    assert download_file(url, path, max_retries=1)
+
+    assert path.read_bytes() == CONTENT
+    resumed = remote.requests[-1][1]
+    assert resumed["Range"] == f"bytes={len(CONTENT) // 2}-"
+    assert resumed["If-Range"] == remote.etag
+    assert not _part_path(path).exists()
+    assert not metadata_path(_part_path(path)).exists()
+
+
+def test_truncated_download_is_kept_for_a_next_run(url: str, path: Path, remote: RemoteFile):
+    remote.truncate = 1
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        download_file(url, path, max_retries=0)
+
+    assert not path.exists()
+    assert _part_path(path).read_bytes() == CONTENT[: len(CONTENT) // 2]
+    assert download_file(url, path, max_retries=0)
+    assert path.read_bytes() == CONTENT
+    assert "Range" in remote.requests[-1][1]
+
+
+@pytest.mark.parametrize("misbehaviour", ["range_not_satisfiable", "ignore_range"])
+def test_download_starts_again_when_the_range_is_not_honoured(
+    url: str, path: Path, remote: RemoteFile, misbehaviour: str
+):
+    remote.truncate = 1
+    setattr(remote, misbehaviour, 1)
+
+    assert download_file(url, path, max_retries=1)
+
+    # The partial file is overwritten rather than appended to
+    assert path.read_bytes() == CONTENT
+    assert "Range" in remote.requests[1][1]
+
+
+def test_partial_file_of_another_version_is_not_resumed(url: str, path: Path, remote: RemoteFile):
+    remote.truncate = 1
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        download_file(url, path, max_retries=0)
+    remote.content, remote.etag = CONTENT[::-1], '"v2"'
+
+    assert download_file(url, path, max_retries=0)
+
+    # If-Range does not match the new ETag: the server sends the whole new version
+    assert path.read_bytes() == CONTENT[::-1]
+
+
+def test_checksum_mismatch_deletes_the_partial_file(url: str, path: Path, remote: RemoteFile):
+    remote.announce_sha256 = hashlib.sha256(b"another file").hexdigest()
+
+    with pytest.raises(ValueError, match="corrupted"):
+        download_file(url, path)
+
+    assert not path.exists()
+    assert not _part_path(path).exists()
+    assert not metadata_path(_part_path(path)).exists()
+
+
+def test_announced_checksum_is_verified(url: str, path: Path, remote: RemoteFile):
+    remote.announce_sha256 = hashlib.sha256(CONTENT).hexdigest()
+
+    assert download_file(url, path)
+    assert read_metadata(path)["sha256"] == remote.announce_sha256
+
+
+def test_size_mismatch_deletes_the_partial_file(url: str, path: Path, remote: RemoteFile):
+    remote.wrong_content_length = True
+
+    with pytest.raises(ValueError, match="corrupted"):
+        download_file(url, path)
+
+    assert not path.exists()
+    assert not _part_path(path).exists()
+
+
+def test_remote_file_is_compared_with_a_head_request(url: str, path: Path, remote: RemoteFile):
+    assert is_remote_file_unchanged(url, path) is None
+
+    download_file(url, path)
+    assert is_remote_file_unchanged(url, path) is True
+    assert remote.requests[-1][0] == "HEAD"
+
+    remote.etag = '"v2"'
+    assert is_remote_file_unchanged(url, path) is False
+
+
+def test_unreachable_server_cannot_tell_whether_the_file_changed(path: Path):
+    path.write_bytes(CONTENT)
+    path.with_name(path.name + ".meta.json").write_text('{"etag": "\\"v1\\""}')
+
+    assert is_remote_file_unchanged("http://127.0.0.1:9/food.parquet", path) is None
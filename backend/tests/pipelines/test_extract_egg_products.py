@@ -0,0 +1,47 @@
+import re
+
+import duckdb
+import pytest
+from extract_egg_products import PatternRepository, normalize_words_sql
+
+from app.enums.open_food_facts.patterns.normalization import normalize_words
+
+# The excluded words filter as it was applied in Python, on the names normalized by normalize_words
+EXCLUDED_PATTERN = re.compile(
+    r"\b(" + r"|".join(term.replace(" ", r"\s+") for term in PatternRepository.EXCLUDED_WORDS) + r")\b"
+)
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "Oeufs frais Bio",
+        "6 Œufs de poules élevées en plein air",
+        "Œufs à la coque",
+        "Blancs d'œufs",
+        "ŒUFS DE PÂQUES",
+        "Pâtes aux œufs",
+        "Mayonnaise aux œufs",
+        "egg\xa0whites oeufs",
+        "a\xa0la\xa0russe oeufs",
+        "blancs\xa0d\xa0oeufs oeufs",
+        "Salade œufs mimosa",
+        "Eggs, 12 large",
+        "großpan eggs",
+        "oeufs mixß",
+        "яйца mix",
+        "mixя яйца",
+        "αυγά pan",
+        "panα αυγά",
+        "pan_eggs",
+        "pan2 eggs",
+    ],
+)
+def test_excluded_words_are_matched_in_duckdb_as_in_python(name: str):
+    excluded_in_python = EXCLUDED_PATTERN.search(normalize_words(name)) is not None
+
+    excluded_in_duckdb = duckdb.execute(
+        f"SELECT regexp_matches({normalize_words_sql('?')}, '{PatternRepository.EXCLUDED_PATTERN_SQL}')", [name]
+    ).fetchone()[0]
+
+    assert excluded_in_duckdb == excluded_in_python